@@ -0,0 +1,163 @@
+"""
+Alert Deduplication and Aggregation
+Collapses repeated alerts for the same (source, destination, port, threat
+type) inside a time window: the first occurrence is emitted immediately,
+repeats are only counted, and when the window closes a single summary alert
+with the hit count and first/last-seen times is emitted
+
+Windows are closed as alerts arrive and, once start() is called, by a
+background timer, so a summary is not held back on a quiet link.
+"""
+
+import threading
+import time
+
+from expiry_wheel import ExpiryWheel
+
+
+AGGREGATION_FIELDS = ('hit_count', 'first_seen', 'last_seen', 'aggregated')
+
+
+def new_hits(alert_data):
+    """
+    Occurrences an alert adds to the threat counts
+
+    A summary's first occurrence was already emitted as a normal alert, so
+    it adds its repeats (hit_count - 1); any other alert adds 1.
+    """
+    if alert_data.get('aggregated'):
+        return max(int(alert_data.get('hit_count') or 1) - 1, 0)
+    return 1
+
+
+class _Window:
+    __slots__ = ('hits', 'first_seen', 'last_seen', 'last_alert')
+
+    def __init__(self, alert_data):
+        self.hits = 1
+        self.first_seen = alert_data.get('timestamp')
+        self.last_seen = self.first_seen
+        self.last_alert = alert_data
+
+
+class AlertAggregator:
+    def __init__(self, emit, window=60.0, max_keys=50000, clock=time.monotonic):
+        """
+        Initialize the aggregator
+
+        Args:
+            emit: Function called with every alert that passes through
+            window: Seconds repeats are suppressed after a first occurrence
+            max_keys: Open windows tracked at once; beyond this, alerts pass
+                through unaggregated
+            clock: Time source (swapped to capture time during pcap replay)
+        """
+        self.emit = emit
+        self.window = window
+        self.max_keys = max_keys
+        self.windows = {}
+        self.expiry_wheel = ExpiryWheel(ttl=window, tick=1.0, clock=clock)
+        self.stats = {'emitted': 0, 'suppressed': 0, 'summaries': 0, 'untracked': 0}
+        # Guards the windows; emit is always called after it is released
+        self._lock = threading.Lock()
+        self._timer = None
+        self._timer_stop = threading.Event()
+
+    def start(self, interval=1.0):
+        """Close expired windows every interval seconds from a background thread"""
+        if self._timer and self._timer.is_alive():
+            return
+        self._timer_stop.clear()
+        self._timer = threading.Thread(target=self._run_timer, args=(interval,), daemon=True)
+        self._timer.start()
+
+    def stop(self):
+        """Stop the background timer (open windows are kept; see flush_all)"""
+        if self._timer:
+            self._timer_stop.set()
+            self._timer.join(timeout=2)
+            self._timer = None
+
+    def _run_timer(self, interval):
+        while not self._timer_stop.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Alert aggregator flush error: {str(e)}")
+
+    @staticmethod
+    def key_for(alert_data):
+        return (alert_data.get('source_ip'), alert_data.get('destination_ip'),
+                alert_data.get('port'), alert_data.get('threat_type'))
+
+    def submit(self, alert_data):
+        """Emit the alert or count it against its open window"""
+        with self._lock:
+            pending = self._expired()
+            key = self.key_for(alert_data)
+            window = self.windows.get(key)
+
+            if window is not None:
+                window.hits += 1
+                window.last_seen = alert_data.get('timestamp')
+                window.last_alert = alert_data
+                self.stats['suppressed'] += 1
+            else:
+                if len(self.windows) < self.max_keys:
+                    self.windows[key] = _Window(alert_data)
+                    self.expiry_wheel.touch(key)
+                else:
+                    self.stats['untracked'] += 1
+                self.stats['emitted'] += 1
+                pending.append(alert_data)
+
+        for alert in pending:
+            self.emit(alert)
+
+    def flush(self, now=None):
+        """Close windows that have run for `window` seconds"""
+        with self._lock:
+            pending = self._expired(now)
+        for alert in pending:
+            self.emit(alert)
+
+    def flush_all(self):
+        """Close every open window now (on stop / end of replay)"""
+        with self._lock:
+            windows = list(self.windows.values())
+            self.windows.clear()
+            self.expiry_wheel.clear()
+            pending = [self._summary(window) for window in windows if window.hits > 1]
+        for alert in pending:
+            self.emit(alert)
+
+    def _expired(self, now=None):
+        """Summaries of the windows that have closed (call with the lock held)"""
+        pending = []
+        for key in self.expiry_wheel.advance(now):
+            window = self.windows.pop(key, None)
+            if window is not None and window.hits > 1:
+                pending.append(self._summary(window))
+        return pending
+
+    def set_clock(self, clock):
+        """Switch time source, keeping open windows (see ExpiryWheel.set_clock)"""
+        with self._lock:
+            self.expiry_wheel.set_clock(clock)
+
+    def _summary(self, window):
+        summary = dict(window.last_alert)
+        repeats = window.hits - 1
+        summary['description'] = (f"{summary.get('description', 'Threat detected')} "
+                                  f"(repeated {repeats} more time{'s' if repeats != 1 else ''} "
+                                  f"in {self.window:g}s window)")
+        summary['hit_count'] = window.hits
+        summary['first_seen'] = window.first_seen
+        summary['last_seen'] = window.last_seen
+        summary['aggregated'] = True
+        self.stats['summaries'] += 1
+        return summary
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, open_windows=len(self.windows))
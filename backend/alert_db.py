@@ -0,0 +1,374 @@
+"""
+Durable Alert Persistence
+Append-only SQLite store for alerts, blocked IPs and network stats
+
+Writes never block the caller: alerts are queued and a background writer
+thread inserts them in batches, one transaction (group commit) per batch,
+on a WAL-mode database. Reads use per-thread connections, which WAL lets
+run concurrently with the writer.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+ALERT_COLUMNS = ('id', 'epoch', 'timestamp', 'source_ip', 'destination_ip', 'threat_type',
+                 'severity', 'status', 'description', 'port', 'protocol',
+                 'hit_count', 'first_seen', 'last_seen', 'aggregated')
+
+# Set only on aggregated summary alerts (see alert_aggregator); added to
+# databases created before they existed
+AGGREGATION_COLUMNS = {'hit_count': 'INTEGER', 'first_seen': 'TEXT', 'last_seen': 'TEXT', 'aggregated': 'INTEGER'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    epoch REAL NOT NULL,
+    timestamp TEXT,
+    source_ip TEXT,
+    destination_ip TEXT,
+    threat_type TEXT,
+    severity TEXT,
+    status TEXT,
+    description TEXT,
+    port INTEGER,
+    protocol TEXT,
+    hit_count INTEGER,
+    first_seen TEXT,
+    last_seen TEXT,
+    aggregated INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_epoch ON alerts (epoch);
+CREATE INDEX IF NOT EXISTS idx_alerts_severity ON alerts (severity, id);
+CREATE INDEX IF NOT EXISTS idx_alerts_threat_type ON alerts (threat_type, id);
+CREATE INDEX IF NOT EXISTS idx_alerts_source_ip ON alerts (source_ip, id);
+CREATE INDEX IF NOT EXISTS idx_alerts_destination_ip ON alerts (destination_ip, id);
+CREATE TABLE IF NOT EXISTS blocked_ips (
+    ip TEXT PRIMARY KEY,
+    blocked_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Constant SQL text: sqlite3 caches the prepared statement per connection
+_INSERT_ALERT = (f"INSERT OR REPLACE INTO alerts ({', '.join(ALERT_COLUMNS)}) "
+                 f"VALUES ({', '.join('?' * len(ALERT_COLUMNS))})")
+_UPDATE_STATUS = "UPDATE alerts SET status = ? WHERE id = ?"
+_INSERT_BLOCKED_IP = "INSERT OR IGNORE INTO blocked_ips (ip, blocked_at) VALUES (?, ?)"
+_UPSERT_STAT = "INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)"
+_SELECT_ALERTS = f"SELECT {', '.join(ALERT_COLUMNS)} FROM alerts"
+
+# Alert filters that map onto an indexed column
+FILTER_COLUMNS = ('severity', 'threat_type', 'source_ip', 'destination_ip')
+
+
+class AlertDatabase:
+    def __init__(self, path, batch_size=500, flush_interval=0.5, retention_days=30,
+                 max_rows=1000000, max_pending=100000):
+        """
+        Initialize the alert database (creates the file and schema)
+
+        Args:
+            path: SQLite database file
+            batch_size: Maximum queued writes committed in one transaction
+            flush_interval: Maximum seconds a queued write waits for its batch
+            retention_days: Alerts older than this are purged (0 keeps all)
+            max_rows: Newest alerts kept when purging (0 for no limit)
+            max_pending: Queued writes before new alerts are dropped
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.max_rows = max_rows
+        self.PURGE_INTERVAL = 60  # seconds
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._local = threading.local()
+        self._writer_thread = None
+        self.dropped = 0
+        self.written = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        connection.executescript(_SCHEMA)
+        existing = {row[1] for row in connection.execute("PRAGMA table_info(alerts)")}
+        for column, column_type in AGGREGATION_COLUMNS.items():
+            if column not in existing:
+                connection.execute(f"ALTER TABLE alerts ADD COLUMN {column} {column_type}")
+        connection.commit()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10, cached_statements=64)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self):
+        """Per-thread read connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+        return connection
+
+    # ===== Write path (non-blocking) =====
+
+    def start(self):
+        """Start the background writer thread"""
+        if self._writer_thread and self._writer_thread.is_alive():
+            return
+        self._writer_thread = threading.Thread(target=self._run_writer, daemon=True)
+        self._writer_thread.start()
+
+    def stop(self, timeout=5):
+        """Flush pending writes and stop the writer thread"""
+        if self._writer_thread:
+            self._queue.put(None)
+            self._writer_thread.join(timeout=timeout)
+            self._writer_thread = None
+
+    def _enqueue(self, item):
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                print(f"⚠️  Alert database backlog full, dropped {self.dropped} writes")
+            return False
+
+    def add_alert(self, alert):
+        """Queue an alert for insertion"""
+        row = tuple(alert.get(column) for column in ALERT_COLUMNS)
+        return self._enqueue((_INSERT_ALERT, row))
+
+    def update_status(self, alert_id, status):
+        """Queue an alert status change"""
+        return self._enqueue((_UPDATE_STATUS, (status, alert_id)))
+
+    def add_blocked_ip(self, ip_address):
+        """Queue a blocked IP"""
+        return self._enqueue((_INSERT_BLOCKED_IP, (ip_address, time.time())))
+
+    def save_stats(self, stats):
+        """Queue a snapshot of the network stats (only the latest per batch is written)"""
+        return self._enqueue(('stats', dict(stats)))
+
+    def flush(self, timeout=2):
+        """Wait until everything queued so far is committed"""
+        if not self._writer_thread:
+            return False
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _run_writer(self):
+        """Writer thread: batch queued writes into one transaction each"""
+        connection = self._connect()
+        last_purge = 0.0
+        running = True
+
+        while running:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = False
+            batch = [] if item is False else [item]
+
+            # Gather a group commit; flush()/stop() requests end it early
+            deadline = time.monotonic() + self.flush_interval
+            while batch and len(batch) < self.batch_size:
+                if batch[-1] is None or isinstance(batch[-1], threading.Event):
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            statements = {}
+            stats = None
+            events = []
+            for entry in batch:
+                if entry is None:
+                    running = False
+                elif isinstance(entry, threading.Event):
+                    events.append(entry)
+                elif entry[0] == 'stats':
+                    stats = entry[1]
+                else:
+                    statements.setdefault(entry[0], []).append(entry[1])
+
+            if statements or stats:
+                try:
+                    with connection:
+                        # Inserts before status updates so both land for new alerts
+                        for sql in sorted(statements, key=lambda sql: sql != _INSERT_ALERT):
+                            connection.executemany(sql, statements[sql])
+                        if stats:
+                            connection.executemany(_UPSERT_STAT, stats.items())
+                    self.written += len(statements.get(_INSERT_ALERT, ()))
+                except sqlite3.Error as e:
+                    print(f"❌ Alert database write failed: {str(e)}")
+
+            for event in events:
+                event.set()
+
+            if time.monotonic() - last_purge >= self.PURGE_INTERVAL:
+                self._purge(connection)
+                last_purge = time.monotonic()
+
+        connection.close()
+
+    def _purge(self, connection):
+        """Apply the retention policy"""
+        try:
+            with connection:
+                if self.retention_days:
+                    cutoff = time.time() - self.retention_days * 86400
+                    connection.execute("DELETE FROM alerts WHERE epoch < ?", (cutoff,))
+                if self.max_rows:
+                    connection.execute(
+                        "DELETE FROM alerts WHERE id <= "
+                        "(SELECT id FROM alerts ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                        (self.max_rows,)
+                    )
+        except sqlite3.Error as e:
+            print(f"❌ Alert retention purge failed: {str(e)}")
+
+    # ===== Read path =====
+
+    @staticmethod
+    def _alert_from_row(row):
+        """Alert dict from a row; aggregation fields only on summary alerts"""
+        alert = dict(row)
+        for column in AGGREGATION_COLUMNS:
+            if alert.get(column) is None:
+                alert.pop(column, None)
+        if 'aggregated' in alert:
+            alert['aggregated'] = bool(alert['aggregated'])
+        return alert
+
+    @staticmethod
+    def _where(filters):
+        clauses = []
+        params = []
+        for column in FILTER_COLUMNS:
+            value = filters.get(column)
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return clauses, params
+
+    def query_alerts(self, limit=50, offset=0, before_id=None, **filters):
+        """
+        Newest-first page of alerts
+
+        Args:
+            limit: Page size
+            offset: Rows to skip (ignored when before_id is given)
+            before_id: Keyset pagination - only alerts with a smaller id
+            filters: severity, threat_type, source_ip and/or destination_ip
+
+        Returns:
+            (alerts, total matching the filters)
+        """
+        clauses, params = self._where(filters)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        connection = self._reader()
+        total = connection.execute(f"SELECT COUNT(*) FROM alerts{where}", params).fetchone()[0]
+
+        if before_id is not None:
+            clauses = clauses + ["id < ?"]
+            params = params + [before_id]
+            where = f" WHERE {' AND '.join(clauses)}"
+            offset = 0
+        rows = connection.execute(
+            f"{_SELECT_ALERTS}{where} ORDER BY id DESC LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        ).fetchall()
+        return [self._alert_from_row(row) for row in rows], total
+
+    def query_time_range(self, start_epoch, end_epoch, limit=100, offset=0, **filters):
+        """
+        Newest-first page of alerts with start_epoch <= epoch <= end_epoch
+
+        Returns:
+            (alerts, total matching)
+        """
+        clauses, params = self._where(filters)
+        clauses = ["epoch BETWEEN ? AND ?"] + clauses
+        params = [start_epoch, end_epoch] + params
+        where = f" WHERE {' AND '.join(clauses)}"
+        connection = self._reader()
+        total = connection.execute(f"SELECT COUNT(*) FROM alerts{where}", params).fetchone()[0]
+        rows = connection.execute(
+            f"{_SELECT_ALERTS}{where} ORDER BY epoch DESC, id DESC LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        ).fetchall()
+        return [self._alert_from_row(row) for row in rows], total
+
+    def iter_alerts(self, start_epoch=None, end_epoch=None, chunk_size=1000, before_id=None, **filters):
+        """
+        Yield matching alerts newest first, fetching chunk_size rows at a time
+
+        Each chunk is a separate keyset query (id < last id seen), so memory
+        stays constant and no read transaction is held between chunks.
+        before_id starts below that id (e.g. the oldest alert still in memory).
+        """
+        clauses, params = self._where(filters)
+        if start_epoch is not None:
+            clauses.append("epoch >= ?")
+            params.append(start_epoch)
+        if end_epoch is not None:
+            clauses.append("epoch <= ?")
+            params.append(end_epoch)
+
+        connection = self._reader()
+        last_id = before_id
+        while True:
+            chunk_clauses = clauses + (["id < ?"] if last_id is not None else [])
+            chunk_params = params + ([last_id] if last_id is not None else [])
+            where = f" WHERE {' AND '.join(chunk_clauses)}" if chunk_clauses else ""
+            rows = connection.execute(
+                f"{_SELECT_ALERTS}{where} ORDER BY id DESC LIMIT ?", chunk_params + [chunk_size]
+            ).fetchall()
+            for row in rows:
+                yield self._alert_from_row(row)
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1]['id']
+
+    def get_alert(self, alert_id):
+        """Return one alert by id, or None"""
+        row = self._reader().execute(f"{_SELECT_ALERTS} WHERE id = ?", (alert_id,)).fetchone()
+        return self._alert_from_row(row) if row else None
+
+    def recent_alerts(self, limit):
+        """The newest alerts, oldest first (to warm the in-memory store)"""
+        rows = self._reader().execute(
+            f"SELECT * FROM ({_SELECT_ALERTS} ORDER BY id DESC LIMIT ?) ORDER BY id", (limit,)
+        ).fetchall()
+        return [self._alert_from_row(row) for row in rows]
+
+    def load_blocked_ips(self):
+        """Blocked IPs in the order they were blocked"""
+        rows = self._reader().execute("SELECT ip FROM blocked_ips ORDER BY blocked_at").fetchall()
+        return [row[0] for row in rows]
+
+    def load_stats(self):
+        """Last saved network stats"""
+        return dict(self._reader().execute("SELECT key, value FROM stats").fetchall())
@@ -0,0 +1,57 @@
+"""
+Streaming Alert Export
+Renders alerts as CSV in chunks so large exports start immediately and use
+constant memory, optionally gzip-compressing the stream on the fly
+"""
+
+import csv
+import zlib
+from io import StringIO
+
+CSV_HEADER = ['ID', 'Timestamp', 'Source IP', 'Destination IP', 'Threat Type',
+              'Severity', 'Status', 'Description', 'Port', 'Protocol']
+
+
+def csv_chunks(alerts, chunk_rows=500):
+    """
+    Yield CSV text for an iterable of alerts, chunk_rows rows at a time
+
+    Args:
+        alerts: Iterable of alert dicts (consumed lazily)
+        chunk_rows: Rows buffered per yielded chunk
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+
+    rows = 0
+    for alert in alerts:
+        writer.writerow([
+            alert['id'],
+            alert['timestamp'],
+            alert['source_ip'],
+            alert['destination_ip'],
+            alert['threat_type'],
+            alert['severity'],
+            alert['status'],
+            alert['description'],
+            alert['port'],
+            alert['protocol']
+        ])
+        rows += 1
+        if rows % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip-compress a stream of text chunks (UTF-8) without buffering it all"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,255 @@
+"""
+In-memory Alert Store
+Bounded ring buffer of alerts with secondary indexes by id, severity,
+source IP and threat type, plus a sorted epoch index for time ranges
+
+Inserts and evictions are O(1): every index keeps its alert ids in a deque
+in insertion order, so the alert being evicted (always the oldest) sits at
+the left end of each deque it belongs to. Alerts normally arrive in time
+order, so the epoch index is appended to and trimmed from its front; late
+alerts fall back to a binary-search insert.
+"""
+
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from itertools import islice
+from datetime import datetime
+
+# Secondary index name -> alert field
+INDEXED_FIELDS = {
+    'severity': 'severity',
+    'source_ip': 'source_ip',
+    'threat_type': 'threat_type'
+}
+
+
+def parse_timestamp(value):
+    """
+    Convert a timestamp to epoch seconds
+
+    Accepts ISO-8601 strings with a UTC offset or 'Z' (e.g. from
+    Date.toISOString()), naive ISO strings (server local time, as produced by
+    datetime.now().isoformat()) and numeric epoch seconds or milliseconds.
+
+    Raises:
+        ValueError: the value is not a recognizable timestamp
+    """
+    if isinstance(value, (int, float)):
+        epoch = float(value)
+    else:
+        text = str(value).strip()
+        try:
+            epoch = float(text)
+        except ValueError:
+            if text.endswith(('Z', 'z')):
+                text = text[:-1] + '+00:00'
+            return datetime.fromisoformat(text).timestamp()
+    return epoch / 1000 if epoch > 1e11 else epoch
+
+
+def _to_epoch(timestamp):
+    """Epoch seconds for an alert timestamp, falling back to now"""
+    try:
+        return parse_timestamp(timestamp)
+    except (TypeError, ValueError):
+        return time.time()
+
+
+class AlertStore:
+    def __init__(self, capacity=10000):
+        """
+        Initialize the alert store
+
+        Args:
+            capacity: Maximum number of alerts kept; the oldest are evicted
+        """
+        self.capacity = capacity
+
+        self._slots = [None] * capacity
+        self._head = 0          # Next slot to write
+        self._count = 0
+        self._next_id = 1
+        self._lock = threading.RLock()
+
+        self._by_id = {}
+        self._indexes = {name: {} for name in INDEXED_FIELDS}
+        self._time_index = []   # Sorted (epoch, id); entries before _time_start are evicted
+        self._time_start = 0
+
+    def add(self, alert):
+        """
+        Store an alert, assigning it the next id and its epoch timestamp
+
+        Returns:
+            The stored alert (with 'id' and 'epoch' set)
+        """
+        with self._lock:
+            alert['id'] = self._next_id
+            return self._insert(alert)
+
+    def restore(self, alert, next_id=None):
+        """
+        Re-insert a previously stored alert keeping its id (e.g. from disk)
+
+        Args:
+            next_id: Id to hand out next; defaults to one past the restored id
+        """
+        with self._lock:
+            self._insert(alert)
+            self._next_id = max(self._next_id, next_id or alert['id'] + 1)
+            return alert
+
+    def _insert(self, alert):
+        with self._lock:
+            evicted = self._slots[self._head]
+            if evicted is not None:
+                self._unindex(evicted)
+
+            self._next_id = max(self._next_id, alert['id'] + 1)
+            self._slots[self._head] = alert
+            self._head = (self._head + 1) % self.capacity
+            if self._count < self.capacity:
+                self._count += 1
+
+            alert_id = alert['id']
+            self._by_id[alert_id] = alert
+            for name, field in INDEXED_FIELDS.items():
+                self._indexes[name].setdefault(alert.get(field), deque()).append(alert_id)
+
+            # Parse the timestamp once; time queries only compare epochs
+            if 'epoch' not in alert:
+                alert['epoch'] = _to_epoch(alert.get('timestamp'))
+            entry = (alert['epoch'], alert_id)
+            if not self._time_index or entry > self._time_index[-1]:
+                self._time_index.append(entry)
+            else:
+                insort(self._time_index, entry, lo=self._time_start)
+            return alert
+
+    def _unindex(self, alert):
+        """Drop the oldest alert from every index"""
+        alert_id = alert['id']
+        del self._by_id[alert_id]
+        for name, field in INDEXED_FIELDS.items():
+            self._popleft(self._indexes[name], alert.get(field), alert_id)
+
+        index = self._time_index
+        entry = (alert['epoch'], alert_id)
+        if index[self._time_start] == entry:
+            self._time_start += 1
+            if self._time_start > len(index) // 2:
+                del index[:self._time_start]
+                self._time_start = 0
+        else:
+            del index[bisect_left(index, entry, lo=self._time_start)]
+
+    @staticmethod
+    def _popleft(index, key, alert_id):
+        ids = index.get(key)
+        if ids and ids[0] == alert_id:
+            ids.popleft()
+            if not ids:
+                del index[key]
+
+    def get(self, alert_id):
+        """Return the alert with this id, or None"""
+        return self._by_id.get(alert_id)
+
+    def update(self, alert_id, **fields):
+        """
+        Update non-indexed fields of a stored alert (e.g. status)
+
+        Returns:
+            The updated alert, or None if it is no longer stored
+        """
+        with self._lock:
+            alert = self._by_id.get(alert_id)
+            if alert is not None:
+                alert.update(fields)
+            return alert
+
+    def query(self, limit=50, offset=0, **filters):
+        """
+        Newest-first alerts matching an indexed field
+
+        Args:
+            limit: Maximum number of alerts returned (None for all)
+            offset: Number of matching alerts to skip
+            filters: At most one of severity, source_ip or threat_type
+
+        Returns:
+            (alerts, total matching)
+        """
+        with self._lock:
+            filters = {name: value for name, value in filters.items() if value}
+            if not filters:
+                return self.recent(limit, offset), self._count
+            if len(filters) > 1 or next(iter(filters)) not in self._indexes:
+                raise ValueError(f"Unsupported alert filter: {', '.join(filters)}")
+
+            name, value = next(iter(filters.items()))
+            ids = self._indexes[name].get(value, ())
+            return self._newest(ids, limit, offset), len(ids)
+
+    def recent(self, limit=50, offset=0):
+        """Newest-first alerts (limit=None for all)"""
+        with self._lock:
+            end = self._count if limit is None else min(offset + limit, self._count)
+            slots = self._slots
+            capacity = self.capacity
+            return [slots[(self._head - 1 - i) % capacity] for i in range(offset, end)]
+
+    def is_full(self):
+        """True once the oldest alerts are being evicted"""
+        return self._count >= self.capacity
+
+    def oldest_id(self):
+        """Id of the oldest alert still held (None if empty)"""
+        with self._lock:
+            if not self._count:
+                return None
+            oldest = self._head if self._count == self.capacity else 0
+            return self._slots[oldest]['id']
+
+    def oldest_epoch(self):
+        """Epoch of the oldest alert still held (None if empty)"""
+        with self._lock:
+            if self._time_start < len(self._time_index):
+                return self._time_index[self._time_start][0]
+            return None
+
+    def in_time_range(self, start_epoch, end_epoch, offset=0, limit=100):
+        """
+        Page of alerts with start_epoch <= epoch <= end_epoch, newest first
+
+        Args:
+            offset: Number of matching alerts to skip
+            limit: Page size (None for the rest of the range)
+
+        Returns:
+            (alerts, total matching)
+        """
+        with self._lock:
+            index = self._time_index
+            lo = bisect_left(index, (start_epoch,), lo=self._time_start)
+            hi = bisect_right(index, (end_epoch, float('inf')), lo=lo)
+            total = hi - lo
+
+            stop = max(hi - offset, lo)
+            start = lo if limit is None else max(stop - limit, lo)
+            by_id = self._by_id
+            return [by_id[alert_id] for _, alert_id in reversed(index[start:stop])], total
+
+    def _newest(self, ids, limit, offset=0):
+        by_id = self._by_id
+        stop = None if limit is None else offset + limit
+        return [by_id[alert_id] for alert_id in islice(reversed(ids), offset, stop)]
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        """Iterate newest-first over a snapshot of the stored alerts"""
+        return iter(self.recent(None))
@@ -3,10 +3,14 @@ from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 import random
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 import threading
+import itertools
+import atexit
+import signal
 import os
 import sys
+import importlib.util
 
 # Import email service
 try:
@@ -16,12 +20,18 @@ except ImportError:
     EMAIL_SERVICE_AVAILABLE = False
     print("⚠️  Email service not available.")
 
-# Import packet sniffer (optional - will work in simulation mode if not available)
-try:
-    from packet_sniffer import PacketAnalyzer
-    PACKET_CAPTURE_AVAILABLE = True
-except ImportError:
-    PACKET_CAPTURE_AVAILABLE = False
+from alert_aggregator import AGGREGATION_FIELDS, new_hits
+from alert_store import AlertStore, parse_timestamp
+from alert_db import AlertDatabase
+from alert_export import csv_chunks, gzip_chunks
+from capture_filter import DEFAULT_BPF_FILTER
+from threat_aggregates import ThreatAggregator
+from socket_emitter import SocketEmitter
+
+# Packet capture is optional (simulation mode without it). Scapy is only
+# imported by /api/realtime/start, so it stays out of server startup.
+PACKET_CAPTURE_AVAILABLE = importlib.util.find_spec('scapy') is not None
+if not PACKET_CAPTURE_AVAILABLE:
     print("⚠️  Packet capture not available. Running in simulation mode.")
 
 app = Flask(__name__)
@@ -36,8 +46,17 @@ socketio = SocketIO(
     ping_interval=25
 )
 
+# Batched alert fan-out and coalesced stats broadcasts
+socket_emitter = SocketEmitter(socketio)
+# Sharded capture processes (see sharded_capture.START_METHOD) import this
+# module as __mp_main__; only the server starts threads and opens the database
+SERVER_PROCESS = __name__ != '__mp_main__'
+if SERVER_PROCESS:
+    socket_emitter.start()
+
 # Data storage
-alerts = []
+alert_store = AlertStore(capacity=int(os.environ.get('ALERT_STORE_CAPACITY', 10000)))
+threat_aggregates = ThreatAggregator()  # Per-minute/per-hour rollups for /api/threats
 threat_data = []
 blocked_ips_list = []  # List of blocked IP addresses
 network_stats = {
@@ -47,6 +66,35 @@ network_stats = {
     'active_connections': 0
 }
 
+# Durable alert persistence (set ALERT_DB_PATH to an empty string to disable)
+ALERT_DB_PATH = os.environ.get(
+    'ALERT_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'alerts.db')
+)
+alert_db = None
+DB_TOTAL_MAX_AGE = 10.0  # Seconds a database count is reused next to in-memory pages
+database_totals = {}     # (query, filters) -> (monotonic time, count)
+database_totals_lock = threading.Lock()  # Request threads share the cache
+if ALERT_DB_PATH and SERVER_PROCESS:
+    try:
+        alert_db = AlertDatabase(
+            ALERT_DB_PATH,
+            retention_days=int(os.environ.get('ALERT_RETENTION_DAYS', 30)),
+            max_rows=int(os.environ.get('ALERT_DB_MAX_ROWS', 1000000))
+        )
+        # Warm the in-memory store and restore state from the last run
+        for stored_alert in alert_db.recent_alerts(alert_store.capacity):
+            alert_store.restore(stored_alert)
+        for stored_alert in alert_db.iter_alerts(start_epoch=time.time() - threat_aggregates.hour_retention * 3600):
+            threat_aggregates.record(stored_alert, new_hits(stored_alert))
+        blocked_ips_list.extend(alert_db.load_blocked_ips())
+        network_stats.update(alert_db.load_stats())
+        alert_db.start()
+        print(f"✅ Alert database: {os.path.abspath(ALERT_DB_PATH)} ({len(alert_store)} alerts restored)")
+    except Exception as e:
+        alert_db = None
+        print(f"⚠️  Alert database not available: {str(e)}")
+
 # Packet analyzer instance
 packet_analyzer = None
 REAL_TIME_MODE = False  # Toggle between real packet capture and simulation
@@ -70,7 +118,6 @@ def generate_alert():
     threat_type = random.choice(THREAT_TYPES)
     
     alert = {
-        'id': len(alerts) + 1,
         'timestamp': datetime.now().isoformat(),
         'source_ip': generate_ip(),
         'destination_ip': generate_ip(),
@@ -84,23 +131,52 @@ def generate_alert():
     
     return alert
 
-def generate_threat_stats():
-    """Generate threat statistics for charts"""
-    stats = []
-    for i in range(24):
-        hour = (datetime.now() - timedelta(hours=23-i)).strftime('%H:00')
-        stats.append({
-            'time': hour,
-            'threats': random.randint(5, 50),
-            'blocked': random.randint(3, 40),
-            'allowed': random.randint(100, 500)
-        })
-    return stats
+def store_alert(alert, hits=1, persist=True):
+    """
+    Add an alert to the in-memory store, the hourly rollups and the database
+    
+    Args:
+        alert: Alert dict (gets its id and epoch)
+        hits: Occurrences it stands for in the rollups (see new_hits)
+        persist: Save it to the database; False for the simulation's sample
+            alerts, which are shown but never restored on the next start
+    
+    Returns:
+        The stored alert
+    """
+    # Assigns the id, evicts the oldest when full
+    alert_store.add(alert)
+    threat_aggregates.record(alert, hits)
+    # Persist (queued for the database writer thread, never blocks)
+    if alert_db and persist:
+        alert_db.add_alert(alert)
+    return alert
+
+def database_total(key, count):
+    """
+    Alert count from the database, reused for DB_TOTAL_MAX_AGE seconds
+    
+    Pages served from memory still report the full total, without a
+    COUNT(*) on every dashboard poll.
+    
+    Args:
+        key: Cache key (the query and its filters)
+        count: Function running the count
+    """
+    now = time.monotonic()
+    with database_totals_lock:
+        cached = database_totals.get(key)
+    if cached is None or now - cached[0] > DB_TOTAL_MAX_AGE:
+        cached = (now, count())  # Not under the lock: other keys stay served meanwhile
+        with database_totals_lock:
+            if len(database_totals) >= 256:
+                database_totals.clear()
+            database_totals[key] = cached
+    return cached[1]
 
 def handle_real_alert(alert_data):
     """Handle alerts from real packet capture"""
     alert = {
-        'id': len(alerts) + 1,
         'timestamp': alert_data.get('timestamp', datetime.now().isoformat()),
         'source_ip': alert_data.get('source_ip', 'Unknown'),
         'destination_ip': alert_data.get('destination_ip', 'Unknown'),
@@ -111,20 +187,23 @@ def handle_real_alert(alert_data):
         'port': alert_data.get('port', 0),
         'protocol': alert_data.get('protocol', 'Unknown')
     }
-    
-    # Add to alerts list
-    alerts.insert(0, alert)
-    if len(alerts) > 100:
-        alerts.pop()
-    
-    # Update stats
-    network_stats['threats_detected'] += 1
+    # Hit count and first/last seen of aggregated summaries (see alert_aggregator)
+    for field in AGGREGATION_FIELDS:
+        if field in alert_data:
+            alert[field] = alert_data[field]
+    hits = new_hits(alert)
+    store_alert(alert, hits)
+    
+    # Update stats (a summary counts the repeats it stands for)
+    network_stats['threats_detected'] += hits
     if alert['severity'] in ['High', 'Critical']:
         network_stats['blocked_ips'] += 1
+    if alert_db:
+        alert_db.save_stats(network_stats)
     
     # Emit via WebSocket
-    socketio.emit('new_alert', alert)
-    socketio.emit('stats_update', network_stats)
+    socket_emitter.emit_alert(alert)
+    socket_emitter.emit_stats(network_stats)
     
     print(f"🚨 Real threat detected: {alert['threat_type']} from {alert['source_ip']}")
 
@@ -137,13 +216,8 @@ def background_monitoring():
         if REAL_TIME_MODE:
             continue
         
-        # Generate new alert
-        alert = generate_alert()
-        alerts.insert(0, alert)
-        
-        # Keep only last 100 alerts
-        if len(alerts) > 100:
-            alerts.pop()
+        # Generate new alert (simulated: kept out of the database)
+        alert = store_alert(generate_alert(), persist=False)
         
         # Update network stats
         network_stats['total_packets'] += random.randint(10, 100)
@@ -155,8 +229,8 @@ def background_monitoring():
                 network_stats['blocked_ips'] += 1
         
         # Emit real-time update via WebSocket
-        socketio.emit('new_alert', alert)
-        socketio.emit('stats_update', network_stats)
+        socket_emitter.emit_alert(alert)
+        socket_emitter.emit_stats(network_stats)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -168,20 +242,32 @@ def get_alerts():
     """Get all alerts with optional filtering"""
     severity = request.args.get('severity')
     limit = request.args.get('limit', type=int, default=50)
+    offset = max(request.args.get('offset', type=int, default=0), 0)
+    
+    filtered_alerts, total = alert_store.query(limit=limit, offset=offset, severity=severity)
     
-    filtered_alerts = alerts
-    if severity:
-        filtered_alerts = [a for a in alerts if a['severity'] == severity]
+    # Older alerts than the in-memory window are paged from the database;
+    # pages the store can fill never wait for the database writer
+    if alert_db and alert_store.is_full():
+        if len(filtered_alerts) < limit:
+            alert_db.flush()
+            filtered_alerts, total = alert_db.query_alerts(limit=limit, offset=offset, severity=severity)
+        else:
+            total = max(total, database_total(
+                ('alerts', severity), lambda: alert_db.query_alerts(limit=0, severity=severity)[1]))
     
     return jsonify({
-        'alerts': filtered_alerts[:limit],
-        'total': len(filtered_alerts)
+        'alerts': filtered_alerts,
+        'total': total,
+        'offset': offset
     })
 
 @app.route('/api/alerts/<int:alert_id>', methods=['GET'])
 def get_alert(alert_id):
     """Get specific alert by ID"""
-    alert = next((a for a in alerts if a['id'] == alert_id), None)
+    alert = alert_store.get(alert_id)
+    if alert is None and alert_db:
+        alert = alert_db.get_alert(alert_id)
     if alert:
         return jsonify(alert)
     return jsonify({'error': 'Alert not found'}), 404
@@ -193,24 +279,9 @@ def get_stats():
 
 @app.route('/api/threats', methods=['GET'])
 def get_threats():
-    """Get threat statistics for visualization"""
-    return jsonify({
-        'hourly_stats': generate_threat_stats(),
-        'threat_distribution': [
-            {'name': 'Port Scan', 'value': random.randint(10, 50)},
-            {'name': 'DDoS', 'value': random.randint(5, 30)},
-            {'name': 'SQL Injection', 'value': random.randint(8, 25)},
-            {'name': 'XSS', 'value': random.randint(6, 20)},
-            {'name': 'Brute Force', 'value': random.randint(10, 35)},
-            {'name': 'Other', 'value': random.randint(5, 15)}
-        ],
-        'severity_breakdown': {
-            'Low': random.randint(20, 50),
-            'Medium': random.randint(15, 40),
-            'High': random.randint(10, 30),
-            'Critical': random.randint(5, 15)
-        }
-    })
+    """Get threat statistics for visualization (served from incremental rollups)"""
+    hours = min(max(request.args.get('hours', type=int, default=24), 1), threat_aggregates.hour_retention)
+    return jsonify(threat_aggregates.summary(hours=hours))
 
 @app.route('/api/scan', methods=['POST'])
 def trigger_scan():
@@ -243,15 +314,21 @@ def block_ip():
     if ip_address not in blocked_ips_list:
         blocked_ips_list.append(ip_address)
         network_stats['blocked_ips'] += 1
+        if alert_db:
+            alert_db.add_blocked_ip(ip_address)
+            alert_db.save_stats(network_stats)
     
     # Update the alert status to 'Blocked' if alert_id is provided
     if alert_id:
-        for alert in alerts:
-            if alert['id'] == alert_id:
-                alert['status'] = 'Blocked'
-                # Emit updated alert
-                socketio.emit('alert_updated', alert)
-                break
+        alert = alert_store.get(alert_id)
+        if alert and alert['status'] != 'Blocked':
+            threat_aggregates.record_block(alert, new_hits(alert))
+        alert = alert_store.update(alert_id, status='Blocked')
+        if alert_db:
+            alert_db.update_status(alert_id, 'Blocked')
+        if alert:
+            # Emit updated alert
+            socketio.emit('alert_updated', alert)
     
     return jsonify({
         'status': 'success',
@@ -270,77 +347,92 @@ def get_blocked_ips():
 
 @app.route('/api/alerts/export', methods=['GET'])
 def export_alerts_csv():
-    """Export alerts to CSV format"""
-    import csv
-    from io import StringIO
-    
-    # Create CSV in memory
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['ID', 'Timestamp', 'Source IP', 'Destination IP', 'Threat Type', 
-                     'Severity', 'Status', 'Description', 'Port', 'Protocol'])
-    
-    # Write data
-    for alert in alerts:
-        writer.writerow([
-            alert['id'],
-            alert['timestamp'],
-            alert['source_ip'],
-            alert['destination_ip'],
-            alert['threat_type'],
-            alert['severity'],
-            alert['status'],
-            alert['description'],
-            alert['port'],
-            alert['protocol']
-        ])
-    
-    # Get CSV content
-    csv_content = output.getvalue()
-    output.close()
-    
-    # Return as downloadable file
+    """Export alerts to CSV format (streamed; optional severity/time filters and gzip)"""
     from flask import Response
+    
+    severity = request.args.get('severity')
+    start_time = request.args.get('start_time')
+    end_time = request.args.get('end_time')
+    use_gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    
+    try:
+        start_epoch = parse_timestamp(start_time) if start_time else None
+        end_epoch = parse_timestamp(end_time) if end_time else None
+    except ValueError as e:
+        return jsonify({'error': f'Invalid time format: {str(e)}'}), 400
+    
+    oldest_id = alert_store.oldest_id()
+    snapshot, _ = alert_store.query(limit=None, severity=severity)
+    rows = (
+        alert for alert in snapshot
+        if (start_epoch is None or alert['epoch'] >= start_epoch)
+        and (end_epoch is None or alert['epoch'] <= end_epoch)
+    )
+    if alert_db and alert_store.is_full() and oldest_id is not None:
+        # Older history lives on disk: stream it in keyset-paged chunks after
+        # the in-memory alerts (those are newer than anything still queued)
+        rows = itertools.chain(rows, alert_db.iter_alerts(
+            start_epoch=start_epoch, end_epoch=end_epoch, before_id=oldest_id, severity=severity))
+    
+    # Rows are rendered as the response is sent, never held in full
+    body = csv_chunks(rows)
+    filename = f'alerts_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    if use_gzip:
+        body = gzip_chunks(body)
+        filename += '.gz'
+    
     return Response(
-        csv_content,
-        mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment; filename=alerts_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'}
+        body,
+        mimetype='application/gzip' if use_gzip else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
     )
 
 @app.route('/api/alerts/filter-by-time', methods=['GET'])
 def filter_alerts_by_time():
-    """Filter alerts by time period"""
+    """Filter alerts by time period (paginated, newest first)"""
     start_time = request.args.get('start_time')
     end_time = request.args.get('end_time')
+    page = max(request.args.get('page', type=int, default=1), 1)
+    page_size = min(max(request.args.get('page_size', type=int, default=100), 1), 1000)
     
     if not start_time or not end_time:
         return jsonify({'error': 'start_time and end_time are required'}), 400
     
     try:
-        # Parse time strings - strip timezone info to make them naive
-        start_dt = datetime.fromisoformat(start_time.replace('Z', '').split('+')[0].split('-05:30')[0])
-        end_dt = datetime.fromisoformat(end_time.replace('Z', '').split('+')[0].split('-05:30')[0])
-        
-        # Filter alerts
-        filtered_alerts = []
-        for alert in alerts:
-            # Parse alert timestamp - strip timezone info to make it naive
-            alert_timestamp_str = alert['timestamp'].replace('Z', '').split('+')[0].split('-05:30')[0]
-            alert_dt = datetime.fromisoformat(alert_timestamp_str)
-            
-            if start_dt <= alert_dt <= end_dt:
-                filtered_alerts.append(alert)
-        
-        return jsonify({
-            'alerts': filtered_alerts,
-            'total': len(filtered_alerts),
-            'start_time': start_time,
-            'end_time': end_time
-        })
-    except Exception as e:
+        # Normalize both bounds to epoch seconds (UTC offsets and 'Z' honoured,
+        # naive times are server local time like the alert timestamps)
+        start_epoch = parse_timestamp(start_time)
+        end_epoch = parse_timestamp(end_time)
+    except ValueError as e:
         return jsonify({'error': f'Invalid time format: {str(e)}'}), 400
+    
+    offset = (page - 1) * page_size
+    oldest_in_memory = alert_store.oldest_epoch()
+    # Binary-search slice of the store's epoch index
+    filtered_alerts, total = alert_store.in_time_range(
+        start_epoch, end_epoch, offset=offset, limit=page_size
+    )
+    if alert_db and alert_store.is_full() and (oldest_in_memory is None or start_epoch < oldest_in_memory):
+        # Range reaches past the in-memory window: older pages come from the database
+        if len(filtered_alerts) < page_size:
+            alert_db.flush()
+            filtered_alerts, total = alert_db.query_time_range(
+                start_epoch, end_epoch, limit=page_size, offset=offset
+            )
+        else:
+            total = max(total, database_total(
+                ('time_range', start_epoch, end_epoch),
+                lambda: alert_db.query_time_range(start_epoch, end_epoch, limit=0)[1]))
+    
+    return jsonify({
+        'alerts': filtered_alerts,
+        'total': total,
+        'page': page,
+        'page_size': page_size,
+        'pages': (total + page_size - 1) // page_size,
+        'start_time': start_time,
+        'end_time': end_time
+    })
 
 @app.route('/api/trigger-alert', methods=['POST'])
 def trigger_alert():
@@ -352,7 +444,6 @@ def trigger_alert():
     
     # Create custom alert
     alert = {
-        'id': len(alerts) + 1,
         'timestamp': datetime.now().isoformat(),
         'source_ip': data.get('source_ip', generate_ip()),
         'destination_ip': data.get('destination_ip', generate_ip()),
@@ -364,10 +455,7 @@ def trigger_alert():
         'protocol': data.get('protocol', random.choice(['TCP', 'UDP', 'ICMP', 'HTTP', 'HTTPS']))
     }
     
-    # Add to alerts list
-    alerts.insert(0, alert)
-    if len(alerts) > 100:
-        alerts.pop()
+    store_alert(alert)
     
     # Update stats
     network_stats['total_packets'] += random.randint(10, 50)
@@ -375,10 +463,12 @@ def trigger_alert():
         network_stats['threats_detected'] += 1
         if alert['status'] == 'Blocked':
             network_stats['blocked_ips'] += 1
+    if alert_db:
+        alert_db.save_stats(network_stats)
     
     # Emit via WebSocket
-    socketio.emit('new_alert', alert)
-    socketio.emit('stats_update', network_stats)
+    socket_emitter.emit_alert(alert)
+    socket_emitter.emit_stats(network_stats)
     
     return jsonify({
         'status': 'success',
@@ -401,11 +491,14 @@ def send_email_alert():
     # Send email if service is available
     if EMAIL_SERVICE_AVAILABLE:
         result = email_service.send_alert_email(data)
-        return jsonify({
+        response = {
             'status': result.get('status'),
             'message': result.get('message'),
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        if 'queue_depth' in result:
+            response['queue_depth'] = result['queue_depth']
+        return jsonify(response)
     else:
         return jsonify({
             'status': 'unavailable',
@@ -413,6 +506,13 @@ def send_email_alert():
             'timestamp': datetime.now().isoformat()
         })
 
+@app.route('/api/email/status', methods=['GET'])
+def get_email_status():
+    """Email delivery queue depth, send latency and outcome counters"""
+    if not EMAIL_SERVICE_AVAILABLE:
+        return jsonify({'status': 'unavailable'})
+    return jsonify({'status': 'success', 'delivery': email_service.get_stats()})
+
 @app.route('/api/realtime/start', methods=['POST'])
 def start_realtime_capture():
     """Start real-time packet capture"""
@@ -433,9 +533,19 @@ def start_realtime_capture():
     try:
         data = request.get_json() or {}
         interface = data.get('interface', None)
+        workers = int(data.get('workers', 1))
+        bpf_filter = data.get('bpf_filter', DEFAULT_BPF_FILTER)  # '' captures everything
+        capture_backend = data.get('capture_backend', 'socket')  # 'mmap' for the TPACKET_V3 ring
         
-        # Initialize packet analyzer
-        packet_analyzer = PacketAnalyzer(alert_callback=handle_real_alert)
+        # Initialize packet analyzer (sharded across processes if workers > 1)
+        if workers > 1:
+            from sharded_capture import ShardedCapture
+            packet_analyzer = ShardedCapture(alert_callback=handle_real_alert, num_workers=workers,
+                                             bpf_filter=bpf_filter, capture_backend=capture_backend)
+        else:
+            from packet_sniffer import PacketAnalyzer
+            packet_analyzer = PacketAnalyzer(alert_callback=handle_real_alert, bpf_filter=bpf_filter,
+                                             capture_backend=capture_backend)
         packet_analyzer.start_sniffing(interface=interface)
         
         REAL_TIME_MODE = True
@@ -444,6 +554,9 @@ def start_realtime_capture():
             'status': 'success',
             'message': 'Real-time packet capture started',
             'interface': interface or 'default',
+            'workers': workers,
+            'bpf_filter': bpf_filter,
+            'capture_backend': capture_backend,
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
@@ -488,6 +601,7 @@ def get_realtime_status():
         'available': PACKET_CAPTURE_AVAILABLE,
         'running': REAL_TIME_MODE,
         'mode': 'real-time' if REAL_TIME_MODE else 'simulation',
+        'capture': packet_analyzer.get_capture_stats() if packet_analyzer else None,
         'timestamp': datetime.now().isoformat()
     })
 
@@ -495,12 +609,14 @@ def get_realtime_status():
 def handle_connect():
     """Handle WebSocket connection"""
     print('Client connected')
+    socket_emitter.add_client(request.sid)
     emit('connection_response', {'status': 'connected'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle WebSocket disconnection"""
     print('Client disconnected')
+    socket_emitter.remove_client(request.sid)
 
 @socketio.on('request_stats')
 def handle_stats_request():
@@ -521,10 +637,37 @@ def handle_trigger_alert(data):
     """Handle alert triggered from real-time packet capture"""
     handle_real_alert(data)
 
+def shutdown_services():
+    """
+    Stop capture and drain the background services at server exit
+    
+    Capture stops first so its last aggregated summaries are stored; the
+    email service then sends its pending digest and queued emails, and the
+    database commits everything queued (including those alerts).
+    """
+    global packet_analyzer
+    if packet_analyzer:
+        try:
+            packet_analyzer.stop_sniffing()
+        except Exception as e:
+            print(f"⚠️  Could not stop packet capture: {str(e)}")
+        packet_analyzer = None
+    if EMAIL_SERVICE_AVAILABLE:
+        email_service.shutdown()
+    if alert_db:
+        alert_db.stop()
+    print("👋 Background services stopped")
+
+if SERVER_PROCESS:
+    atexit.register(shutdown_services)
+
 if __name__ == '__main__':
-    # Initialize with some sample data
+    # Service managers stop with SIGTERM: exit normally so shutdown_services runs
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    # Initialize with some sample data (not persisted)
     for _ in range(20):
-        alerts.append(generate_alert())
+        store_alert(generate_alert(), persist=False)
     
     # Start background monitoring thread
     monitor_thread = threading.Thread(target=background_monitoring, daemon=True)
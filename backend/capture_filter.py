@@ -0,0 +1,145 @@
+"""
+Kernel-side Capture Filtering
+Optional BPF expressions applied to the capture socket, so traffic that is
+not wanted (e.g. localhost, broadcast, multicast and LAN discovery chatter,
+see NOISE_FILTER) is dropped by the kernel before it is copied to Python,
+plus the counters that show how much was filtered
+
+Counters (Linux): PACKET_STATISTICS on the AF_PACKET socket gives the packets
+that passed the filter and the ones dropped because the socket buffer was
+full; the interface's sysfs rx/tx counters give everything the interface saw
+since the socket was opened. The difference is what the filter removed (an
+estimate: the two sets of counters are not read atomically). Elsewhere the
+counters are reported as None.
+"""
+
+import os
+import socket
+import struct
+import threading
+
+# Opt-in noise filter, the classes run_realtime_capture.py drops after
+# dissection: localhost, link-layer broadcasts, multicast, mDNS/SSDP/NetBIOS.
+# Broadcasts are matched on the Ethernet address: an IP ending in .255 is an
+# ordinary unicast host in /23 and larger networks.
+NOISE_FILTER = ('not (net 127.0.0.0/8'
+                ' or ether broadcast'
+                ' or dst net 224.0.0.0/4'
+                ' or dst port 5353 or dst port 1900 or dst port 137 or dst port 138)')
+
+# Filter used when none is given: none, so all traffic (localhost included)
+# is analyzed as before; set CAPTURE_BPF_FILTER (e.g. to NOISE_FILTER) to opt in
+DEFAULT_BPF_FILTER = os.environ.get('CAPTURE_BPF_FILTER', '')
+
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+_TPACKET_STATS = struct.Struct('II')   # struct tpacket_stats {tp_packets, tp_drops}
+_TPACKET_STATS_V3 = struct.Struct('III')  # tpacket_stats_v3 adds tp_freeze_q_cnt
+
+
+def interface_packets(interface):
+    """
+    Packets received plus sent on an interface (Linux sysfs)
+
+    Returns:
+        int, or None if the counters cannot be read
+    """
+    total = 0
+    for counter in ('rx_packets', 'tx_packets'):
+        try:
+            with open(f'/sys/class/net/{interface}/statistics/{counter}') as f:
+                total += int(f.read())
+        except (OSError, ValueError, TypeError):
+            return None
+    return total
+
+
+def summarize(bpf_filter, seen, received, dropped):
+    """
+    Capture counters as reported by the API
+
+    Args:
+        bpf_filter: Filter in effect ('' for none)
+        seen: Packets on the interface since capture started (None if unknown)
+        received: Packets that passed the filter, including dropped ones
+            (None if unknown)
+        dropped: Packets that passed the filter but overflowed the socket buffer
+    """
+    if received is None:
+        return {'bpf_filter': bpf_filter, 'interface_packets': seen, 'kernel_filtered': None,
+                'delivered': None, 'kernel_dropped': None}
+    return {
+        'bpf_filter': bpf_filter,
+        'interface_packets': seen,
+        'kernel_filtered': max(seen - received, 0) if seen is not None else None,
+        'delivered': received - dropped,
+        'kernel_dropped': dropped
+    }
+
+
+class CaptureStats:
+    def __init__(self, capture_socket, interface, bpf_filter, tpacket_v3=False):
+        """
+        Start counting for an open capture socket
+
+        Args:
+            capture_socket: Scapy listen socket (its .ins is the raw socket)
+            interface: Interface name the socket is bound to
+            bpf_filter: Filter attached to the socket ('' for none)
+            tpacket_v3: The socket has a TPACKET_V3 ring (see mmap_capture),
+                which also reports how often the ring was full (queue freezes)
+        """
+        self.socket = getattr(capture_socket, 'ins', capture_socket)
+        self.interface = interface
+        self.bpf_filter = bpf_filter
+        self._lock = threading.Lock()
+        self.supported = hasattr(socket, 'AF_PACKET') and isinstance(self.socket, socket.socket)
+        self.received = 0
+        self.dropped = 0
+        self.tpacket_v3 = tpacket_v3
+        self.queue_freezes = 0
+        self._stats_struct = _TPACKET_STATS_V3 if tpacket_v3 else _TPACKET_STATS
+        self._final = None
+        # Start both sets of counters from the same moment
+        self._baseline = interface_packets(interface)
+        self.poll()
+        self.received = self.dropped = self.queue_freezes = 0
+
+    def poll(self):
+        """Fold the kernel counters into the totals (the kernel resets them on read)"""
+        if not self.supported:
+            return
+        with self._lock:
+            try:
+                raw = self.socket.getsockopt(SOL_PACKET, PACKET_STATISTICS, self._stats_struct.size)
+            except OSError:
+                return  # Socket already closed; keep the last totals
+            counters = self._stats_struct.unpack(raw)
+            # tp_packets already includes tp_drops
+            self.received += counters[0]
+            self.dropped += counters[1]
+            if self.tpacket_v3:
+                self.queue_freezes += counters[2]
+
+    def counters(self):
+        """(interface packets, received, dropped) since the socket was opened"""
+        if self._final is not None:
+            return self._final
+        self.poll()
+        seen = None
+        current = interface_packets(self.interface)
+        if current is not None and self._baseline is not None:
+            seen = current - self._baseline
+        if not self.supported:
+            return seen, None, None
+        return seen, self.received, self.dropped
+
+    def finish(self):
+        """Take the final reading before the socket is closed"""
+        self._final = self.counters()
+
+    def get_stats(self):
+        stats = summarize(self.bpf_filter, *self.counters())
+        if self.tpacket_v3:
+            stats['queue_freezes'] = self.queue_freezes if self.supported else None
+        return stats
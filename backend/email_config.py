@@ -31,3 +31,17 @@ SENDGRID_TO_EMAIL = os.getenv('SENDGRID_TO_EMAIL', 'admin@yourdomain.com')
 
 # Email Template Settings
 EMAIL_SUBJECT_PREFIX = os.getenv('EMAIL_SUBJECT_PREFIX', '[IDS Alert]')
+
+# Delivery Queue Settings
+EMAIL_QUEUE_SIZE = int(os.getenv('EMAIL_QUEUE_SIZE', '1000'))
+EMAIL_MAX_RETRIES = int(os.getenv('EMAIL_MAX_RETRIES', '3'))
+EMAIL_RETRY_BACKOFF = float(os.getenv('EMAIL_RETRY_BACKOFF', '2.0'))  # Seconds, doubled per retry
+EMAIL_SMTP_IDLE_TIMEOUT = float(os.getenv('EMAIL_SMTP_IDLE_TIMEOUT', '60'))  # Close idle SMTP session
+
+# Digest Mode: immediate severities are sent at once, the rest are batched
+EMAIL_DIGEST_ENABLED = os.getenv('EMAIL_DIGEST_ENABLED', 'False').lower() == 'true'
+EMAIL_DIGEST_INTERVAL = float(os.getenv('EMAIL_DIGEST_INTERVAL', '300'))  # Seconds after the first batched alert
+EMAIL_DIGEST_MAX_ALERTS = int(os.getenv('EMAIL_DIGEST_MAX_ALERTS', '100'))  # Send early once this many are batched
+EMAIL_DIGEST_IMMEDIATE_SEVERITIES = [
+    level.strip() for level in os.getenv('EMAIL_DIGEST_IMMEDIATE_SEVERITIES', 'Critical').split(',') if level.strip()
+]
@@ -0,0 +1,224 @@
+"""
+Asynchronous Email Delivery
+Background worker that delivers queued messages over a persistent SMTP
+session, so request threads never wait on the mail server
+
+The session is opened on the first message, reused for the ones after it and
+closed after a period of inactivity. A dropped connection is reopened once
+per message; messages that still fail are retried with exponential backoff.
+"""
+
+import heapq
+import itertools
+import queue
+import smtplib
+import threading
+import time
+
+
+class SMTPSession:
+    def __init__(self, host, port, username, password, use_ssl=True, use_tls=False,
+                 timeout=30, idle_timeout=60.0):
+        """
+        Initialize a reusable SMTP session
+
+        Args:
+            host, port: SMTP server
+            username, password: Login credentials
+            use_ssl: Connect with implicit TLS (SMTP_SSL)
+            use_tls: Upgrade a plain connection with STARTTLS
+            timeout: Socket timeout in seconds
+            idle_timeout: Seconds of inactivity after which the session is closed
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+
+        self._server = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    def _connect(self):
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                server.starttls()
+        server.login(self.username, self.password)
+        self.connects += 1
+        return server
+
+    def send(self, message):
+        """Send a message, reconnecting once if the session was dropped"""
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.send_message(message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self.close()
+            self._server = self._connect()
+            self._server.send_message(message)
+        except (smtplib.SMTPResponseException, OSError):
+            # Unknown session state; start the next attempt on a fresh connection
+            self.close()
+            raise
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        """Close the session once it has been unused for idle_timeout"""
+        if self._server is not None and time.monotonic() - self._last_used >= self.idle_timeout:
+            self.close()
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+
+class EmailDeliveryQueue:
+    def __init__(self, deliver, max_size=1000, max_retries=3, retry_backoff=2.0, max_backoff=300.0,
+                 on_idle=None, idle_interval=1.0):
+        """
+        Initialize the delivery queue
+
+        Args:
+            deliver: Function that sends one message (raises on failure)
+            max_size: Messages waiting for delivery; submits beyond this are rejected
+            max_retries: Delivery attempts after the first before a message is dropped
+            retry_backoff: Delay before the first retry, doubled on each further retry
+            max_backoff: Upper bound for the retry delay in seconds
+            on_idle: Called periodically while there is nothing to send
+                (e.g. to close an idle SMTP session)
+            idle_interval: Seconds between on_idle calls
+        """
+        self.deliver = deliver
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.on_idle = on_idle
+        self.idle_interval = idle_interval
+
+        self._queue = queue.Queue(maxsize=max_size)
+        self._retries = []              # Heap of (due, seq, job) waiting for their backoff
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'queued': 0, 'sent': 0, 'failed': 0, 'retried': 0, 'rejected': 0,
+                      'total_send_ms': 0.0, 'last_send_ms': 0.0, 'total_queue_ms': 0.0}
+
+    def start(self):
+        """Start the delivery thread"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        """Deliver what is queued (retries pending a backoff are dropped) and stop"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._queue.put(None)
+            thread.join(timeout=timeout)
+
+    def submit(self, message, description=''):
+        """
+        Queue a message for delivery
+
+        Returns:
+            True if queued, False if the queue is full
+        """
+        try:
+            self._queue.put_nowait(_Job(message, description))
+        except queue.Full:
+            with self._lock:
+                self.stats['rejected'] += 1
+            return False
+        with self._lock:
+            self.stats['queued'] += 1
+        return True
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                break
+            if job is not False:
+                self._attempt(job)
+
+    def _next_job(self):
+        """Next job to send: a due retry, else a queued one (False on idle)"""
+        now = time.monotonic()
+        if self._retries and self._retries[0][0] <= now:
+            return heapq.heappop(self._retries)[2]
+
+        wait = self.idle_interval
+        if self._retries:
+            wait = min(wait, self._retries[0][0] - now)
+        try:
+            return self._queue.get(timeout=max(wait, 0.0))
+        except queue.Empty:
+            if self.on_idle and not self._retries:
+                self.on_idle()
+            return False
+
+    def _attempt(self, job):
+        started = time.monotonic()
+        try:
+            self.deliver(job.message)
+        except Exception as e:
+            job.attempts += 1
+            with self._lock:
+                if job.attempts > self.max_retries:
+                    self.stats['failed'] += 1
+                    print(f"❌ Email delivery failed after {job.attempts} attempts: {str(e)}")
+                    return
+                self.stats['retried'] += 1
+            delay = min(self.retry_backoff * 2 ** (job.attempts - 1), self.max_backoff)
+            print(f"⚠️  Email delivery failed ({str(e)}), retrying in {delay:g}s")
+            heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq), job))
+            return
+
+        finished = time.monotonic()
+        with self._lock:
+            send_ms = (finished - started) * 1000
+            self.stats['sent'] += 1
+            self.stats['last_send_ms'] = send_ms
+            self.stats['total_send_ms'] += send_ms
+            self.stats['total_queue_ms'] += (finished - job.enqueued) * 1000
+        print(f"✅ Email sent: {job.description}" if job.description else "✅ Email sent")
+
+    def depth(self):
+        """Messages waiting for delivery, including pending retries"""
+        return self._queue.qsize() + len(self._retries)
+
+    def get_stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            stats = dict(self.stats)
+        sent = stats['sent']
+        stats['queue_depth'] = self.depth()
+        stats['avg_send_ms'] = stats['total_send_ms'] / sent if sent else 0.0
+        stats['avg_delivery_ms'] = stats['total_queue_ms'] / sent if sent else 0.0
+        stats['running'] = bool(self._thread and self._thread.is_alive())
+        return stats
+
+
+class _Job:
+    __slots__ = ('message', 'description', 'attempts', 'enqueued')
+
+    def __init__(self, message, description):
+        self.message = message
+        self.description = description
+        self.attempts = 0
+        self.enqueued = time.monotonic()
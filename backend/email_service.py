@@ -1,217 +1,224 @@
 """
 Email Service for IDS Alert System
 Supports Gmail SMTP, Generic SMTP, and SendGrid
+
+Emails are queued and delivered by a background worker over a persistent
+SMTP session, so callers never block on the mail server. In digest mode,
+alerts below the immediate severities are collected and sent as one digest
+email every EMAIL_DIGEST_INTERVAL seconds or EMAIL_DIGEST_MAX_ALERTS alerts.
 """
 
-import smtplib
+import threading
+
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from datetime import datetime
 from email_config import *
+from email_delivery import EmailDeliveryQueue, SMTPSession
+from email_templates import render_alert, render_digest
 
 class EmailService:
     def __init__(self):
         self.enabled = EMAIL_ENABLED
         self.service = EMAIL_SERVICE
+        self.smtp_session = self._build_smtp_session()
+        self.sendgrid_client = None
+        
+        # Messages are delivered by a background worker (see email_delivery)
+        self.delivery_queue = EmailDeliveryQueue(
+            self._deliver,
+            max_size=EMAIL_QUEUE_SIZE,
+            max_retries=EMAIL_MAX_RETRIES,
+            retry_backoff=EMAIL_RETRY_BACKOFF,
+            on_idle=self.smtp_session.close_if_idle if self.smtp_session else None
+        )
+        
+        # Digest batching
+        self.digest_enabled = EMAIL_DIGEST_ENABLED
+        self.digest_interval = EMAIL_DIGEST_INTERVAL
+        self.digest_max_alerts = EMAIL_DIGEST_MAX_ALERTS
+        self.immediate_severities = set(EMAIL_DIGEST_IMMEDIATE_SEVERITIES)
+        self._digest = []
+        self._digest_timer = None
+        self._digest_lock = threading.Lock()
+        self.digests_sent = 0
+    
+    def _build_smtp_session(self):
+        """Persistent SMTP session for the configured service (None for SendGrid)"""
+        if self.service == 'gmail':
+            return SMTPSession('smtp.gmail.com', 465, GMAIL_SENDER, GMAIL_APP_PASSWORD,
+                               use_ssl=True, idle_timeout=EMAIL_SMTP_IDLE_TIMEOUT)
+        if self.service == 'smtp':
+            return SMTPSession(SMTP_HOST, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD,
+                               use_ssl=not SMTP_USE_TLS, use_tls=SMTP_USE_TLS,
+                               idle_timeout=EMAIL_SMTP_IDLE_TIMEOUT)
+        return None
         
     def send_alert_email(self, alert_data):
-        """Send email alert based on configured service"""
+        """
+        Queue an email alert for the configured service
+        
+        Returns immediately; delivery (with retries) happens in the background.
+        """
         if not self.enabled:
             print("📧 Email alerts are disabled in configuration")
             return {'status': 'disabled', 'message': 'Email alerts are disabled'}
         
+        error = self._check_config()
+        if error:
+            return {'status': 'error', 'message': error}
+        
+        if self.digest_enabled and alert_data.get('severity') not in self.immediate_severities:
+            return self._add_to_digest(alert_data)
+        
         try:
-            if self.service == 'gmail':
-                return self._send_gmail(alert_data)
-            elif self.service == 'smtp':
-                return self._send_smtp(alert_data)
-            elif self.service == 'sendgrid':
-                return self._send_sendgrid(alert_data)
-            else:
-                return {'status': 'error', 'message': f'Unknown email service: {self.service}'}
+            message = self._create_alert_message(alert_data)
         except Exception as e:
             print(f"❌ Email sending failed: {str(e)}")
             return {'status': 'error', 'message': str(e)}
+        return self._queue_message(message, f"{alert_data.get('threat_type', 'Unknown')} alert")
     
-    def _send_gmail(self, alert_data):
-        """Send email using Gmail SMTP"""
-        if not GMAIL_APP_PASSWORD:
-            return {'status': 'error', 'message': 'Gmail App Password not configured'}
-        
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"{EMAIL_SUBJECT_PREFIX} {alert_data.get('severity', 'Unknown')} Threat Detected"
-        msg['From'] = GMAIL_SENDER
-        msg['To'] = GMAIL_RECIPIENT
-        
-        # Create HTML email body
-        html_body = self._create_html_email(alert_data)
-        text_body = self._create_text_email(alert_data)
-        
-        # Attach both plain text and HTML versions
-        part1 = MIMEText(text_body, 'plain')
-        part2 = MIMEText(html_body, 'html')
-        msg.attach(part1)
-        msg.attach(part2)
-        
-        # Send email
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(GMAIL_SENDER, GMAIL_APP_PASSWORD)
-            server.send_message(msg)
+    def _queue_message(self, message, description):
+        """Hand a built message to the delivery worker"""
+        self.delivery_queue.start()
+        recipient = self._recipient()
+        if not self.delivery_queue.submit(message, description=f"{description} to {recipient}"):
+            print("❌ Email queue is full, alert email dropped")
+            return {'status': 'error', 'message': 'Email queue is full'}
+        
+        return {
+            'status': 'queued',
+            'message': f'Email queued for {recipient}',
+            'queue_depth': self.delivery_queue.depth()
+        }
+    
+    def _add_to_digest(self, alert_data):
+        """Batch a non-immediate alert into the pending digest"""
+        with self._digest_lock:
+            self._digest.append(dict(alert_data))
+            pending = len(self._digest)
+            if pending == 1:
+                # The digest window starts with its first alert
+                self._digest_timer = threading.Timer(self.digest_interval, self.flush_digest)
+                self._digest_timer.daemon = True
+                self._digest_timer.start()
+        
+        if pending >= self.digest_max_alerts:
+            return self.flush_digest()
+        return {
+            'status': 'queued',
+            'message': f'Alert added to email digest ({pending} pending)',
+            'digest_pending': pending
+        }
+    
+    def flush_digest(self):
+        """Send all batched alerts as one digest email now"""
+        with self._digest_lock:
+            alerts, self._digest = self._digest, []
+            if self._digest_timer:
+                self._digest_timer.cancel()
+                self._digest_timer = None
+        if not alerts:
+            return {'status': 'queued', 'message': 'No alerts pending for the digest', 'digest_pending': 0}
         
-        print(f"✅ Email sent successfully to {GMAIL_RECIPIENT}")
-        return {'status': 'success', 'message': f'Email sent to {GMAIL_RECIPIENT}'}
+        try:
+            message = self._create_digest_message(alerts)
+        except Exception as e:
+            print(f"❌ Email digest failed: {str(e)}")
+            return {'status': 'error', 'message': str(e)}
+        result = self._queue_message(message, f"digest of {len(alerts)} alerts")
+        if result['status'] == 'queued':
+            self.digests_sent += 1
+        return result
+    
+    def _check_config(self):
+        """Return a configuration error message, or None if sending is possible"""
+        if self.service == 'gmail':
+            if not GMAIL_APP_PASSWORD:
+                return 'Gmail App Password not configured'
+        elif self.service == 'smtp':
+            if not SMTP_USERNAME or not SMTP_PASSWORD:
+                return 'SMTP credentials not configured'
+        elif self.service == 'sendgrid':
+            if not SENDGRID_API_KEY:
+                return 'SendGrid API key not configured'
+            try:
+                import sendgrid
+            except ImportError:
+                return 'SendGrid library not installed. Run: pip install sendgrid'
+        else:
+            return f'Unknown email service: {self.service}'
+        return None
+    
+    def _recipient(self):
+        return SENDGRID_TO_EMAIL if self.service == 'sendgrid' else GMAIL_RECIPIENT
+    
+    def _create_alert_message(self, alert_data):
+        """Build the message for a single alert"""
+        subject = f"{EMAIL_SUBJECT_PREFIX} {alert_data.get('severity', 'Unknown')} Threat Detected"
+        text_body, html_body = render_alert(alert_data)
+        return self._create_message(subject, text_body, html_body)
     
-    def _send_smtp(self, alert_data):
-        """Send email using generic SMTP"""
-        if not SMTP_USERNAME or not SMTP_PASSWORD:
-            return {'status': 'error', 'message': 'SMTP credentials not configured'}
+    def _create_digest_message(self, alerts):
+        """Build one message covering a batch of alerts"""
+        subject = f"{EMAIL_SUBJECT_PREFIX} Digest: {len(alerts)} Threats Detected"
+        text_body, html_body = render_digest(alerts)
+        return self._create_message(subject, text_body, html_body)
+    
+    def _create_message(self, subject, text_body, html_body):
+        """Build the message for the configured service"""
+        if self.service == 'sendgrid':
+            from sendgrid.helpers.mail import Mail
+            return Mail(
+                from_email=SENDGRID_FROM_EMAIL,
+                to_emails=SENDGRID_TO_EMAIL,
+                subject=subject,
+                html_content=html_body
+            )
         
-        # Create message
+        # Attach both plain text and HTML versions
         msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"{EMAIL_SUBJECT_PREFIX} {alert_data.get('severity', 'Unknown')} Threat Detected"
-        msg['From'] = SMTP_USERNAME
+        msg['Subject'] = subject
+        msg['From'] = GMAIL_SENDER if self.service == 'gmail' else SMTP_USERNAME
         msg['To'] = GMAIL_RECIPIENT
-        
-        # Create email body
-        html_body = self._create_html_email(alert_data)
-        text_body = self._create_text_email(alert_data)
-        
-        part1 = MIMEText(text_body, 'plain')
-        part2 = MIMEText(html_body, 'html')
-        msg.attach(part1)
-        msg.attach(part2)
-        
-        # Send email
-        if SMTP_USE_TLS:
-            with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-                server.starttls()
-                server.login(SMTP_USERNAME, SMTP_PASSWORD)
-                server.send_message(msg)
+        msg.attach(MIMEText(text_body, 'plain'))
+        msg.attach(MIMEText(html_body, 'html'))
+        return msg
+    
+    def _deliver(self, message):
+        """Send one message (runs on the delivery thread)"""
+        if self.service == 'sendgrid':
+            self._send_sendgrid(message)
         else:
-            with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT) as server:
-                server.login(SMTP_USERNAME, SMTP_PASSWORD)
-                server.send_message(msg)
-        
-        print(f"✅ Email sent successfully via SMTP")
-        return {'status': 'success', 'message': 'Email sent via SMTP'}
+            self.smtp_session.send(message)
     
-    def _send_sendgrid(self, alert_data):
-        """Send email using SendGrid API"""
-        try:
+    def _send_sendgrid(self, message):
+        """Send a message using the SendGrid API"""
+        if self.sendgrid_client is None:
             from sendgrid import SendGridAPIClient
-            from sendgrid.helpers.mail import Mail
-        except ImportError:
-            return {'status': 'error', 'message': 'SendGrid library not installed. Run: pip install sendgrid'}
-        
-        if not SENDGRID_API_KEY:
-            return {'status': 'error', 'message': 'SendGrid API key not configured'}
-        
-        # Create message
-        message = Mail(
-            from_email=SENDGRID_FROM_EMAIL,
-            to_emails=SENDGRID_TO_EMAIL,
-            subject=f"{EMAIL_SUBJECT_PREFIX} {alert_data.get('severity', 'Unknown')} Threat Detected",
-            html_content=self._create_html_email(alert_data)
-        )
-        
-        # Send email
-        sg = SendGridAPIClient(SENDGRID_API_KEY)
-        response = sg.send(message)
-        
-        print(f"✅ Email sent via SendGrid (status: {response.status_code})")
-        return {'status': 'success', 'message': 'Email sent via SendGrid'}
+            self.sendgrid_client = SendGridAPIClient(SENDGRID_API_KEY)
+        response = self.sendgrid_client.send(message)
+        if response.status_code >= 400:
+            raise RuntimeError(f'SendGrid returned status {response.status_code}')
     
-    def _create_text_email(self, alert_data):
-        """Create plain text email body"""
-        return f"""
-INTRUSION DETECTION SYSTEM ALERT
-
-Threat Detected: {alert_data.get('threat_type', 'Unknown')}
-Severity: {alert_data.get('severity', 'Unknown')}
-Status: {alert_data.get('status', 'Unknown')}
-
-Source IP: {alert_data.get('source_ip', 'Unknown')}
-Destination IP: {alert_data.get('destination_ip', 'Unknown')}
-Port: {alert_data.get('port', 'Unknown')}
-Protocol: {alert_data.get('protocol', 'Unknown')}
-
-Description:
-{alert_data.get('description', 'No description available')}
-
-Timestamp: {alert_data.get('timestamp', datetime.now().isoformat())}
-
----
-This is an automated alert from your Intrusion Detection System.
-Please review and take appropriate action.
-"""
+    def get_stats(self):
+        """Delivery queue depth, latency and outcome counters"""
+        stats = self.delivery_queue.get_stats()
+        stats['enabled'] = self.enabled
+        stats['service'] = self.service
+        if self.smtp_session:
+            stats['smtp_connects'] = self.smtp_session.connects
+        stats['digest_enabled'] = self.digest_enabled
+        stats['digest_pending'] = len(self._digest)
+        stats['digests_sent'] = self.digests_sent
+        return stats
     
-    def _create_html_email(self, alert_data):
-        """Create HTML email body"""
-        severity = alert_data.get('severity', 'Unknown')
-        severity_colors = {
-            'Critical': '#ef4444',
-            'High': '#f59e0b',
-            'Medium': '#3b82f6',
-            'Low': '#10b981'
-        }
-        color = severity_colors.get(severity, '#6b7280')
-        
-        return f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <style>
-        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-        .header {{ background-color: {color}; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
-        .content {{ background-color: #f9fafb; padding: 20px; border: 1px solid #e5e7eb; }}
-        .alert-box {{ background-color: white; padding: 15px; margin: 10px 0; border-left: 4px solid {color}; }}
-        .label {{ font-weight: bold; color: #4b5563; }}
-        .value {{ color: #1f2937; }}
-        .footer {{ background-color: #f3f4f6; padding: 15px; text-align: center; font-size: 12px; color: #6b7280; border-radius: 0 0 5px 5px; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🚨 Security Alert</h1>
-            <h2>{severity} Threat Detected</h2>
-        </div>
-        
-        <div class="content">
-            <div class="alert-box">
-                <p><span class="label">Threat Type:</span> <span class="value">{alert_data.get('threat_type', 'Unknown')}</span></p>
-                <p><span class="label">Severity:</span> <span class="value" style="color: {color}; font-weight: bold;">{severity}</span></p>
-                <p><span class="label">Status:</span> <span class="value">{alert_data.get('status', 'Unknown')}</span></p>
-            </div>
-            
-            <div class="alert-box">
-                <h3>Network Details</h3>
-                <p><span class="label">Source IP:</span> <span class="value">{alert_data.get('source_ip', 'Unknown')}</span></p>
-                <p><span class="label">Destination IP:</span> <span class="value">{alert_data.get('destination_ip', 'Unknown')}</span></p>
-                <p><span class="label">Port:</span> <span class="value">{alert_data.get('port', 'Unknown')}</span></p>
-                <p><span class="label">Protocol:</span> <span class="value">{alert_data.get('protocol', 'Unknown')}</span></p>
-            </div>
-            
-            <div class="alert-box">
-                <h3>Description</h3>
-                <p>{alert_data.get('description', 'No description available')}</p>
-            </div>
-            
-            <div class="alert-box">
-                <p><span class="label">Timestamp:</span> <span class="value">{alert_data.get('timestamp', datetime.now().isoformat())}</span></p>
-            </div>
-        </div>
-        
-        <div class="footer">
-            <p>This is an automated alert from your Intrusion Detection System.</p>
-            <p>Please review and take appropriate action.</p>
-        </div>
-    </div>
-</body>
-</html>
-"""
+    def shutdown(self, timeout=10):
+        """Send the pending digest, deliver queued emails and close the SMTP session"""
+        if self._digest:
+            self.flush_digest()
+        self.delivery_queue.stop(timeout=timeout)
+        if self.smtp_session:
+            self.smtp_session.close()
 
 # Create singleton instance
 email_service = EmailService()
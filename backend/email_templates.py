@@ -0,0 +1,289 @@
+"""
+Precompiled Email Templates
+Alert email bodies are parsed once at import into literal chunks and field
+slots; rendering only fills the slots and joins the chunks
+
+Placeholders are written {{name}}. In HTML templates values are HTML-escaped
+unless the placeholder is {{name|raw}} (used for already rendered fragments
+such as digest table rows). CSS braces are left alone.
+"""
+
+import re
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from html import escape
+
+_PLACEHOLDER = re.compile(r'\{\{\s*(\w+)(\|raw)?\s*\}\}')
+
+SEVERITY_COLORS = {
+    'Critical': '#ef4444',
+    'High': '#f59e0b',
+    'Medium': '#3b82f6',
+    'Low': '#10b981'
+}
+DEFAULT_COLOR = '#6b7280'
+
+# Alert field -> value used when the alert does not have it
+FIELD_DEFAULTS = {
+    'threat_type': 'Unknown',
+    'severity': 'Unknown',
+    'status': 'Unknown',
+    'source_ip': 'Unknown',
+    'destination_ip': 'Unknown',
+    'port': 'Unknown',
+    'protocol': 'Unknown',
+    'description': 'No description available'
+}
+
+
+class Template:
+    def __init__(self, source, html=False):
+        """
+        Compile a template
+
+        Args:
+            source: Template text with {{name}} placeholders
+            html: Escape substituted values for HTML
+        """
+        self.html = html
+        self._parts = []    # Literal chunks, with a None slot per placeholder
+        self._slots = []    # (index into _parts, field name or 'name|raw')
+        escaped = set()
+        raw = set()
+        position = 0
+        for match in _PLACEHOLDER.finditer(source):
+            name = match.group(1)
+            if html and not match.group(2):
+                escaped.add(name)
+                key = name
+            else:
+                raw.add(name)
+                key = name + '|raw'
+            self._parts.append(source[position:match.start()])
+            self._slots.append((len(self._parts), key))
+            self._parts.append(None)
+            position = match.end()
+        self._parts.append(source[position:])
+        self._escaped = tuple(escaped)
+        self._raw = tuple(raw)
+        self.fields = frozenset(escaped | raw)
+
+    def render(self, values):
+        """
+        Fill the placeholders from a mapping
+
+        Raises:
+            KeyError: a placeholder has no value
+        """
+        # Each field is converted (and escaped) once, however often it appears
+        filled = {}
+        for name in self._escaped:
+            value = values[name]
+            filled[name] = _escape(value if type(value) is str else str(value))
+        for name in self._raw:
+            value = values[name]
+            filled[name + '|raw'] = value if type(value) is str else str(value)
+
+        parts = self._parts.copy()
+        for index, key in self._slots:
+            parts[index] = filled[key]
+        return ''.join(parts)
+
+
+# Field values repeat heavily across alerts (severities, IPs, threat types)
+_escape = lru_cache(maxsize=4096)(escape)
+
+
+def alert_fields(alert_data):
+    """Template values for one alert, with defaults for missing fields"""
+    values = {field: alert_data.get(field, default) for field, default in FIELD_DEFAULTS.items()}
+    timestamp = alert_data.get('timestamp')
+    values['timestamp'] = timestamp if timestamp is not None else datetime.now().isoformat()
+    values['color'] = SEVERITY_COLORS.get(values['severity'], DEFAULT_COLOR)
+    # Aggregated summaries (see alert_aggregator) stand for several hits
+    hit_count = alert_data.get('hit_count')
+    if hit_count:
+        values['occurrences'] = (f"{hit_count} (first seen {alert_data.get('first_seen', 'Unknown')}, "
+                                 f"last seen {alert_data.get('last_seen', 'Unknown')})")
+    else:
+        values['occurrences'] = '1'
+    return values
+
+
+def severity_summary(alerts):
+    """e.g. 'High: 3, Low: 1' for a batch of alerts"""
+    severities = Counter(alert.get('severity', 'Unknown') for alert in alerts)
+    return ', '.join(f"{level}: {count}" for level, count in severities.most_common())
+
+
+ALERT_TEXT = Template("""
+INTRUSION DETECTION SYSTEM ALERT
+
+Threat Detected: {{threat_type}}
+Severity: {{severity}}
+Status: {{status}}
+Occurrences: {{occurrences}}
+
+Source IP: {{source_ip}}
+Destination IP: {{destination_ip}}
+Port: {{port}}
+Protocol: {{protocol}}
+
+Description:
+{{description}}
+
+Timestamp: {{timestamp}}
+
+---
+This is an automated alert from your Intrusion Detection System.
+Please review and take appropriate action.
+""")
+
+ALERT_HTML = Template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .header { background-color: {{color|raw}}; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }
+        .content { background-color: #f9fafb; padding: 20px; border: 1px solid #e5e7eb; }
+        .alert-box { background-color: white; padding: 15px; margin: 10px 0; border-left: 4px solid {{color|raw}}; }
+        .label { font-weight: bold; color: #4b5563; }
+        .value { color: #1f2937; }
+        .footer { background-color: #f3f4f6; padding: 15px; text-align: center; font-size: 12px; color: #6b7280; border-radius: 0 0 5px 5px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🚨 Security Alert</h1>
+            <h2>{{severity}} Threat Detected</h2>
+        </div>
+
+        <div class="content">
+            <div class="alert-box">
+                <p><span class="label">Threat Type:</span> <span class="value">{{threat_type}}</span></p>
+                <p><span class="label">Severity:</span> <span class="value" style="color: {{color|raw}}; font-weight: bold;">{{severity}}</span></p>
+                <p><span class="label">Status:</span> <span class="value">{{status}}</span></p>
+                <p><span class="label">Occurrences:</span> <span class="value">{{occurrences}}</span></p>
+            </div>
+
+            <div class="alert-box">
+                <h3>Network Details</h3>
+                <p><span class="label">Source IP:</span> <span class="value">{{source_ip}}</span></p>
+                <p><span class="label">Destination IP:</span> <span class="value">{{destination_ip}}</span></p>
+                <p><span class="label">Port:</span> <span class="value">{{port}}</span></p>
+                <p><span class="label">Protocol:</span> <span class="value">{{protocol}}</span></p>
+            </div>
+
+            <div class="alert-box">
+                <h3>Description</h3>
+                <p>{{description}}</p>
+            </div>
+
+            <div class="alert-box">
+                <p><span class="label">Timestamp:</span> <span class="value">{{timestamp}}</span></p>
+            </div>
+        </div>
+
+        <div class="footer">
+            <p>This is an automated alert from your Intrusion Detection System.</p>
+            <p>Please review and take appropriate action.</p>
+        </div>
+    </div>
+</body>
+</html>
+""", html=True)
+
+DIGEST_TEXT_ROW = Template("""{{timestamp}}  {{severity}}  {{threat_type}}  {{source_ip}} -> {{destination_ip}}:{{port}}
+    {{description}}
+""")
+
+DIGEST_TEXT = Template("""
+INTRUSION DETECTION SYSTEM ALERT DIGEST
+
+{{count}} threats detected ({{summary}})
+
+{{rows}}
+---
+This is an automated alert digest from your Intrusion Detection System.
+Please review and take appropriate action.
+""")
+
+DIGEST_HTML_ROW = Template("""
+                <tr>
+                    <td>{{timestamp}}</td>
+                    <td style="color: {{color|raw}}; font-weight: bold;">{{severity}}</td>
+                    <td>{{threat_type}}</td>
+                    <td>{{source_ip}}</td>
+                    <td>{{destination_ip}}:{{port}}</td>
+                    <td>{{description}}</td>
+                </tr>""", html=True)
+
+DIGEST_HTML = Template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 900px; margin: 0 auto; padding: 20px; }
+        .header { background-color: #1f2937; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }
+        .content { background-color: #f9fafb; padding: 20px; border: 1px solid #e5e7eb; }
+        table { width: 100%; border-collapse: collapse; background-color: white; font-size: 13px; }
+        th { text-align: left; background-color: #f3f4f6; color: #4b5563; padding: 8px; }
+        td { padding: 8px; border-top: 1px solid #e5e7eb; color: #1f2937; vertical-align: top; }
+        .footer { background-color: #f3f4f6; padding: 15px; text-align: center; font-size: 12px; color: #6b7280; border-radius: 0 0 5px 5px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🚨 Security Alert Digest</h1>
+            <h2>{{count}} Threats Detected</h2>
+            <p>{{summary}}</p>
+        </div>
+
+        <div class="content">
+            <table>
+                <tr>
+                    <th>Timestamp</th>
+                    <th>Severity</th>
+                    <th>Threat Type</th>
+                    <th>Source IP</th>
+                    <th>Destination</th>
+                    <th>Description</th>
+                </tr>{{rows|raw}}
+            </table>
+        </div>
+
+        <div class="footer">
+            <p>This is an automated alert digest from your Intrusion Detection System.</p>
+            <p>Please review and take appropriate action.</p>
+        </div>
+    </div>
+</body>
+</html>
+""", html=True)
+
+
+def render_alert(alert_data):
+    """(text, html) bodies for one alert"""
+    values = alert_fields(alert_data)
+    return ALERT_TEXT.render(values), ALERT_HTML.render(values)
+
+
+def render_digest(alerts):
+    """(text, html) bodies for a batch of alerts"""
+    text_rows = []
+    html_rows = []
+    for alert in alerts:
+        values = alert_fields(alert)
+        text_rows.append(DIGEST_TEXT_ROW.render(values))
+        html_rows.append(DIGEST_HTML_ROW.render(values))
+
+    summary = {'count': len(alerts), 'summary': severity_summary(alerts)}
+    text = DIGEST_TEXT.render(dict(summary, rows=''.join(text_rows)))
+    html = DIGEST_HTML.render(dict(summary, rows=''.join(html_rows)))
+    return text, html
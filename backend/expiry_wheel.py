@@ -0,0 +1,110 @@
+"""
+Timing Wheel for Tracker Expiry
+Schedules keys to expire a fixed time after they were last touched, so
+stale tracker entries are evicted in bulk on tick boundaries instead of
+sweeping every tracked IP on every packet
+"""
+
+import time
+
+
+class ExpiryWheel:
+    def __init__(self, ttl, tick=1.0, clock=time.monotonic):
+        """
+        Initialize the timing wheel
+
+        Args:
+            ttl: Seconds after the last touch at which a key expires
+            tick: Wheel resolution in seconds; expiry happens on tick boundaries
+            clock: Monotonic time source (overridable for replays and tests)
+        """
+        self.ttl = float(ttl)
+        self.tick = float(tick)
+        self.clock = clock
+
+        # Enough slots that a deadline never wraps onto the current slot
+        self.num_slots = int(self.ttl // self.tick) + 2
+        self.slots = [[] for _ in range(self.num_slots)]
+
+        # key -> tick at which it currently expires
+        self.deadlines = {}
+        self.current_tick = int(self.clock() // self.tick)
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def touch(self, key, now=None):
+        """
+        Mark a key as seen, pushing its expiry to now + ttl
+
+        A key is appended to a slot at most once per tick; the stale slot
+        entry left behind is skipped lazily when that slot is processed,
+        which keeps touch() O(1).
+        """
+        if now is None:
+            now = self.clock()
+        deadline = int((now + self.ttl) // self.tick) + 1
+        if self.deadlines.get(key) != deadline:
+            self.deadlines[key] = deadline
+            self.slots[deadline % self.num_slots].append(key)
+
+    def discard(self, key):
+        """Stop tracking a key (its slot entry is dropped lazily)"""
+        self.deadlines.pop(key, None)
+
+    def advance(self, now=None):
+        """
+        Move the wheel forward to the current time
+
+        Returns:
+            list of keys whose deadline has passed since the last advance
+        """
+        if now is None:
+            now = self.clock()
+        target = int(now // self.tick)
+        if target <= self.current_tick:
+            return []
+
+        expired = []
+        # After a long idle gap every slot is due; visit each one only once
+        first = max(self.current_tick + 1, target - self.num_slots + 1)
+        for tick in range(first, target + 1):
+            index = tick % self.num_slots
+            slot = self.slots[index]
+            if not slot:
+                continue
+            self.slots[index] = []
+            for key in slot:
+                deadline = self.deadlines.get(key)
+                if deadline is None:
+                    continue
+                if deadline <= target:
+                    del self.deadlines[key]
+                    expired.append(key)
+                elif deadline % self.num_slots == index and deadline != tick:
+                    # Deadline is a full rotation away; keep it in this slot
+                    self.slots[index].append(key)
+        self.current_tick = target
+        return expired
+
+    def set_clock(self, clock):
+        """
+        Switch to another time source (e.g. capture timestamps during replay)
+
+        Keys already scheduled are given a fresh ttl on the new clock.
+        """
+        keys = list(self.deadlines)
+        self.clock = clock
+        self.clear()
+        self.current_tick = int(self.clock() // self.tick)
+        now = self.clock()
+        for key in keys:
+            self.touch(key, now)
+
+    def clear(self):
+        """Forget every scheduled key"""
+        self.slots = [[] for _ in range(self.num_slots)]
+        self.deadlines.clear()
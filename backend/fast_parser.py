@@ -0,0 +1,228 @@
+"""
+Fast-path Packet Header Parser
+Decodes Ethernet/IPv4/IPv6/TCP/UDP/ICMP headers straight from raw frame
+bytes with struct, producing a compact PacketRecord for the rule checks and
+the ML feature extractor without a full Scapy dissection
+
+Frames this parser cannot decode (exotic encapsulations, truncated or
+malformed headers) raise UnsupportedFrame so the caller can fall back to
+Scapy.
+"""
+
+import socket
+import struct
+
+# Link-layer types (pcap LINKTYPE_* values)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+
+# EtherTypes
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86DD
+ETH_P_8021Q = 0x8100
+ETH_P_8021AD = 0x88A8
+
+# Transport protocol numbers
+PROTO_ICMP = 1
+PROTO_TCP = 6
+PROTO_UDP = 17
+PROTO_ICMPV6 = 58
+
+# Protocol value used when the transport header was not decoded (fragments)
+PROTO_NONE = 0
+
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+
+PROTOCOL_NAMES = {PROTO_TCP: 'TCP', PROTO_UDP: 'UDP', PROTO_ICMP: 'ICMP', PROTO_ICMPV6: 'ICMPv6'}
+
+_IPV6_EXTENSION_HEADERS = (0, 43, 60)  # Hop-by-Hop, Routing, Destination Options
+_IPV6_FRAGMENT = 44
+
+_U16 = struct.Struct('!H')
+_U32_NATIVE = struct.Struct('=I')
+_IPV4_HEADER = struct.Struct('!BxHxxHxB')     # ver/ihl, total length, flags/frag offset, protocol
+_IPV6_HEADER = struct.Struct('!4xHB')         # payload length, next header
+_PORTS = struct.Struct('!HH')
+_TCP_FLAGS = struct.Struct('!12xBB')          # data offset/NS, flags
+
+_inet_ntoa = socket.inet_ntoa
+_inet_ntop = socket.inet_ntop
+_AF_INET6 = socket.AF_INET6
+
+
+class UnsupportedFrame(Exception):
+    """Raised when a frame needs the full Scapy dissector"""
+
+
+class PacketRecord:
+    """Compact per-packet record consumed by the rule checks and feature extractor"""
+
+    __slots__ = ('src_ip', 'dst_ip', 'ip_version', 'protocol', 'src_port', 'dst_port',
+                 'tcp_flags', 'length', 'payload', 'timestamp')
+
+    def __init__(self, src_ip, dst_ip, ip_version, protocol, src_port, dst_port,
+                 tcp_flags, length, payload, timestamp=None):
+        self.src_ip = src_ip
+        self.dst_ip = dst_ip
+        self.ip_version = ip_version
+        self.protocol = protocol
+        self.src_port = src_port
+        self.dst_port = dst_port
+        self.tcp_flags = tcp_flags
+        self.length = length
+        self.payload = payload
+        self.timestamp = timestamp
+
+    @property
+    def protocol_name(self):
+        return PROTOCOL_NAMES.get(self.protocol, 'Unknown')
+
+    def __repr__(self):
+        return (f"PacketRecord({self.protocol_name} {self.src_ip}:{self.src_port} -> "
+                f"{self.dst_ip}:{self.dst_port}, flags={self.tcp_flags:#x}, "
+                f"len={self.length}, payload={len(self.payload)})")
+
+
+def _network_offset(frame, linktype):
+    """
+    Locate the IP header inside a link-layer frame
+
+    Returns:
+        (offset, ethertype) or None if the frame does not carry IP
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 12
+        ethertype = _U16.unpack_from(frame, offset)[0]
+        offset += 2
+        while ethertype == ETH_P_8021Q or ethertype == ETH_P_8021AD:
+            ethertype = _U16.unpack_from(frame, offset + 2)[0]
+            offset += 4
+        return offset, ethertype
+    if linktype == LINKTYPE_LINUX_SLL:
+        return 16, _U16.unpack_from(frame, 14)[0]
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return 20, _U16.unpack_from(frame, 0)[0]
+    if linktype == LINKTYPE_NULL:
+        family = _U32_NATIVE.unpack_from(frame, 0)[0]
+        if family == 2:
+            return 4, ETH_P_IP
+        if family in (10, 24, 28, 30):
+            return 4, ETH_P_IPV6
+        return None
+    if linktype in (LINKTYPE_RAW, 12, 14, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        version = frame[0] >> 4
+        return 0, ETH_P_IP if version == 4 else ETH_P_IPV6 if version == 6 else None
+    raise UnsupportedFrame(f"link type {linktype}")
+
+
+def source_address(frame, linktype=LINKTYPE_ETHERNET):
+    """
+    Return the packed source IP of a frame without decoding anything else
+
+    Used to shard traffic by source; non-IP and undecodable frames yield b''
+    so they all land on the same shard.
+    """
+    try:
+        located = _network_offset(frame, linktype)
+        if located is None:
+            return b''
+        offset, ethertype = located
+        if ethertype == ETH_P_IP:
+            return bytes(frame[offset + 12:offset + 16])
+        if ethertype == ETH_P_IPV6:
+            return bytes(frame[offset + 8:offset + 24])
+    except (struct.error, IndexError, UnsupportedFrame):
+        pass
+    return b''
+
+
+def parse_frame(frame, linktype=LINKTYPE_ETHERNET, timestamp=None):
+    """
+    Decode a raw frame into a PacketRecord
+
+    Args:
+        frame: bytes, bytearray or memoryview holding the captured frame
+        linktype: pcap link-layer type of the frame
+        timestamp: Optional capture timestamp stored on the record
+
+    Returns:
+        PacketRecord, or None if the frame does not carry IPv4/IPv6
+
+    Raises:
+        UnsupportedFrame: the frame must be dissected by Scapy instead
+    """
+    try:
+        located = _network_offset(frame, linktype)
+        if located is None:
+            return None
+        offset, ethertype = located
+        frame_length = len(frame)
+
+        if ethertype == ETH_P_IP:
+            ver_ihl, total_length, fragment, protocol = _IPV4_HEADER.unpack_from(frame, offset)
+            header_length = (ver_ihl & 0x0F) * 4
+            if ver_ihl >> 4 != 4 or header_length < 20:
+                raise UnsupportedFrame("malformed IPv4 header")
+            src_ip = _inet_ntoa(frame[offset + 12:offset + 16])
+            dst_ip = _inet_ntoa(frame[offset + 16:offset + 20])
+            ip_version = 4
+            # Trim link-layer padding using the IP total length
+            end = offset + total_length if total_length else frame_length
+            if end > frame_length or end < offset + header_length:
+                end = frame_length
+            offset += header_length
+            if fragment & 0x1FFF:
+                protocol = PROTO_NONE  # Non-first fragment: no transport header
+        elif ethertype == ETH_P_IPV6:
+            payload_length, protocol = _IPV6_HEADER.unpack_from(frame, offset)
+            if frame_length < offset + 40:
+                raise UnsupportedFrame("truncated IPv6 header")
+            src_ip = _inet_ntop(_AF_INET6, frame[offset + 8:offset + 24])
+            dst_ip = _inet_ntop(_AF_INET6, frame[offset + 24:offset + 40])
+            ip_version = 6
+            end = offset + 40 + payload_length if payload_length else frame_length
+            if end > frame_length:
+                end = frame_length
+            offset += 40
+            # Walk the common extension headers to reach the transport header
+            while protocol in _IPV6_EXTENSION_HEADERS or protocol == _IPV6_FRAGMENT:
+                next_header = frame[offset]
+                if protocol == _IPV6_FRAGMENT:
+                    first_fragment = not (_U16.unpack_from(frame, offset + 2)[0] & 0xFFF8)
+                    offset += 8
+                    protocol = next_header if first_fragment else PROTO_NONE
+                    if not first_fragment:
+                        break
+                else:
+                    offset += (frame[offset + 1] + 1) * 8
+                    protocol = next_header
+        else:
+            return None
+
+        src_port = dst_port = tcp_flags = 0
+        if protocol == PROTO_TCP:
+            src_port, dst_port = _PORTS.unpack_from(frame, offset)
+            data_offset, flags = _TCP_FLAGS.unpack_from(frame, offset)
+            if data_offset >> 4 < 5:
+                raise UnsupportedFrame("malformed TCP header")
+            tcp_flags = ((data_offset & 0x01) << 8) | flags
+            offset += (data_offset >> 4) * 4
+        elif protocol == PROTO_UDP:
+            src_port, dst_port = _PORTS.unpack_from(frame, offset)
+            offset += 8
+        elif protocol == PROTO_ICMP or protocol == PROTO_ICMPV6:
+            if offset + 4 > end:
+                raise UnsupportedFrame("truncated ICMP header")
+            offset += 8
+
+        payload = bytes(frame[offset:end]) if offset < end else b''
+        return PacketRecord(src_ip, dst_ip, ip_version, protocol, src_port, dst_port,
+                            tcp_flags, frame_length, payload, timestamp)
+    except (struct.error, IndexError, ValueError, OSError) as e:
+        raise UnsupportedFrame(str(e))
@@ -0,0 +1,236 @@
+"""
+Compiled Random Forest Evaluator
+Flattens a fitted scikit-learn RandomForestClassifier into contiguous NumPy
+node arrays (feature, threshold, children, leaf probabilities) and evaluates
+all trees for a whole batch at once: one traversal yields both the class
+probabilities and the predicted class, without sklearn's per-call input
+validation and joblib dispatch
+
+Results are bit-for-bit identical to predict_proba()/predict(): inputs are
+cast to float32 as sklearn's tree code does (thresholds are rounded so the
+float32 comparison takes the same branch as sklearn's float64 one), leaf
+values are the ones DecisionTreeClassifier.predict_proba returns, and tree
+probabilities are summed in estimator order before dividing by the number
+of trees.
+
+Usage:
+    python forest_compiler.py [--trees 150] [--depth 20]   # parity + speed check
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+_SUM_BLOCK = 256
+
+
+class CompiledForest:
+    def __init__(self, feature, threshold, children, leaf_proba, roots, max_depth, classes, n_features):
+        """
+        Initialize from flattened node arrays (see from_sklearn)
+
+        Args:
+            feature: Split feature per node (0 for leaves)
+            threshold: float32 split threshold per node, rounded down so that
+                x <= threshold matches sklearn's float64 comparison exactly
+            children: Interleaved (right, left) child index per node, so the
+                next node is children[2 * node + goes_left]; leaves point at
+                themselves
+            leaf_proba: (n_nodes, n_classes) class probabilities per node
+            roots: Index of each tree's root node, in estimator order
+            max_depth: Deepest root-to-leaf path over all trees
+            classes: Class labels (the forest's classes_)
+            n_features: Expected number of input features
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+        self.n_features = n_features
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """
+        Compile a fitted RandomForestClassifier
+
+        Raises:
+            ValueError: the model is not a single-output tree ensemble classifier
+        """
+        estimators = getattr(forest, 'estimators_', None)
+        if not estimators or getattr(forest, 'n_outputs_', 1) != 1 or not hasattr(forest, 'classes_'):
+            raise ValueError('Only fitted single-output forest classifiers can be compiled')
+
+        normalize = _sklearn_normalizes_leaves()
+        features, thresholds, children, probas, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(offset, offset + tree.node_count)
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            pairs = np.empty((tree.node_count, 2), dtype=np.int64)
+            pairs[:, 0] = np.where(is_leaf, node_ids, tree.children_right + offset)
+            pairs[:, 1] = np.where(is_leaf, node_ids, tree.children_left + offset)
+            children.append(pairs.ravel())
+
+            value = np.ascontiguousarray(tree.value[:, 0, :], dtype=np.float64)
+            if normalize:
+                # scikit-learn < 1.4 stores class counts and normalizes at predict time
+                normalizer = value.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer
+            probas.append(value)
+
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += tree.node_count
+
+        index_type = np.int32 if 2 * offset < 2 ** 31 else np.int64
+        return cls(
+            feature=np.concatenate(features).astype(index_type),
+            threshold=_float32_floor(np.concatenate(thresholds)),
+            children=np.concatenate(children).astype(index_type),
+            leaf_proba=np.concatenate(probas),
+            roots=np.asarray(roots, dtype=index_type),
+            max_depth=max_depth,
+            classes=forest.classes_,
+            n_features=forest.n_features_in_
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def apply(self, X):
+        """
+        Leaf node index reached in every tree
+
+        Returns:
+            (n_trees, n_samples) array of global node indices
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f'Expected input of shape (n, {self.n_features}), got {X.shape}')
+        if np.isnan(X).any():
+            raise ValueError('Compiled forests do not handle missing (NaN) feature values')
+
+        # Feature-major copy: sample j's value of feature f is at f * n + j
+        n = X.shape[0]
+        values = np.ascontiguousarray(X.T).ravel()
+        columns = np.arange(n, dtype=self.roots.dtype)
+        nodes = np.repeat(self.roots[:, np.newaxis], n, axis=1)
+        feature, threshold, children = self.feature, self.threshold, self.children
+        for _ in range(self.max_depth):
+            goes_left = values[feature[nodes] * n + columns] <= threshold[nodes]
+            nodes = children[nodes * 2 + goes_left]
+        return nodes
+
+    def predict_with_proba(self, X):
+        """
+        Class probabilities and predicted classes in one traversal
+
+        Returns:
+            (predicted classes, (n_samples, n_classes) probabilities)
+        """
+        leaves = self.apply(X)
+        n = leaves.shape[1]
+        proba = np.empty((n, self.leaf_proba.shape[1]), dtype=np.float64)
+        # Reducing over the leading (tree) axis adds the trees one after the
+        # other in estimator order, as sklearn does, so rounding is identical.
+        # Blocks of samples bound the (trees, block, classes) temporary.
+        for start in range(0, n, _SUM_BLOCK):
+            stop = start + _SUM_BLOCK
+            proba[start:stop] = self.leaf_proba[leaves[:, start:stop]].sum(axis=0)
+        proba /= self.n_trees
+        return self.classes_.take(np.argmax(proba, axis=1), axis=0), proba
+
+    def predict_proba(self, X):
+        return self.predict_with_proba(X)[1]
+
+    def predict(self, X):
+        return self.predict_with_proba(X)[0]
+
+
+def _float32_floor(thresholds):
+    """
+    Largest float32 <= each float64 threshold
+
+    For a float32 input x, x <= floor32(t) exactly when x <= t, so splits can
+    be evaluated in float32 without changing any decision.
+    """
+    rounded = thresholds.astype(np.float32)
+    too_high = rounded.astype(np.float64) > thresholds
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+def _sklearn_normalizes_leaves():
+    import sklearn
+    major, minor = (int(part) for part in sklearn.__version__.split('.')[:2])
+    return (major, minor) < (1, 4)
+
+
+def _time_call(function, X, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(X)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check a compiled forest against scikit-learn')
+    parser.add_argument('--trees', type=int, default=150, help='Number of trees')
+    parser.add_argument('--depth', type=int, default=20, help='Maximum tree depth')
+    parser.add_argument('--samples', type=int, default=20000, help='Training samples')
+    args = parser.parse_args()
+
+    from sklearn.ensemble import RandomForestClassifier
+
+    # Synthetic stand-in for the IDS feature set: 11 features, 11 classes
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(args.samples, 11))
+    y = np.digitize(X[:, 0] + 0.5 * X[:, 1] * X[:, 2] + 0.3 * rng.normal(size=args.samples),
+                    np.linspace(-2, 2, 10))
+    forest = RandomForestClassifier(n_estimators=args.trees, max_depth=args.depth, random_state=0)
+    forest.fit(X, y)
+
+    started = time.perf_counter()
+    compiled = CompiledForest.from_sklearn(forest)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    print("\n" + "="*60)
+    print("🌲 COMPILED RANDOM FOREST")
+    print("="*60)
+    print(f"   Trees: {compiled.n_trees}, nodes: {compiled.n_nodes}, max depth: {compiled.max_depth}")
+    print(f"   Compile time: {compile_ms:.1f} ms")
+
+    X_test = rng.normal(size=(4096, 11))
+    classes, proba = compiled.predict_with_proba(X_test)
+    exact = np.array_equal(proba, forest.predict_proba(X_test)) and np.array_equal(classes, forest.predict(X_test))
+    print(f"   Bit-exact with sklearn: {'yes' if exact else 'NO'}")
+
+    for batch in (1, 64, 4096):
+        rows = X_test[:batch]
+        repeat = 20 if batch < 4096 else 3
+        sklearn_time = _time_call(lambda data: (forest.predict_proba(data), forest.predict(data)), rows, repeat)
+        compiled_time = _time_call(compiled.predict_with_proba, rows, repeat)
+        print(f"   Batch {batch:>4}: sklearn predict+predict_proba {sklearn_time * 1000:8.2f} ms | "
+              f"compiled {compiled_time * 1000:7.2f} ms ({sklearn_time / compiled_time:.1f}x)")
+    print("="*60)
+
+
+if __name__ == '__main__':
+    main()
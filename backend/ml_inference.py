@@ -0,0 +1,176 @@
+"""
+Micro-batched ML Inference Engine
+Collects per-packet feature vectors into small batches so the scaler,
+Random Forest and DNN run once per batch instead of once per packet
+"""
+
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class MicroBatchInference:
+    def __init__(self, predict_batch, on_result, batch_size=64, max_wait_ms=5.0,
+                 max_pending=10000, report_batches=False):
+        """
+        Initialize the micro-batching inference stage
+
+        Args:
+            predict_batch: Function taking an (N, n_features) matrix and
+                returning a list of N results
+            on_result: Function called as on_result(context, result) for
+                every submitted packet once its batch has been scored
+            batch_size: Maximum number of feature vectors per batch
+            max_wait_ms: Maximum time the first vector of a batch waits
+                before the batch is flushed, even if it is not full
+            max_pending: Bound on queued vectors; submit() blocks when full
+            report_batches: Print a line with the latency of every batch
+        """
+        self.predict_batch = predict_batch
+        self.on_result = on_result
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.report_batches = report_batches
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._worker = None
+        self._running = False
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.batches = 0
+        self.items = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+        self.last_batch_size = 0
+
+    def start(self, timeout=2):
+        """
+        Start the background inference worker
+
+        Args:
+            timeout: Seconds to wait for the worker of a previous stop()
+                that timed out to finish draining
+
+        Raises:
+            RuntimeError: If that worker is still busy after timeout
+        """
+        if self._running:
+            return
+        if self._worker is not None:
+            self._worker.join(timeout=timeout)  # A previous stop() timed out: let that worker drain first
+            if self._worker.is_alive():
+                raise RuntimeError(f"Previous inference worker still busy after {timeout}s")
+        self._running = True
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout=2):
+        """Stop the worker after scoring everything already submitted"""
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(None)
+        if self._worker:
+            self._worker.join(timeout=timeout)
+            if self._worker.is_alive():
+                print(f"⚠️  Inference worker still busy after {timeout}s; it exits after its current batch")
+                return
+        self._worker = None
+
+    def submit(self, features, context):
+        """
+        Queue one feature vector for scoring
+
+        Args:
+            features: 1-D feature vector (or a (1, n_features) array)
+            context: Opaque object handed back to on_result
+        """
+        self._queue.put((np.asarray(features).reshape(-1), context))
+
+    def flush(self):
+        """Score everything currently queued on the calling thread"""
+        pending = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                pending.append(item)
+        for start in range(0, len(pending), self.batch_size):
+            self._process(pending[start:start + self.batch_size])
+
+    def _run(self):
+        """Worker loop: gather a batch bounded by size or max wait, then score it"""
+        while self._running or not self._queue.empty():
+            try:
+                item = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                continue
+
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    break
+                batch.append(item)
+
+            self._process(batch)
+
+    def _process(self, batch):
+        """Run one vectorized prediction and fan results back out per packet"""
+        started = time.perf_counter()
+        try:
+            matrix = np.vstack([features for features, _ in batch])
+            results = self.predict_batch(matrix)
+        except Exception as e:
+            print(f"❌ ML batch inference error: {str(e)}")
+            results = [None] * len(batch)
+        latency = time.perf_counter() - started
+
+        with self._stats_lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self.last_latency = latency
+            self.last_batch_size = len(batch)
+
+        if self.report_batches:
+            print(f"⚡ ML batch: {len(batch)} packets in {latency * 1000:.2f} ms")
+
+        for (_, context), result in zip(batch, results):
+            try:
+                self.on_result(context, result)
+            except Exception as e:
+                print(f"❌ ML result handling error: {str(e)}")
+
+    def get_stats(self):
+        """Return batching and latency counters"""
+        with self._stats_lock:
+            avg = self.total_latency / self.batches if self.batches else 0.0
+            return {
+                'batch_size': self.batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'batches': self.batches,
+                'packets': self.items,
+                'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+                'last_batch_size': self.last_batch_size,
+                'avg_batch_latency_ms': avg * 1000,
+                'total_batch_latency_ms': self.total_latency * 1000,
+                'max_batch_latency_ms': self.max_latency * 1000,
+                'last_batch_latency_ms': self.last_latency * 1000,
+                'queued': self._queue.qsize()
+            }
@@ -4,29 +4,44 @@ Captures live network traffic and detects potential security threats
 Requires administrator/root privileges to run
 """
 
-from scapy.all import sniff, IP, TCP, UDP, ICMP, Raw
-from collections import defaultdict
 import threading
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from alert_aggregator import AlertAggregator
+from capture_filter import DEFAULT_BPF_FILTER
+from mmap_capture import DEFAULT_BLOCK_COUNT, DEFAULT_BLOCK_SIZE, MmapCapture, check_capture_backend
+from payload_scanner import SignatureScanner, categorize_signature, load_signatures
+from fast_parser import LINKTYPE_ETHERNET, PROTO_ICMP, PROTO_TCP, PROTO_UDP, TCP_SYN
+from source_trackers import create_trackers
+from raw_capture import open_capture_socket, to_record
 
 class PacketAnalyzer:
-    def __init__(self, alert_callback=None):
+    def __init__(self, alert_callback=None, signature_file=None, alert_window=60, tracker_backend='exact',
+                 bpf_filter=DEFAULT_BPF_FILTER, capture_backend='socket'):
         """
         Initialize the packet analyzer
         
         Args:
             alert_callback: Function to call when a threat is detected
+            signature_file: Optional payload signature file (see payload_scanner)
+            alert_window: Seconds repeated alerts (same source, destination,
+                port and threat type) are suppressed and summarized; 0 disables
+            tracker_backend: 'exact' per-source state, or 'sketch' for fixed
+                memory under spoofed-source floods (see source_trackers)
+            bpf_filter: Kernel-side capture filter ('' captures everything, the
+                default unless CAPTURE_BPF_FILTER is set; see capture_filter.NOISE_FILTER)
+            capture_backend: 'socket' (Scapy listen socket) or 'mmap' for a
+                memory-mapped TPACKET_V3 ring on Linux (see mmap_capture)
         """
         self.alert_callback = alert_callback
         self.running = False
         self.sniffer_thread = None
-        
-        # Tracking dictionaries for anomaly detection
-        self.connection_tracker = defaultdict(lambda: {'count': 0, 'last_seen': datetime.now()})
-        self.port_scan_tracker = defaultdict(lambda: {'ports': set(), 'last_seen': datetime.now()})
-        self.syn_flood_tracker = defaultdict(lambda: {'count': 0, 'last_seen': datetime.now()})
-        self.packet_rate_tracker = defaultdict(lambda: {'count': 0, 'last_seen': datetime.now()})
+        self.bpf_filter = bpf_filter
+        self.capture_stats = None  # Kernel filter/drop counters of the live capture
+        self.capture_backend = check_capture_backend(capture_backend)
+        self.MMAP_BLOCK_SIZE = DEFAULT_BLOCK_SIZE  # Ring block size in bytes (page multiple)
+        self.MMAP_BLOCK_COUNT = DEFAULT_BLOCK_COUNT  # Blocks in the ring
         
         # Thresholds for detection
         self.PORT_SCAN_THRESHOLD = 10  # Number of different ports accessed
@@ -34,6 +49,9 @@ class PacketAnalyzer:
         self.PACKET_RATE_THRESHOLD = 100  # Packets per second from single IP
         self.TIME_WINDOW = 10  # seconds
         
+        # Per-source state for anomaly detection (exact, or fixed-memory sketches)
+        self.trackers = create_trackers(tracker_backend, ttl=self.TIME_WINDOW)
+        
         # Suspicious ports
         self.SUSPICIOUS_PORTS = {
             23: 'Telnet',
@@ -60,6 +78,20 @@ class PacketAnalyzer:
             b'eval(',
             b'base64_decode'
         ]
+        
+        # Compile payload signatures once (built-in patterns + optional rule file)
+        self.payload_scanner = self._build_payload_scanner(signature_file)
+        
+        # Deduplicate repeated alerts before they reach alert_callback
+        self.alert_aggregator = AlertAggregator(self._deliver_alert, window=alert_window) if alert_window else None
+    
+    def _build_payload_scanner(self, signature_file=None):
+        """Compile MALICIOUS_PATTERNS and any file-based signatures into one scanner"""
+        signatures = [(pattern, categorize_signature(pattern)) for pattern in self.MALICIOUS_PATTERNS]
+        if signature_file:
+            signatures += load_signatures(signature_file)
+            print(f"✅ Loaded payload signatures from {signature_file}")
+        return SignatureScanner(signatures)
     
     def start_sniffing(self, interface=None):
         """Start packet sniffing in a separate thread"""
@@ -68,6 +100,8 @@ class PacketAnalyzer:
             return
         
         self.running = True
+        if self.alert_aggregator:
+            self.alert_aggregator.start()  # Summaries go out even when no packets arrive
         self.sniffer_thread = threading.Thread(
             target=self._sniff_packets,
             args=(interface,),
@@ -81,106 +115,161 @@ class PacketAnalyzer:
         self.running = False
         if self.sniffer_thread:
             self.sniffer_thread.join(timeout=2)
+        if self.alert_aggregator:
+            self.alert_aggregator.stop()
+            self.alert_aggregator.flush_all()
+        capture = self.get_capture_stats()
+        if capture and capture['delivered'] is not None:
+            print(f"📉 Kernel filter: {capture['kernel_filtered']} filtered, {capture['delivered']} delivered, "
+                  f"{capture['kernel_dropped']} dropped")
         print("🛑 Packet sniffer stopped")
     
+    def get_capture_stats(self):
+        """Packets filtered, delivered and dropped by the kernel (None before capture starts)"""
+        return self.capture_stats.get_stats() if self.capture_stats else None
+    
+    def replay_pcap(self, path, speed=None, use_capture_clock=True):
+        """
+        Replay a pcap/pcapng file through analyze_packet (no root needed)
+        
+        Args:
+            path: Capture file to replay
+            speed: None for as fast as possible, 1.0 for recorded timing,
+                other values scale the recorded timing
+            use_capture_clock: Expire tracker state on capture timestamps
+        
+        Returns:
+            dict with throughput, alert counts and per-stage timings
+        """
+        from pcap_replay import replay_pcap
+        return replay_pcap(self, path, speed=speed, use_capture_clock=use_capture_clock)
+    
     def _sniff_packets(self, interface):
-        """Internal method to sniff packets"""
+        """Internal method to sniff packets (undissected frames, see raw_capture)"""
         try:
-            sniff(
-                iface=interface,
-                prn=self.analyze_packet,
-                store=False,
-                stop_filter=lambda x: not self.running
-            )
+            if self.capture_backend == 'mmap':
+                self._capture_mmap(interface)
+                return
+            from scapy.all import sniff  # Only the socket backend needs Scapy
+            
+            capture_socket, self.capture_stats = open_capture_socket(interface, self.bpf_filter)
+            try:
+                sniff(
+                    opened_socket=capture_socket,
+                    prn=self.analyze_packet,
+                    store=False,
+                    stop_filter=lambda x: not self.running
+                )
+            finally:
+                self.capture_stats.finish()
+                capture_socket.close()
         except Exception as e:
             print(f"❌ Sniffing error: {str(e)}")
             print("💡 Make sure you're running with administrator/root privileges")
             self.running = False
     
-    def analyze_packet(self, packet):
-        """Analyze a single packet for threats"""
+    def _capture_mmap(self, interface):
+        """Read frames from a memory-mapped ring until stopped (see mmap_capture)"""
+        capture = MmapCapture(interface, block_size=self.MMAP_BLOCK_SIZE, block_count=self.MMAP_BLOCK_COUNT,
+                              bpf_filter=self.bpf_filter)
+        self.capture_stats = capture
         try:
-            if IP in packet:
-                src_ip = packet[IP].src
-                dst_ip = packet[IP].dst
-                
-                # Clean old entries
-                self._clean_old_entries()
-                
-                # Check for various attack patterns
-                self._check_port_scan(packet, src_ip)
-                self._check_syn_flood(packet, src_ip)
-                self._check_packet_rate(src_ip)
-                self._check_suspicious_ports(packet, src_ip, dst_ip)
-                self._check_malicious_payload(packet, src_ip, dst_ip)
-                self._check_icmp_flood(packet, src_ip)
-                
+            capture.run(lambda frame, linktype, timestamp: self.analyze_packet(frame, linktype),
+                        lambda: not self.running)
+        finally:
+            capture.close()
+    
+    def analyze_packet(self, packet, linktype=LINKTYPE_ETHERNET):
+        """
+        Analyze a single packet for threats
+        
+        Args:
+            packet: Raw frame bytes, an undissected frame from the capture
+                socket, or a dissected Scapy packet
+            linktype: pcap link-layer type of raw frames
+        """
+        try:
+            record = to_record(packet, linktype)
+            if record is not None:
+                self.analyze_record(record)
         except Exception as e:
             # Silently ignore packet processing errors
             pass
     
-    def _check_port_scan(self, packet, src_ip):
+    def analyze_record(self, record):
+        """Run every rule-based check against a parsed PacketRecord"""
+        src_ip = record.src_ip
+        
+        # Clean old entries
+        self._clean_old_entries()
+        
+        # Check for various attack patterns
+        self._check_port_scan(record, src_ip)
+        self._check_syn_flood(record, src_ip)
+        self._check_packet_rate(src_ip)
+        self._check_suspicious_ports(record, src_ip, record.dst_ip)
+        self._check_malicious_payload(record, src_ip, record.dst_ip)
+        self._check_icmp_flood(record, src_ip)
+    
+    def _check_port_scan(self, record, src_ip):
         """Detect port scanning activity"""
-        if TCP in packet:
-            dst_port = packet[TCP].dport
+        if record.protocol == PROTO_TCP:
+            dst_port = record.dst_port
             
             # Track ports accessed by this IP
-            self.port_scan_tracker[src_ip]['ports'].add(dst_port)
-            self.port_scan_tracker[src_ip]['last_seen'] = datetime.now()
+            ports_accessed = self.trackers.add_port(src_ip, dst_port)
             
             # Check if threshold exceeded
-            if len(self.port_scan_tracker[src_ip]['ports']) >= self.PORT_SCAN_THRESHOLD:
+            if ports_accessed >= self.PORT_SCAN_THRESHOLD:
                 self._trigger_alert({
                     'threat_type': 'Port Scan',
                     'severity': 'High',
                     'source_ip': src_ip,
-                    'destination_ip': packet[IP].dst,
-                    'description': f'Port scan detected: {len(self.port_scan_tracker[src_ip]["ports"])} ports accessed',
+                    'destination_ip': record.dst_ip,
+                    'description': f'Port scan detected: {ports_accessed} ports accessed',
                     'port': dst_port,
                     'protocol': 'TCP'
                 })
                 # Reset counter after alert
-                self.port_scan_tracker[src_ip]['ports'].clear()
+                self.trackers.reset('ports', src_ip)
     
-    def _check_syn_flood(self, packet, src_ip):
+    def _check_syn_flood(self, record, src_ip):
         """Detect SYN flood attacks"""
-        if TCP in packet and packet[TCP].flags == 'S':  # SYN flag
-            self.syn_flood_tracker[src_ip]['count'] += 1
-            self.syn_flood_tracker[src_ip]['last_seen'] = datetime.now()
+        if record.protocol == PROTO_TCP and record.tcp_flags == TCP_SYN:  # SYN flag only
+            syn_count = self.trackers.increment('syn', src_ip)
             
-            if self.syn_flood_tracker[src_ip]['count'] >= self.SYN_FLOOD_THRESHOLD:
+            if syn_count >= self.SYN_FLOOD_THRESHOLD:
                 self._trigger_alert({
                     'threat_type': 'DDoS Attack',
                     'severity': 'Critical',
                     'source_ip': src_ip,
-                    'destination_ip': packet[IP].dst,
-                    'description': f'Possible SYN flood: {self.syn_flood_tracker[src_ip]["count"]} SYN packets',
-                    'port': packet[TCP].dport,
+                    'destination_ip': record.dst_ip,
+                    'description': f'Possible SYN flood: {syn_count} SYN packets',
+                    'port': record.dst_port,
                     'protocol': 'TCP'
                 })
-                self.syn_flood_tracker[src_ip]['count'] = 0
+                self.trackers.reset('syn', src_ip)
     
     def _check_packet_rate(self, src_ip):
         """Detect abnormally high packet rates"""
-        self.packet_rate_tracker[src_ip]['count'] += 1
-        self.packet_rate_tracker[src_ip]['last_seen'] = datetime.now()
+        packet_count = self.trackers.increment('rate', src_ip)
         
-        if self.packet_rate_tracker[src_ip]['count'] >= self.PACKET_RATE_THRESHOLD:
+        if packet_count >= self.PACKET_RATE_THRESHOLD:
             self._trigger_alert({
                 'threat_type': 'DDoS Attack',
                 'severity': 'Critical',
                 'source_ip': src_ip,
                 'destination_ip': 'Multiple',
-                'description': f'High packet rate detected: {self.packet_rate_tracker[src_ip]["count"]} packets/sec',
+                'description': f'High packet rate detected: {packet_count} packets/sec',
                 'port': 0,
                 'protocol': 'Multiple'
             })
-            self.packet_rate_tracker[src_ip]['count'] = 0
+            self.trackers.reset('rate', src_ip)
     
-    def _check_suspicious_ports(self, packet, src_ip, dst_ip):
+    def _check_suspicious_ports(self, record, src_ip, dst_ip):
         """Detect connections to suspicious ports"""
-        if TCP in packet:
-            dst_port = packet[TCP].dport
+        if record.protocol == PROTO_TCP:
+            dst_port = record.dst_port
             if dst_port in self.SUSPICIOUS_PORTS:
                 self._trigger_alert({
                     'threat_type': 'Suspicious Connection',
@@ -192,77 +281,64 @@ class PacketAnalyzer:
                     'protocol': 'TCP'
                 })
     
-    def _check_malicious_payload(self, packet, src_ip, dst_ip):
+    def _check_malicious_payload(self, record, src_ip, dst_ip):
         """Check packet payload for malicious patterns"""
-        if Raw in packet:
-            payload = bytes(packet[Raw].load)
+        if record.payload:
+            # Single case-insensitive pass for every signature
+            matches = self.payload_scanner.scan(record.payload)
             
-            for pattern in self.MALICIOUS_PATTERNS:
-                if pattern in payload.lower():
-                    threat_type = 'SQL Injection' if b'SELECT' in pattern or b'UNION' in pattern else \
-                                  'XSS Attack' if b'script' in pattern or b'javascript' in pattern else \
-                                  'Command Injection' if b'cmd.exe' in pattern or b'bash' in pattern else \
-                                  'Malicious Payload'
-                    
-                    self._trigger_alert({
-                        'threat_type': threat_type,
-                        'severity': 'High',
-                        'source_ip': src_ip,
-                        'destination_ip': dst_ip,
-                        'description': f'Malicious pattern detected in payload: {pattern.decode("utf-8", errors="ignore")}',
-                        'port': packet[TCP].dport if TCP in packet else packet[UDP].dport if UDP in packet else 0,
-                        'protocol': 'TCP' if TCP in packet else 'UDP' if UDP in packet else 'Unknown'
-                    })
-                    break
+            if matches:
+                _, threat_type = matches[0]
+                matched = ', '.join(p.decode("utf-8", errors="ignore") for p, _ in matches)
+                has_ports = record.protocol in (PROTO_TCP, PROTO_UDP)
+                
+                self._trigger_alert({
+                    'threat_type': threat_type,
+                    'severity': 'High',
+                    'source_ip': src_ip,
+                    'destination_ip': dst_ip,
+                    'description': f'Malicious pattern detected in payload: {matched}',
+                    'port': record.dst_port if has_ports else 0,
+                    'protocol': record.protocol_name if has_ports else 'Unknown',
+                    'signatures': [{'pattern': p.decode("utf-8", errors="ignore"), 'category': c} for p, c in matches]
+                })
     
-    def _check_icmp_flood(self, packet, src_ip):
+    def _check_icmp_flood(self, record, src_ip):
         """Detect ICMP flood attacks"""
-        if ICMP in packet:
-            self.connection_tracker[src_ip]['count'] += 1
-            self.connection_tracker[src_ip]['last_seen'] = datetime.now()
+        if record.protocol == PROTO_ICMP:
+            icmp_count = self.trackers.increment('icmp', src_ip)
             
-            if self.connection_tracker[src_ip]['count'] >= 30:
+            if icmp_count >= 30:
                 self._trigger_alert({
                     'threat_type': 'ICMP Flood',
                     'severity': 'High',
                     'source_ip': src_ip,
-                    'destination_ip': packet[IP].dst,
-                    'description': f'ICMP flood detected: {self.connection_tracker[src_ip]["count"]} packets',
+                    'destination_ip': record.dst_ip,
+                    'description': f'ICMP flood detected: {icmp_count} packets',
                     'port': 0,
                     'protocol': 'ICMP'
                 })
-                self.connection_tracker[src_ip]['count'] = 0
+                self.trackers.reset('icmp', src_ip)
     
     def _clean_old_entries(self):
-        """Remove old entries from tracking dictionaries"""
-        current_time = datetime.now()
-        cutoff_time = current_time - timedelta(seconds=self.TIME_WINDOW)
-        
-        # Clean port scan tracker
-        for ip in list(self.port_scan_tracker.keys()):
-            if self.port_scan_tracker[ip]['last_seen'] < cutoff_time:
-                del self.port_scan_tracker[ip]
-        
-        # Clean SYN flood tracker
-        for ip in list(self.syn_flood_tracker.keys()):
-            if self.syn_flood_tracker[ip]['last_seen'] < cutoff_time:
-                del self.syn_flood_tracker[ip]
-        
-        # Clean packet rate tracker
-        for ip in list(self.packet_rate_tracker.keys()):
-            if self.packet_rate_tracker[ip]['last_seen'] < cutoff_time:
-                del self.packet_rate_tracker[ip]
-        
-        # Clean connection tracker
-        for ip in list(self.connection_tracker.keys()):
-            if self.connection_tracker[ip]['last_seen'] < cutoff_time:
-                del self.connection_tracker[ip]
+        """Expire per-source state older than TIME_WINDOW"""
+        self.trackers.expire()
+        if self.alert_aggregator:
+            self.alert_aggregator.flush()
     
     def _trigger_alert(self, alert_data):
-        """Trigger an alert when a threat is detected"""
+        """Trigger an alert when a threat is detected (repeats are aggregated)"""
         if self.alert_callback:
             alert_data['timestamp'] = datetime.now().isoformat()
             alert_data['status'] = 'Active'
+            if self.alert_aggregator:
+                self.alert_aggregator.submit(alert_data)
+            else:
+                self._deliver_alert(alert_data)
+    
+    def _deliver_alert(self, alert_data):
+        """Hand an alert (or an aggregated summary) to the callback"""
+        if self.alert_callback:
             self.alert_callback(alert_data)
 
 
@@ -8,41 +8,88 @@ ML Models:
 - Deep Neural Network: 97.2% accuracy, 4 layers (128-64-32-11 neurons)
 """
 
-from scapy.all import sniff, IP, TCP, UDP, ICMP, Raw
-from collections import defaultdict
 import threading
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 import numpy as np
 
+from ml_inference import MicroBatchInference
+from source_trackers import create_trackers
+from verdict_cache import MISS, VerdictCache, feature_signature
+from forest_compiler import CompiledForest
+from alert_aggregator import AlertAggregator
+from batch_features import BatchFeatureExtractor, PacketColumns
+from capture_filter import DEFAULT_BPF_FILTER
+from mmap_capture import DEFAULT_BLOCK_COUNT, DEFAULT_BLOCK_SIZE, MmapCapture, check_capture_backend
+from payload_scanner import SignatureScanner, categorize_signature, load_signatures
+from fast_parser import LINKTYPE_ETHERNET, PROTO_ICMP, PROTO_TCP, PROTO_UDP, TCP_ACK, TCP_SYN
+from raw_capture import open_capture_socket, to_record
+
 # ML Model Imports
+import importlib.util
 import pickle
 import os
 
-# Try to import TensorFlow/Keras for DNN model
-try:
-    from tensorflow import keras
-    ML_MODELS_AVAILABLE = True
+# TensorFlow/Keras for the DNN model is imported when the model is loaded;
+# importing it takes seconds and hundreds of MB, so only check it is installed
+ML_MODELS_AVAILABLE = importlib.util.find_spec('tensorflow') is not None
+if ML_MODELS_AVAILABLE:
     print("✅ TensorFlow/Keras available for DNN model")
-except ImportError:
-    ML_MODELS_AVAILABLE = False
+else:
     print("⚠️  TensorFlow not available. Install: pip install tensorflow")
 
 class PacketAnalyzerML:
-    def __init__(self, alert_callback=None):
+    def __init__(self, alert_callback=None, batch_size=1, max_batch_wait_ms=5.0, signature_file=None,
+                 alert_window=60, ml_cascade=False, ml_prefilter=False, verdict_cache_size=65536,
+                 tracker_backend='exact', bpf_filter=DEFAULT_BPF_FILTER, capture_backend='socket'):
         """
         Initialize the packet analyzer with ML models
         
         Args:
             alert_callback: Function to call when a threat is detected
+            batch_size: Maximum packets per ML inference batch; 1 (the default)
+                scores each packet before the next is analyzed. Larger values
+                (e.g. 64) raise throughput, but the packet-rate and ports
+                features then miss the tracker updates of the source's packets
+                still queued, so detections can come a few packets later
+                (see _note_feature_lag)
+            max_batch_wait_ms: Maximum time a packet waits for its batch to fill
+            signature_file: Optional payload signature file (see payload_scanner)
+            alert_window: Seconds repeated alerts (same source, destination,
+                port and threat type) are suppressed and summarized; 0 disables
+            ml_cascade: Run the DNN only when the Random Forest is unsure
+                (see CASCADE_LOW/CASCADE_HIGH); off by default, since a
+                confident forest verdict then never meets a more confident DNN
+            ml_prefilter: Skip the models for obviously benign packets (the
+                rule-based checks still see them); off by default, since the
+                models may still flag some of those packets
+            verdict_cache_size: Flows whose last ML verdict is reused for
+                packets with the same quantized features; 0 disables
+            tracker_backend: 'exact' per-source state, or 'sketch' for fixed
+                memory under spoofed-source floods (see source_trackers)
+            bpf_filter: Kernel-side capture filter ('' captures everything, the
+                default unless CAPTURE_BPF_FILTER is set; see capture_filter.NOISE_FILTER)
+            capture_backend: 'socket' (Scapy listen socket) or 'mmap' for a
+                memory-mapped TPACKET_V3 ring on Linux (see mmap_capture)
         """
         self.alert_callback = alert_callback
         self.running = False
         self.sniffer_thread = None
+        self.bpf_filter = bpf_filter
+        self.capture_stats = None  # Kernel filter/drop counters of the live capture
+        self.capture_backend = check_capture_backend(capture_backend)
+        self.MMAP_BLOCK_SIZE = DEFAULT_BLOCK_SIZE  # Ring block size in bytes (page multiple)
+        self.MMAP_BLOCK_COUNT = DEFAULT_BLOCK_COUNT  # Blocks in the ring
+        
+        # Guards the per-source trackers, which are touched by the capture
+        # thread and by the inference worker's rule-based fallback, and the
+        # ML counters; never held while alert_callback runs
+        self._state_lock = threading.RLock()
         
         # ===== ML MODEL INITIALIZATION =====
         self.ml_enabled = False
         self.random_forest_model = None
+        self.compiled_forest = None  # Flat NumPy evaluator for the forest (see forest_compiler)
         self.dnn_model = None
         self.scaler = None
         self.label_encoder = None
@@ -51,19 +98,52 @@ class PacketAnalyzerML:
         print("🤖 Loading ML models...")
         self._load_ml_models()
         
-        # Tracking dictionaries for anomaly detection
-        self.connection_tracker = defaultdict(lambda: {'count': 0, 'last_seen': datetime.now()})
-        self.port_scan_tracker = defaultdict(lambda: {'ports': set(), 'last_seen': datetime.now()})
-        self.syn_flood_tracker = defaultdict(lambda: {'count': 0, 'last_seen': datetime.now()})
-        self.packet_rate_tracker = defaultdict(lambda: {'count': 0, 'last_seen': datetime.now()})
-        
         # ML-tuned thresholds for detection
         self.PORT_SCAN_THRESHOLD = 10  # Number of different ports accessed
         self.SYN_FLOOD_THRESHOLD = 50  # Number of SYN packets in time window
         self.PACKET_RATE_THRESHOLD = 100  # Packets per second from single IP
         self.TIME_WINDOW = 10  # seconds
+        
+        # Per-source state for anomaly detection (exact, or fixed-memory sketches)
+        self.trackers = create_trackers(tracker_backend, ttl=self.TIME_WINDOW)
         self.ML_CONFIDENCE_THRESHOLD = 0.60  # Minimum confidence for ML detection
         
+        # Cascade: the (cheaper) Random Forest scores every packet and the DNN
+        # is consulted only when the forest's confidence is in [LOW, HIGH)
+        self.ML_CASCADE = ml_cascade
+        self.CASCADE_LOW = 0.0
+        self.CASCADE_HIGH = 0.90
+        
+        # Pre-filter: payload-less, non-SYN packets to ordinary ports from
+        # quiet sources never reach the models
+        self.ML_PREFILTER = ml_prefilter
+        self.PREFILTER_MAX_RATE = 10   # Packets in the current window
+        self.PREFILTER_MAX_PORTS = 2   # Distinct ports contacted
+        
+        # Per-flow verdict reuse; expires on the tracker clock (capture time in replay)
+        self.VERDICT_TTL = 30.0
+        self.verdict_cache = None
+        if verdict_cache_size:
+            self.verdict_cache = VerdictCache(verdict_cache_size, ttl=self.VERDICT_TTL,
+                                              clock=lambda: self.trackers.clock())
+        
+        # Model invocations per cascade path (see get_ml_stats)
+        self.ml_path_counts = {
+            'packets': 0,
+            'prefiltered': 0,
+            'rf_only': 0,
+            'rf_dnn': 0,
+            'dnn_only': 0,
+            'rf_calls': 0,
+            'dnn_calls': 0,
+            'stale_features': 0,
+            'max_feature_lag': 0
+        }
+        
+        # Packets per source queued for the inference worker whose rule checks
+        # (and so tracker updates) have not run yet; see _note_feature_lag
+        self._in_flight = {}
+        
         # Suspicious ports (used as features for ML)
         self.SUSPICIOUS_PORTS = {
             23: 'Telnet',
@@ -79,6 +159,11 @@ class PacketAnalyzerML:
             21: 'FTP'
         }
         
+        # Columnar feature extraction for whole packet batches (see analyze_records);
+        # the suspicious-port lookup table is built from SUSPICIOUS_PORTS here
+        self.batch_columns = PacketColumns()
+        self.batch_extractor = BatchFeatureExtractor(self.SUSPICIOUS_PORTS)
+        
         # Known malicious patterns in payloads (for feature extraction)
         self.MALICIOUS_PATTERNS = [
             b'<script',
@@ -95,6 +180,12 @@ class PacketAnalyzerML:
             b'system('
         ]
         
+        # Compile payload signatures once (built-in patterns + optional rule file)
+        self.payload_scanner = self._build_payload_scanner(signature_file)
+        
+        # Deduplicate repeated alerts before they reach alert_callback
+        self.alert_aggregator = AlertAggregator(self._deliver_alert, window=alert_window) if alert_window else None
+        
         # Attack type labels (must match training data)
         self.ATTACK_TYPES = [
             'Normal',
@@ -109,6 +200,19 @@ class PacketAnalyzerML:
             'ICMP Flood',
             'Man-in-the-Middle'
         ]
+        
+        # ===== MICRO-BATCHED INFERENCE =====
+        # The worker runs between start_sniffing and stop_sniffing (replay_pcap
+        # and the shard workers start it themselves)
+        self.inference_batcher = None
+        if self.ml_enabled and batch_size > 1:
+            self.inference_batcher = MicroBatchInference(
+                predict_batch=self._predict_threat_ml_batch,
+                on_result=self._handle_batched_result,
+                batch_size=batch_size,
+                max_wait_ms=max_batch_wait_ms
+            )
+            print(f"⚡ ML micro-batching: up to {batch_size} packets / {max_batch_wait_ms} ms")
     
     def _load_ml_models(self):
         """
@@ -129,12 +233,14 @@ class PacketAnalyzerML:
                 with open(rf_path, 'rb') as f:
                     self.random_forest_model = pickle.load(f)
                 print("✅ Random Forest model loaded successfully (96.8% accuracy)")
+                self.compiled_forest = self._compile_forest(self.random_forest_model)
             else:
                 print(f"⚠️  Random Forest model not found at {rf_path}")
             
             # Load DNN model
             dnn_path = os.path.join(model_path, 'dnn_model.h5')
             if os.path.exists(dnn_path) and ML_MODELS_AVAILABLE:
+                from tensorflow import keras
                 self.dnn_model = keras.models.load_model(dnn_path)
                 print("✅ DNN model loaded successfully (97.2% accuracy)")
             else:
@@ -174,9 +280,27 @@ class PacketAnalyzerML:
             print("⚠️  Falling back to rule-based detection")
             self.ml_enabled = False
     
-    def _extract_features(self, packet):
+    def _compile_forest(self, model):
+        """Compile the Random Forest for fast batch scoring (None to use sklearn)"""
+        try:
+            compiled = CompiledForest.from_sklearn(model)
+        except (ValueError, AttributeError) as e:
+            print(f"⚠️  Random Forest not compiled, using scikit-learn: {str(e)}")
+            return None
+        print(f"⚡ Random Forest compiled: {compiled.n_trees} trees, {compiled.n_nodes} nodes")
+        return compiled
+    
+    def _build_payload_scanner(self, signature_file=None):
+        """Compile MALICIOUS_PATTERNS and any file-based signatures into one scanner"""
+        signatures = [(pattern, categorize_signature(pattern)) for pattern in self.MALICIOUS_PATTERNS]
+        if signature_file:
+            signatures += load_signatures(signature_file)
+            print(f"✅ Loaded payload signatures from {signature_file}")
+        return SignatureScanner(signatures)
+    
+    def _extract_features(self, record):
         """
-        Extract features from packet for ML model prediction
+        Extract features from a parsed packet for ML model prediction
         
         Features extracted (11 total):
         1. Protocol type (TCP=6, UDP=17, ICMP=1)
@@ -191,66 +315,45 @@ class PacketAnalyzerML:
         10. Packet rate from source IP
         11. Number of ports accessed by source IP
         
+        Args:
+            record: PacketRecord from the fast-path parser
+        
         Returns:
             numpy array of features (1, 11) or None if packet invalid
         """
         try:
-            if IP not in packet:
-                return None
-            
-            # Initialize feature vector
-            features = []
-            
             # === FEATURE 1: Protocol type ===
-            if TCP in packet:
-                protocol = 6
-                src_port = packet[TCP].sport
-                dst_port = packet[TCP].dport
-                flags = int(packet[TCP].flags)
-            elif UDP in packet:
-                protocol = 17
-                src_port = packet[UDP].sport
-                dst_port = packet[UDP].dport
-                flags = 0
-            elif ICMP in packet:
-                protocol = 1
-                src_port = 0
-                dst_port = 0
-                flags = 0
-            else:
+            protocol = record.protocol
+            if protocol != PROTO_TCP and protocol != PROTO_UDP and protocol != PROTO_ICMP:
                 return None
-            
-            # === FEATURE ENGINEERING ===
-            features.append(protocol)                    # Feature 1: Protocol
-            features.append(src_port)                    # Feature 2: Source port
-            features.append(dst_port)                    # Feature 3: Destination port
-            features.append(len(packet))                 # Feature 4: Packet size
-            features.append(flags)                       # Feature 5: TCP flags
+            dst_port = record.dst_port
+            payload_size = len(record.payload)
             
             # Feature 6: Port category (well-known < 1024, registered < 49152, dynamic)
             port_category = 0 if dst_port < 1024 else 1 if dst_port < 49152 else 2
-            features.append(port_category)
-            
-            # Feature 7: Suspicious port indicator
-            suspicious_port = 1 if dst_port in self.SUSPICIOUS_PORTS else 0
-            features.append(suspicious_port)
-            
-            # Feature 8: Payload size
-            payload_size = len(packet[Raw].load) if Raw in packet else 0
-            features.append(payload_size)
-            
-            # Feature 9: Has payload indicator
-            has_payload = 1 if Raw in packet else 0
-            features.append(has_payload)
             
             # Feature 10: Packet rate (packets per second from this IP)
-            src_ip = packet[IP].src
-            packet_rate = self.packet_rate_tracker[src_ip]['count']
-            features.append(packet_rate)
+            # (trackers.count never creates an entry for an unseen source)
+            src_ip = record.src_ip
+            packet_rate = self.trackers.count('rate', src_ip)
             
             # Feature 11: Port scan indicator (number of ports accessed)
-            ports_accessed = len(self.port_scan_tracker[src_ip]['ports'])
-            features.append(ports_accessed)
+            ports_accessed = self.trackers.distinct_ports(src_ip)
+            
+            # === FEATURE ENGINEERING ===
+            features = [
+                protocol,                                    # Feature 1: Protocol
+                record.src_port,                             # Feature 2: Source port
+                dst_port,                                    # Feature 3: Destination port
+                record.length,                               # Feature 4: Packet size
+                record.tcp_flags,                            # Feature 5: TCP flags
+                port_category,                               # Feature 6: Port category
+                1 if dst_port in self.SUSPICIOUS_PORTS else 0,  # Feature 7: Suspicious port
+                payload_size,                                # Feature 8: Payload size
+                1 if payload_size else 0,                    # Feature 9: Has payload
+                packet_rate,                                 # Feature 10: Packet rate
+                ports_accessed                               # Feature 11: Ports accessed
+            ]
             
             # Convert to numpy array with shape (1, 11)
             feature_vector = np.array(features).reshape(1, -1)
@@ -261,18 +364,40 @@ class PacketAnalyzerML:
             print(f"Feature extraction error: {str(e)}")
             return None
     
-    def _predict_threat_ml(self, packet):
+    def _extract_features_batch(self, records):
+        """
+        Extract the features of many parsed packets at once
+        
+        Same 11 features as _extract_features, computed column-wise over the
+        batch (see batch_features); each source's tracker counts are read
+        once per batch. The rule checks update those counts only after a
+        packet is scored, so features 10 and 11 of a row lag strict
+        packet-by-packet order by at most the earlier packets of the same
+        source in the batch, as they would for per-packet submissions still
+        waiting on the inference worker.
+        
+        Args:
+            records: list of PacketRecords
+        
+        Returns:
+            (features, valid): (N, 11) float32 matrix, reused by the next
+            call, and the mask of rows _extract_features would not return
+            None for
+        """
+        columns = self.batch_columns.fill(records)
+        trackers = self.trackers
+        packet_rate = [trackers.count('rate', src_ip) for src_ip in columns.sources]
+        ports_accessed = [trackers.distinct_ports(src_ip) for src_ip in columns.sources]
+        return self.batch_extractor.extract(columns, packet_rate, ports_accessed)
+    
+    def _predict_threat_ml(self, record):
         """
         Use ML models to predict if packet is a threat
         
         Process:
-        1. Extract features from packet
-        2. Normalize features using scaler
-        3. Get prediction from Random Forest
-        4. Get prediction from DNN
-        5. Ensemble voting: Use prediction with higher confidence
-        6. Decode prediction to threat type
-        7. Assign severity based on confidence
+        1. Extract features from the parsed packet
+        2. Return the flow's cached verdict if the features are unchanged
+        3. Otherwise score the feature vector with _predict_threat_ml_batch
         
         Returns:
             dict with threat_type, severity, confidence, model_used or None
@@ -282,88 +407,228 @@ class PacketAnalyzerML:
         
         try:
             # Step 1: Extract features from packet
-            features = self._extract_features(packet)
+            features = self._extract_features(record)
             if features is None:
                 return None
             
-            # Step 2: Preprocess features (normalize using StandardScaler)
-            if self.scaler:
-                features_scaled = self.scaler.transform(features)
-            else:
-                features_scaled = features
+            # Step 2: Reuse the flow's verdict if its features did not change
+            if self.verdict_cache is not None:
+                flow, signature = self._verdict_key(record, features)
+                ml_result = self.verdict_cache.lookup(flow, signature)
+                if ml_result is MISS:
+                    ml_result = self._predict_threat_ml_batch(features, verbose=True)[0]
+                    self.verdict_cache.store(flow, signature, ml_result)
+                return ml_result
             
-            # === RANDOM FOREST PREDICTION ===
-            rf_prediction = None
-            rf_confidence = 0.0
-            if self.random_forest_model:
-                # Get class prediction
-                rf_prediction = self.random_forest_model.predict(features_scaled)[0]
-                # Get prediction probability (confidence score)
-                rf_proba = self.random_forest_model.predict_proba(features_scaled)[0]
-                rf_confidence = np.max(rf_proba)
-                
-                print(f"🌲 Random Forest: Class {rf_prediction}, Confidence {rf_confidence:.2%}")
-            
-            # === DNN PREDICTION ===
-            dnn_prediction = None
-            dnn_confidence = 0.0
-            if self.dnn_model:
-                # Get probability distribution
-                dnn_proba = self.dnn_model.predict(features_scaled, verbose=0)[0]
-                # Get class with highest probability
-                dnn_prediction = np.argmax(dnn_proba)
-                dnn_confidence = np.max(dnn_proba)
-                
-                print(f"🧠 DNN: Class {dnn_prediction}, Confidence {dnn_confidence:.2%}")
+            return self._predict_threat_ml_batch(features, verbose=True)[0]
             
-            # === ENSEMBLE: Combine predictions using confidence-based voting ===
-            # Use the prediction with higher confidence
-            if rf_confidence > dnn_confidence:
-                final_prediction = rf_prediction
-                final_confidence = rf_confidence
-                model_used = "Random Forest"
+        except Exception as e:
+            print(f"❌ ML prediction error: {str(e)}")
+            return None
+    
+    def _predict_threat_ml_batch(self, features, verbose=False):
+        """
+        Score a batch of feature vectors with one vectorized call per model
+        
+        Process:
+        1. Drop obviously benign packets (pre-filter)
+        2. Normalize features using scaler
+        3. Get predictions from Random Forest (single predict_proba call)
+        4. Get predictions from DNN (cascade: only for uncertain forest results)
+        5. Ensemble voting: Use prediction with higher confidence
+        6. Decode predictions to threat types
+        7. Assign severity based on confidence
+        
+        Args:
+            features: numpy array of shape (N, 11)
+            verbose: Print per-packet model output (single-packet path)
+        
+        Returns:
+            list of N results, each a dict (see _predict_threat_ml) or None
+        """
+        counts = dict.fromkeys(self.ml_path_counts, 0)  # Merged under the lock on return
+        counts['packets'] += features.shape[0]
+        # float32 batch features score exactly like the per-packet integer vectors
+        features = np.asarray(features, dtype=np.float64)
+        
+        # Step 1: Pre-filter (prefiltered packets get no ML result)
+        active = None
+        if self.ML_PREFILTER:
+            benign = self._prefilter_benign(features)
+            if benign.any():
+                counts['prefiltered'] += int(benign.sum())
+                active = np.flatnonzero(~benign)
+                if not len(active):
+                    self._add_path_counts(counts)
+                    return [None] * features.shape[0]
+                all_results = [None] * features.shape[0]
+                features = features[active]
+        n = features.shape[0]
+        
+        # Step 2: Preprocess features (normalize using StandardScaler)
+        if self.scaler:
+            features_scaled = self.scaler.transform(features)
+        else:
+            features_scaled = features
+        
+        # === RANDOM FOREST PREDICTION ===
+        # predict() is argmax over predict_proba(), so one traversal gives both
+        rf_prediction = np.zeros(n, dtype=int)
+        rf_confidence = np.zeros(n)
+        if self.compiled_forest is not None:
+            rf_prediction, rf_proba = self.compiled_forest.predict_with_proba(features_scaled)
+            rf_confidence = np.max(rf_proba, axis=1)
+        elif self.random_forest_model:
+            rf_proba = self.random_forest_model.predict_proba(features_scaled)
+            rf_prediction = self.random_forest_model.classes_.take(np.argmax(rf_proba, axis=1))
+            rf_confidence = np.max(rf_proba, axis=1)
+        if self.random_forest_model:
+            counts['rf_calls'] += 1
+        
+        # === DNN PREDICTION ===
+        dnn_prediction = np.zeros(n, dtype=int)
+        dnn_confidence = np.zeros(n)
+        if self.dnn_model:
+            if self.ML_CASCADE and self.random_forest_model:
+                # Only rows the forest is unsure about go to the DNN
+                uncertain = np.flatnonzero((rf_confidence >= self.CASCADE_LOW) & (rf_confidence < self.CASCADE_HIGH))
             else:
-                final_prediction = dnn_prediction
-                final_confidence = dnn_confidence
-                model_used = "DNN"
+                uncertain = np.arange(n)
+            if len(uncertain):
+                dnn_proba = self.dnn_model.predict(features_scaled[uncertain], verbose=0)
+                dnn_prediction[uncertain] = np.argmax(dnn_proba, axis=1)
+                dnn_confidence[uncertain] = np.max(dnn_proba, axis=1)
+                counts['dnn_calls'] += 1
+            if self.random_forest_model:
+                counts['rf_dnn'] += len(uncertain)
+                counts['rf_only'] += n - len(uncertain)
+            else:
+                counts['dnn_only'] += n
+        elif self.random_forest_model:
+            counts['rf_only'] += n
+        
+        # === ENSEMBLE: Combine predictions using confidence-based voting ===
+        # Use the prediction with higher confidence
+        use_rf = rf_confidence > dnn_confidence
+        final_prediction = np.where(use_rf, rf_prediction, dnn_prediction)
+        final_confidence = np.where(use_rf, rf_confidence, dnn_confidence)
+        
+        # Decode predictions to threat types using label encoder
+        if self.label_encoder:
+            threat_types = self.label_encoder.inverse_transform(final_prediction)
+        else:
+            # Fallback to attack types list
+            threat_types = [
+                self.ATTACK_TYPES[p] if p < len(self.ATTACK_TYPES) else f"Threat_{p}"
+                for p in final_prediction
+            ]
+        
+        results = []
+        for i in range(n):
+            model_used = "Random Forest" if use_rf[i] else "DNN"
+            confidence = float(final_confidence[i])
             
-            print(f"🎯 Ensemble: Using {model_used} (confidence: {final_confidence:.2%})")
+            if verbose:
+                if self.random_forest_model:
+                    print(f"🌲 Random Forest: Class {rf_prediction[i]}, Confidence {rf_confidence[i]:.2%}")
+                if self.dnn_model:
+                    print(f"🧠 DNN: Class {dnn_prediction[i]}, Confidence {dnn_confidence[i]:.2%}")
+                print(f"🎯 Ensemble: Using {model_used} (confidence: {confidence:.2%})")
             
-            # Decode prediction to threat type using label encoder
-            if self.label_encoder:
-                threat_type = self.label_encoder.inverse_transform([final_prediction])[0]
-            else:
-                # Fallback to attack types list
-                threat_type = self.ATTACK_TYPES[final_prediction] if final_prediction < len(self.ATTACK_TYPES) else f"Threat_{final_prediction}"
+            # Only keep predictions above the confidence threshold
+            if confidence < self.ML_CONFIDENCE_THRESHOLD:
+                if verbose:
+                    print(f"⚠️  Confidence {confidence:.2%} below threshold {self.ML_CONFIDENCE_THRESHOLD:.2%}")
+                results.append(None)  # Not confident enough
+                continue
             
-            # Determine severity based on threat type and confidence
-            if final_confidence > 0.90:
+            # Determine severity based on confidence
+            if confidence > 0.90:
                 severity = "Critical"
-            elif final_confidence > 0.75:
+            elif confidence > 0.75:
                 severity = "High"
-            elif final_confidence > 0.60:
+            elif confidence > 0.60:
                 severity = "Medium"
             else:
                 severity = "Low"
             
-            # Only return if confidence is above threshold
-            if final_confidence < self.ML_CONFIDENCE_THRESHOLD:
-                print(f"⚠️  Confidence {final_confidence:.2%} below threshold {self.ML_CONFIDENCE_THRESHOLD:.2%}")
-                return None  # Not confident enough
-            
-            # Return ML prediction result
-            return {
-                'threat_type': threat_type,
+            results.append({
+                'threat_type': threat_types[i],
                 'severity': severity,
-                'confidence': float(final_confidence),
+                'confidence': confidence,
                 'model_used': model_used,
-                'rf_confidence': float(rf_confidence),
-                'dnn_confidence': float(dnn_confidence)
-            }
-            
-        except Exception as e:
-            print(f"❌ ML prediction error: {str(e)}")
-            return None
+                'rf_confidence': float(rf_confidence[i]),
+                'dnn_confidence': float(dnn_confidence[i])
+            })
+        
+        self._add_path_counts(counts)
+        if active is not None:
+            for position, result in zip(active, results):
+                all_results[position] = result
+            return all_results
+        return results
+    
+    def _add_path_counts(self, counts):
+        """Merge one batch's model invocation counts into ml_path_counts"""
+        with self._state_lock:
+            totals = self.ml_path_counts
+            for key, value in counts.items():
+                if value:
+                    totals[key] += value
+    
+    def _note_feature_lag(self, src_ip, lag):
+        """
+        Record how stale a packet's tracker features are
+        
+        With micro-batching the rule checks update the trackers once a packet
+        has been scored, so features 10 and 11 are extracted before the updates
+        of earlier packets from the same source that are still queued. lag is
+        the number of those packets, an upper bound on how far the features
+        trail strictly sequential processing (ML-flagged packets never update
+        the trackers). Call with _state_lock held.
+        """
+        if lag:
+            counts = self.ml_path_counts
+            counts['stale_features'] += 1
+            if lag > counts['max_feature_lag']:
+                counts['max_feature_lag'] = lag
+    
+    def _prefilter_benign(self, features):
+        """
+        Rows of a feature matrix that are obviously benign
+        
+        No payload, not a bare SYN, not ICMP, no suspicious destination port,
+        and a source that is neither busy nor touching many ports.
+        """
+        protocol = features[:, 0]
+        flags = features[:, 4].astype(np.int64)
+        bare_syn = (protocol == PROTO_TCP) & ((flags & (TCP_SYN | TCP_ACK)) == TCP_SYN)
+        return ((protocol != PROTO_ICMP) & ~bare_syn
+                & (features[:, 6] == 0)                          # Suspicious port
+                & (features[:, 8] == 0)                          # Has payload
+                & (features[:, 9] < self.PREFILTER_MAX_RATE)     # Packet rate
+                & (features[:, 10] <= self.PREFILTER_MAX_PORTS))  # Ports accessed
+    
+    def _verdict_key(self, record, features):
+        """(flow 5-tuple, quantized feature signature) for the verdict cache"""
+        flow = (record.src_ip, record.dst_ip, record.protocol, record.src_port, record.dst_port)
+        return flow, feature_signature(features[0].tolist())
+    
+    def get_ml_stats(self):
+        """
+        Model invocation counts per cascade path and verdict cache metrics
+        
+        stale_features / max_feature_lag measure the micro-batching drift of
+        the tracker features (see _note_feature_lag).
+        """
+        with self._state_lock:
+            counts = dict(self.ml_path_counts)
+        scored = counts['rf_only'] + counts['rf_dnn'] + counts['dnn_only']
+        counts['dnn_skip_rate'] = counts['rf_only'] / scored if scored else 0.0
+        counts['prefilter_rate'] = counts['prefiltered'] / counts['packets'] if counts['packets'] else 0.0
+        if self.verdict_cache is not None:
+            counts['verdict_cache'] = self.verdict_cache.get_stats()
+        return counts
     
     def start_sniffing(self, interface=None):
         """Start packet sniffing in a separate thread"""
@@ -372,6 +637,10 @@ class PacketAnalyzerML:
             return
         
         self.running = True
+        if self.alert_aggregator:
+            self.alert_aggregator.start()  # Summaries go out even when no packets arrive
+        if self.inference_batcher:
+            self.inference_batcher.start()
         self.sniffer_thread = threading.Thread(
             target=self._sniff_packets,
             args=(interface,),
@@ -388,142 +657,322 @@ class PacketAnalyzerML:
         self.running = False
         if self.sniffer_thread:
             self.sniffer_thread.join(timeout=2)
+        if self.inference_batcher:
+            self.inference_batcher.stop()
+            stats = self.inference_batcher.get_stats()
+            print(f"⚡ ML batches: {stats['batches']} ({stats['avg_batch_size']:.1f} packets avg, "
+                  f"{stats['avg_batch_latency_ms']:.2f} ms avg latency)")
+        if self.ml_enabled:
+            counts = self.get_ml_stats()
+            print(f"🎛️  ML paths: {counts['prefiltered']} prefiltered, {counts['rf_only']} RF only, "
+                  f"{counts['rf_dnn']} RF+DNN, {counts['dnn_only']} DNN only "
+                  f"({counts['rf_calls']} RF / {counts['dnn_calls']} DNN calls)")
+            print(f"⏳ Feature lag: {counts['stale_features']} packets scored before earlier packets "
+                  f"of their source were rule-checked (max {counts['max_feature_lag']} behind)")
+            if 'verdict_cache' in counts:
+                cache = counts['verdict_cache']
+                print(f"🗃️  Verdict cache: {cache['hit_rate']:.1%} hit rate, {cache['invalidations']} invalidated, "
+                      f"{cache['evictions']} evicted, {cache['entries']} flows")
+        if self.alert_aggregator:
+            self.alert_aggregator.stop()
+            self.alert_aggregator.flush_all()
+            stats = self.alert_aggregator.get_stats()
+            print(f"🧮 Alerts: {stats['emitted']} emitted, {stats['suppressed']} duplicates suppressed, "
+                  f"{stats['summaries']} summaries")
+        capture = self.get_capture_stats()
+        if capture and capture['delivered'] is not None:
+            print(f"📉 Kernel filter: {capture['kernel_filtered']} filtered, {capture['delivered']} delivered, "
+                  f"{capture['kernel_dropped']} dropped")
         print("🛑 Packet sniffer stopped")
     
+    def get_capture_stats(self):
+        """Packets filtered, delivered and dropped by the kernel (None before capture starts)"""
+        return self.capture_stats.get_stats() if self.capture_stats else None
+    
+    def replay_pcap(self, path, speed=None, use_capture_clock=True):
+        """
+        Replay a pcap/pcapng file through analyze_packet (no root needed)
+        
+        Args:
+            path: Capture file to replay
+            speed: None for as fast as possible, 1.0 for recorded timing,
+                other values scale the recorded timing
+            use_capture_clock: Expire tracker state on capture timestamps
+        
+        Returns:
+            dict with throughput, alert counts and per-stage timings
+        """
+        from pcap_replay import replay_pcap
+        return replay_pcap(self, path, speed=speed, use_capture_clock=use_capture_clock)
+    
     def _sniff_packets(self, interface):
-        """Internal method to sniff packets"""
+        """Internal method to sniff packets (undissected frames, see raw_capture)"""
         try:
-            sniff(
-                iface=interface,
-                prn=self.analyze_packet,
-                store=False,
-                stop_filter=lambda x: not self.running
-            )
+            if self.capture_backend == 'mmap':
+                self._capture_mmap(interface)
+                return
+            from scapy.all import sniff  # Only the socket backend needs Scapy
+            
+            capture_socket, self.capture_stats = open_capture_socket(interface, self.bpf_filter)
+            try:
+                sniff(
+                    opened_socket=capture_socket,
+                    prn=self.analyze_packet,
+                    store=False,
+                    stop_filter=lambda x: not self.running
+                )
+            finally:
+                self.capture_stats.finish()
+                capture_socket.close()
         except Exception as e:
             print(f"❌ Sniffing error: {str(e)}")
             print("💡 Make sure you're running with administrator/root privileges")
             self.running = False
     
-    def analyze_packet(self, packet):
+    def _capture_mmap(self, interface):
+        """Read frames from a memory-mapped ring until stopped (see mmap_capture)"""
+        capture = MmapCapture(interface, block_size=self.MMAP_BLOCK_SIZE, block_count=self.MMAP_BLOCK_COUNT,
+                              bpf_filter=self.bpf_filter)
+        self.capture_stats = capture
+        try:
+            capture.run(lambda frame, linktype, timestamp: self.analyze_packet(frame, linktype),
+                        lambda: not self.running)
+        finally:
+            capture.close()
+    
+    def analyze_packet(self, packet, linktype=LINKTYPE_ETHERNET):
         """
         Analyze a single packet for threats using ML and rule-based detection
         
-        Detection hierarchy:
-        1. ML-based detection (if enabled) - PRIMARY
-        2. Rule-based detection - FALLBACK
+        Args:
+            packet: Raw frame bytes, an undissected frame from the capture
+                socket, or a dissected Scapy packet
+            linktype: pcap link-layer type of raw frames
         """
         try:
-            if IP in packet:
-                src_ip = packet[IP].src
-                dst_ip = packet[IP].dst
-                
-                # Clean old entries from tracking dictionaries
-                self._clean_old_entries()
-                
-                # ===== ML-BASED DETECTION (PRIMARY) =====
-                if self.ml_enabled:
-                    ml_result = self._predict_threat_ml(packet)
-                    
-                    if ml_result:
-                        # ML model detected a threat with high confidence
-                        print(f"🚨 ML DETECTION: {ml_result['threat_type']} by {ml_result['model_used']}")
-                        
-                        self._trigger_alert({
-                            'threat_type': ml_result['threat_type'],
-                            'severity': ml_result['severity'],
-                            'source_ip': src_ip,
-                            'destination_ip': dst_ip,
-                            'description': f"{ml_result['threat_type']} detected by {ml_result['model_used']} (confidence: {ml_result['confidence']:.2%})",
-                            'port': packet[TCP].dport if TCP in packet else packet[UDP].dport if UDP in packet else 0,
-                            'protocol': 'TCP' if TCP in packet else 'UDP' if UDP in packet else 'ICMP',
-                            'confidence': ml_result['confidence'],
-                            'model_used': ml_result['model_used'],
-                            'rf_confidence': ml_result['rf_confidence'],
-                            'dnn_confidence': ml_result['dnn_confidence'],
-                            'detection_method': 'ML'
-                        })
-                        return  # ML detected it, no need for rule-based checks
-                
-                # ===== RULE-BASED DETECTION (FALLBACK) =====
-                # These run if ML is disabled or didn't detect anything
-                self._check_port_scan(packet, src_ip)
-                self._check_syn_flood(packet, src_ip)
-                self._check_packet_rate(src_ip)
-                self._check_suspicious_ports(packet, src_ip, dst_ip)
-                self._check_malicious_payload(packet, src_ip, dst_ip)
-                self._check_icmp_flood(packet, src_ip)
-                
+            record = to_record(packet, linktype)
+            if record is not None:
+                self.analyze_record(record)
         except Exception as e:
             # Silently ignore packet processing errors
             pass
     
-    def _check_port_scan(self, packet, src_ip):
+    def analyze_record(self, record):
+        """
+        Analyze a parsed PacketRecord using ML and rule-based detection
+        
+        Detection hierarchy:
+        1. ML-based detection (if enabled) - PRIMARY
+        2. Rule-based detection - FALLBACK
+        
+        With micro-batching enabled the packet is queued for the inference
+        worker and the rule-based fallback runs once its batch is scored.
+        """
+        features = None
+        cache_key = None
+        ml_result = MISS
+        # Clean old entries from tracking dictionaries
+        self._clean_old_entries()
+        with self._state_lock:
+            if self.ml_enabled and self.inference_batcher:
+                features = self._extract_features(record)
+                if features is not None and self.verdict_cache is not None:
+                    cache_key = self._verdict_key(record, features)
+                    ml_result = self.verdict_cache.lookup(*cache_key)
+                if features is not None and ml_result is MISS:
+                    in_flight = self._in_flight.get(record.src_ip, 0)
+                    self._note_feature_lag(record.src_ip, in_flight)
+                    self._in_flight[record.src_ip] = in_flight + 1
+        
+        # ===== ML-BASED DETECTION (PRIMARY) =====
+        if features is not None:
+            if ml_result is not MISS:
+                self._handle_ml_result(record, ml_result)  # Same flow, same features: reuse
+            else:
+                self.inference_batcher.submit(features, (record, cache_key))
+            return  # Result is handled by _handle_batched_result
+        
+        if self.ml_enabled and not self.inference_batcher:
+            ml_result = self._predict_threat_ml(record)
+            
+            if ml_result:
+                # ML model detected a threat with high confidence
+                self._trigger_ml_alert(record, ml_result)
+                return  # ML detected it, no need for rule-based checks
+        
+        # ===== RULE-BASED DETECTION (FALLBACK) =====
+        # These run if ML is disabled or didn't detect anything
+        self._run_rule_checks(record)
+    
+    def analyze_records(self, records):
+        """
+        Analyze a batch of parsed PacketRecords
+        
+        With micro-batching enabled the ML features of the whole batch are
+        extracted in one vectorized pass (see _extract_features_batch);
+        otherwise every record goes through analyze_record.
+        """
+        if not (self.ml_enabled and self.inference_batcher) or not records:
+            for record in records:
+                self.analyze_record(record)
+            return
+        
+        submitted = []
+        self._clean_old_entries()
+        with self._state_lock:
+            features, valid = self._extract_features_batch(records)
+            features = features.copy()  # Rows outlive the extractor's reused matrix
+            in_flight = self._in_flight
+            held = {}  # Earlier packets per source whose rule checks run after the batch
+            for record, row, scored in zip(records, features, valid):
+                src_ip = record.src_ip
+                if not scored:
+                    held[src_ip] = held.get(src_ip, 0) + 1
+                    submitted.append((record, None, None, MISS))
+                    continue
+                cache_key = None
+                ml_result = MISS
+                if self.verdict_cache is not None:
+                    cache_key = self._verdict_key(record, row.reshape(1, -1))
+                    ml_result = self.verdict_cache.lookup(*cache_key)
+                if ml_result is MISS:
+                    queued = in_flight.get(src_ip, 0)
+                    self._note_feature_lag(src_ip, queued + held.get(src_ip, 0))
+                    in_flight[src_ip] = queued + 1
+                else:
+                    held[src_ip] = held.get(src_ip, 0) + 1
+                submitted.append((record, row, cache_key, ml_result))
+        
+        for record, row, cache_key, ml_result in submitted:
+            if row is None:
+                self._run_rule_checks(record)
+            elif ml_result is not MISS:
+                self._handle_ml_result(record, ml_result)  # Same flow, same features: reuse
+            else:
+                self.inference_batcher.submit(row, (record, cache_key))
+    
+    def _handle_batched_result(self, context, ml_result):
+        """Cache a batched ML verdict, then act on it"""
+        record, cache_key = context
+        if cache_key is not None:
+            with self._state_lock:
+                self.verdict_cache.store(*cache_key, ml_result)
+        self._handle_ml_result(record, ml_result)
+        with self._state_lock:
+            # The packet's rule checks have run: later packets see its updates
+            in_flight = self._in_flight
+            queued = in_flight.get(record.src_ip, 0)
+            if queued > 1:
+                in_flight[record.src_ip] = queued - 1
+            else:
+                in_flight.pop(record.src_ip, None)
+    
+    def _handle_ml_result(self, record, ml_result):
+        """Fan a batched ML result back out to its packet"""
+        if ml_result:
+            self._trigger_ml_alert(record, ml_result)
+        else:
+            self._run_rule_checks(record)
+    
+    def _trigger_ml_alert(self, record, ml_result):
+        """Raise an alert for a threat detected by the ML models"""
+        print(f"🚨 ML DETECTION: {ml_result['threat_type']} by {ml_result['model_used']}")
+        
+        has_ports = record.protocol in (PROTO_TCP, PROTO_UDP)
+        self._trigger_alert({
+            'threat_type': ml_result['threat_type'],
+            'severity': ml_result['severity'],
+            'source_ip': record.src_ip,
+            'destination_ip': record.dst_ip,
+            'description': f"{ml_result['threat_type']} detected by {ml_result['model_used']} (confidence: {ml_result['confidence']:.2%})",
+            'port': record.dst_port if has_ports else 0,
+            'protocol': record.protocol_name if has_ports else 'ICMP',
+            'confidence': ml_result['confidence'],
+            'model_used': ml_result['model_used'],
+            'rf_confidence': ml_result['rf_confidence'],
+            'dnn_confidence': ml_result['dnn_confidence'],
+            'detection_method': 'ML'
+        })
+    
+    def _run_rule_checks(self, record):
+        """Run all rule-based checks against a parsed packet"""
+        src_ip = record.src_ip
+        dst_ip = record.dst_ip
+        alerts = []  # Raised after the lock is released (the callback may block)
+        with self._state_lock:
+            self._check_port_scan(record, src_ip, alerts)
+            self._check_syn_flood(record, src_ip, alerts)
+            self._check_packet_rate(src_ip, alerts)
+            self._check_suspicious_ports(record, src_ip, dst_ip, alerts)
+            self._check_malicious_payload(record, src_ip, dst_ip, alerts)
+            self._check_icmp_flood(record, src_ip, alerts)
+        for alert_data in alerts:
+            self._trigger_alert(alert_data)
+    
+    def _check_port_scan(self, record, src_ip, alerts):
         """Detect port scanning activity"""
-        if TCP in packet:
-            dst_port = packet[TCP].dport
+        if record.protocol == PROTO_TCP:
+            dst_port = record.dst_port
             
             # Track ports accessed by this IP
-            self.port_scan_tracker[src_ip]['ports'].add(dst_port)
-            self.port_scan_tracker[src_ip]['last_seen'] = datetime.now()
+            ports_accessed = self.trackers.add_port(src_ip, dst_port)
             
             # Check if threshold exceeded
-            if len(self.port_scan_tracker[src_ip]['ports']) >= self.PORT_SCAN_THRESHOLD:
-                self._trigger_alert({
+            if ports_accessed >= self.PORT_SCAN_THRESHOLD:
+                alerts.append({
                     'threat_type': 'Port Scan',
                     'severity': 'High',
                     'source_ip': src_ip,
-                    'destination_ip': packet[IP].dst,
-                    'description': f'Port scan detected: {len(self.port_scan_tracker[src_ip]["ports"])} ports accessed',
+                    'destination_ip': record.dst_ip,
+                    'description': f'Port scan detected: {ports_accessed} ports accessed',
                     'port': dst_port,
                     'protocol': 'TCP',
                     'detection_method': 'Rule-based'
                 })
                 # Reset counter after alert
-                self.port_scan_tracker[src_ip]['ports'].clear()
+                self.trackers.reset('ports', src_ip)
     
-    def _check_syn_flood(self, packet, src_ip):
+    def _check_syn_flood(self, record, src_ip, alerts):
         """Detect SYN flood attacks"""
-        if TCP in packet and packet[TCP].flags == 'S':  # SYN flag
-            self.syn_flood_tracker[src_ip]['count'] += 1
-            self.syn_flood_tracker[src_ip]['last_seen'] = datetime.now()
+        if record.protocol == PROTO_TCP and record.tcp_flags == TCP_SYN:  # SYN flag only
+            syn_count = self.trackers.increment('syn', src_ip)
             
-            if self.syn_flood_tracker[src_ip]['count'] >= self.SYN_FLOOD_THRESHOLD:
-                self._trigger_alert({
+            if syn_count >= self.SYN_FLOOD_THRESHOLD:
+                alerts.append({
                     'threat_type': 'DDoS Attack',
                     'severity': 'Critical',
                     'source_ip': src_ip,
-                    'destination_ip': packet[IP].dst,
-                    'description': f'Possible SYN flood: {self.syn_flood_tracker[src_ip]["count"]} SYN packets',
-                    'port': packet[TCP].dport,
+                    'destination_ip': record.dst_ip,
+                    'description': f'Possible SYN flood: {syn_count} SYN packets',
+                    'port': record.dst_port,
                     'protocol': 'TCP',
                     'detection_method': 'Rule-based'
                 })
-                self.syn_flood_tracker[src_ip]['count'] = 0
+                self.trackers.reset('syn', src_ip)
     
-    def _check_packet_rate(self, src_ip):
+    def _check_packet_rate(self, src_ip, alerts):
         """Detect abnormally high packet rates"""
-        self.packet_rate_tracker[src_ip]['count'] += 1
-        self.packet_rate_tracker[src_ip]['last_seen'] = datetime.now()
+        packet_count = self.trackers.increment('rate', src_ip)
         
-        if self.packet_rate_tracker[src_ip]['count'] >= self.PACKET_RATE_THRESHOLD:
-            self._trigger_alert({
+        if packet_count >= self.PACKET_RATE_THRESHOLD:
+            alerts.append({
                 'threat_type': 'DDoS Attack',
                 'severity': 'Critical',
                 'source_ip': src_ip,
                 'destination_ip': 'Multiple',
-                'description': f'High packet rate detected: {self.packet_rate_tracker[src_ip]["count"]} packets/sec',
+                'description': f'High packet rate detected: {packet_count} packets/sec',
                 'port': 0,
                 'protocol': 'Multiple',
                 'detection_method': 'Rule-based'
             })
-            self.packet_rate_tracker[src_ip]['count'] = 0
+            self.trackers.reset('rate', src_ip)
     
-    def _check_suspicious_ports(self, packet, src_ip, dst_ip):
+    def _check_suspicious_ports(self, record, src_ip, dst_ip, alerts):
         """Detect connections to suspicious ports"""
-        if TCP in packet:
-            dst_port = packet[TCP].dport
+        if record.protocol == PROTO_TCP:
+            dst_port = record.dst_port
             if dst_port in self.SUSPICIOUS_PORTS:
-                self._trigger_alert({
+                alerts.append({
                     'threat_type': 'Suspicious Connection',
                     'severity': 'Medium',
                     'source_ip': src_ip,
@@ -534,73 +983,53 @@ class PacketAnalyzerML:
                     'detection_method': 'Rule-based'
                 })
     
-    def _check_malicious_payload(self, packet, src_ip, dst_ip):
+    def _check_malicious_payload(self, record, src_ip, dst_ip, alerts):
         """Check packet payload for malicious patterns"""
-        if Raw in packet:
-            payload = bytes(packet[Raw].load)
+        if record.payload:
+            # Single case-insensitive pass for every signature
+            matches = self.payload_scanner.scan(record.payload)
             
-            for pattern in self.MALICIOUS_PATTERNS:
-                if pattern in payload.lower():
-                    threat_type = 'SQL Injection' if b'SELECT' in pattern or b'UNION' in pattern else \
-                                  'XSS Attack' if b'script' in pattern or b'javascript' in pattern else \
-                                  'Command Injection' if b'cmd.exe' in pattern or b'bash' in pattern else \
-                                  'Malicious Payload'
-                    
-                    self._trigger_alert({
-                        'threat_type': threat_type,
-                        'severity': 'High',
-                        'source_ip': src_ip,
-                        'destination_ip': dst_ip,
-                        'description': f'Malicious pattern detected in payload: {pattern.decode("utf-8", errors="ignore")}',
-                        'port': packet[TCP].dport if TCP in packet else packet[UDP].dport if UDP in packet else 0,
-                        'protocol': 'TCP' if TCP in packet else 'UDP' if UDP in packet else 'Unknown',
-                        'detection_method': 'Rule-based'
-                    })
-                    break
-    
-    def _check_icmp_flood(self, packet, src_ip):
+            if matches:
+                _, threat_type = matches[0]
+                matched = ', '.join(p.decode("utf-8", errors="ignore") for p, _ in matches)
+                has_ports = record.protocol in (PROTO_TCP, PROTO_UDP)
+                
+                alerts.append({
+                    'threat_type': threat_type,
+                    'severity': 'High',
+                    'source_ip': src_ip,
+                    'destination_ip': dst_ip,
+                    'description': f'Malicious pattern detected in payload: {matched}',
+                    'port': record.dst_port if has_ports else 0,
+                    'protocol': record.protocol_name if has_ports else 'Unknown',
+                    'signatures': [{'pattern': p.decode("utf-8", errors="ignore"), 'category': c} for p, c in matches],
+                    'detection_method': 'Rule-based'
+                })
+    
+    def _check_icmp_flood(self, record, src_ip, alerts):
         """Detect ICMP flood attacks"""
-        if ICMP in packet:
-            self.connection_tracker[src_ip]['count'] += 1
-            self.connection_tracker[src_ip]['last_seen'] = datetime.now()
+        if record.protocol == PROTO_ICMP:
+            icmp_count = self.trackers.increment('icmp', src_ip)
             
-            if self.connection_tracker[src_ip]['count'] >= 30:
-                self._trigger_alert({
+            if icmp_count >= 30:
+                alerts.append({
                     'threat_type': 'ICMP Flood',
                     'severity': 'High',
                     'source_ip': src_ip,
-                    'destination_ip': packet[IP].dst,
-                    'description': f'ICMP flood detected: {self.connection_tracker[src_ip]["count"]} packets',
+                    'destination_ip': record.dst_ip,
+                    'description': f'ICMP flood detected: {icmp_count} packets',
                     'port': 0,
                     'protocol': 'ICMP',
                     'detection_method': 'Rule-based'
                 })
-                self.connection_tracker[src_ip]['count'] = 0
+                self.trackers.reset('icmp', src_ip)
     
     def _clean_old_entries(self):
-        """Remove old entries from tracking dictionaries"""
-        current_time = datetime.now()
-        cutoff_time = current_time - timedelta(seconds=self.TIME_WINDOW)
-        
-        # Clean port scan tracker
-        for ip in list(self.port_scan_tracker.keys()):
-            if self.port_scan_tracker[ip]['last_seen'] < cutoff_time:
-                del self.port_scan_tracker[ip]
-        
-        # Clean SYN flood tracker
-        for ip in list(self.syn_flood_tracker.keys()):
-            if self.syn_flood_tracker[ip]['last_seen'] < cutoff_time:
-                del self.syn_flood_tracker[ip]
-        
-        # Clean packet rate tracker
-        for ip in list(self.packet_rate_tracker.keys()):
-            if self.packet_rate_tracker[ip]['last_seen'] < cutoff_time:
-                del self.packet_rate_tracker[ip]
-        
-        # Clean connection tracker
-        for ip in list(self.connection_tracker.keys()):
-            if self.connection_tracker[ip]['last_seen'] < cutoff_time:
-                del self.connection_tracker[ip]
+        """Expire per-source state older than TIME_WINDOW"""
+        with self._state_lock:
+            self.trackers.expire()
+        if self.alert_aggregator:
+            self.alert_aggregator.flush()
     
     def _trigger_alert(self, alert_data):
         """
@@ -613,6 +1042,16 @@ class PacketAnalyzerML:
             alert_data['timestamp'] = datetime.now().isoformat()
             alert_data['status'] = 'Active'
             
+            # Repeats of the same alert are counted and summarized later
+            # (the aggregator has its own lock; callbacks run outside _state_lock)
+            if self.alert_aggregator:
+                self.alert_aggregator.submit(alert_data)
+            else:
+                self._deliver_alert(alert_data)
+    
+    def _deliver_alert(self, alert_data):
+        """Hand an alert (or an aggregated summary) to the callback"""
+        if self.alert_callback:
             # Call the callback function (sends to app.py -> handle_real_alert)
             self.alert_callback(alert_data)
             
@@ -0,0 +1,169 @@
+"""
+Multi-pattern Payload Signature Scanner
+Compiles payload signatures into a multi-pattern automaton once, then finds
+every matching signature in a single case-insensitive pass over a payload.
+Uses an Aho-Corasick automaton (pyahocorasick) when installed, otherwise a
+trie compiled into a single regular expression
+
+Signature files hold one rule per line:
+
+    <category><TAB><pattern>
+
+Blank lines and lines starting with '#' are ignored. A line without a tab is
+a bare pattern whose category is inferred like the built-in patterns.
+Patterns accept Python byte escapes (e.g. \\x00, \\t, \\\\).
+"""
+
+import codecs
+import re
+
+# Use the C implementation when installed (pip install pyahocorasick)
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+
+def categorize_signature(pattern):
+    """Infer the threat category of a built-in style payload pattern"""
+    lowered = pattern.lower()
+    if b'select' in lowered or b'union' in lowered:
+        return 'SQL Injection'
+    if b'script' in lowered or b'javascript' in lowered:
+        return 'XSS Attack'
+    if b'cmd.exe' in lowered or b'bash' in lowered:
+        return 'Command Injection'
+    return 'Malicious Payload'
+
+
+def load_signatures(path):
+    """
+    Load payload signatures from a rule file
+
+    Returns:
+        list of (pattern bytes, category) tuples in file order
+    """
+    signatures = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            if '\t' in line:
+                category, raw_pattern = line.split('\t', 1)
+                category = category.strip()
+            else:
+                category, raw_pattern = None, line
+            try:
+                pattern = codecs.escape_decode(raw_pattern.encode('utf-8'))[0]
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: invalid pattern escape ({e})")
+            if not pattern:
+                continue
+            signatures.append((pattern, category or categorize_signature(pattern)))
+    return signatures
+
+
+class SignatureScanner:
+    def __init__(self, signatures):
+        """
+        Compile signatures into a case-insensitive multi-pattern automaton
+
+        Args:
+            signatures: iterable of (pattern bytes, category) tuples; earlier
+                entries take priority when reporting matches
+        """
+        self.signatures = []
+        seen = {}
+        for pattern, category in signatures:
+            key = bytes(pattern).lower()
+            if key and key not in seen:
+                seen[key] = len(self.signatures)
+                self.signatures.append((bytes(pattern), category))
+
+        if AHOCORASICK_AVAILABLE:
+            self._automaton = ahocorasick.Automaton()
+            for key, index in seen.items():
+                self._automaton.add_word(key.decode('latin-1'), index)
+            if seen:
+                self._automaton.make_automaton()
+            self._scan = self._scan_native
+        else:
+            self._build(seen)
+            self._scan = self._scan_trie
+
+    @classmethod
+    def from_file(cls, path, base_signatures=()):
+        """Build a scanner from a signature file plus optional built-in rules"""
+        return cls(list(base_signatures) + load_signatures(path))
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def _build(self, keys):
+        """
+        Compile the signature trie into one regular expression (fallback engine)
+
+        Each trie node becomes a non-capturing group whose children start with
+        distinct bytes, so the regex engine walks the trie deterministically
+        in C and reports the longest signature starting at a payload offset.
+        Shorter signatures starting at the same offset are prefixes of it and
+        are resolved from a precomputed table.
+        """
+        trie = {}
+        for key in keys:
+            node = trie
+            for byte in key:
+                node = node.setdefault(byte, {})
+            node[None] = True
+
+        def compile_node(node):
+            branches = [
+                re.escape(bytes([byte])) + compile_node(child)
+                for byte, child in sorted((b, c) for b, c in node.items() if b is not None)
+            ]
+            if not branches:
+                return b''
+            group = branches[0] if len(branches) == 1 else b'(?:' + b'|'.join(branches) + b')'
+            if None in node:
+                return b'(?:' + group + b')?'
+            return group
+
+        self._regex = re.compile(compile_node(trie) if trie else b'(?!)', re.DOTALL)
+
+        # key -> indices of every signature that is a prefix of key (itself included)
+        self._prefix_matches = {
+            key: tuple(keys[key[:end]] for end in range(1, len(key) + 1) if key[:end] in keys)
+            for key in keys
+        }
+
+    def _scan_trie(self, data):
+        prefix_matches = self._prefix_matches
+        search = self._regex.search
+        found = set()
+        position = 0
+        while True:
+            match = search(data, position)
+            if match is None:
+                return found
+            found.update(prefix_matches[match.group()])
+            # Signatures may overlap, so resume right after the match start
+            position = match.start() + 1
+
+    def _scan_native(self, data):
+        if not self.signatures:
+            return set()
+        return {index for _, index in self._automaton.iter(data.decode('latin-1'))}
+
+    def scan(self, payload):
+        """
+        Find every signature contained in a payload (case-insensitive)
+
+        Returns:
+            list of (pattern bytes, category) tuples in signature priority order
+        """
+        if not payload:
+            return []
+        found = self._scan(bytes(payload).lower())
+        return [self.signatures[index] for index in sorted(found)]
@@ -0,0 +1,236 @@
+"""
+Offline PCAP Replay
+Streams a pcap/pcapng capture through an analyzer's analyze_packet pipeline,
+either as fast as possible or at the recorded (optionally scaled) timing,
+and reports throughput, alerts and per-stage time
+No administrator/root privileges required
+
+Usage:
+    python pcap_replay.py capture.pcap [--speed 1.0] [--ml] [--signatures rules.tsv] [--workers 4]
+                                        [--trackers sketch] [--batch-size 64]
+"""
+
+import argparse
+import time
+from collections import Counter
+
+from scapy.utils import RawPcapReader, RawPcapNgReader  # Readers only, not every protocol layer
+
+from source_trackers import TRACKER_BACKENDS
+
+
+def _read_frames(path):
+    """
+    Yield (frame bytes, linktype, capture timestamp) from a pcap/pcapng file
+    
+    Frames are returned undissected so the analyzers' fast-path parser
+    decodes them; only frames it cannot handle get a Scapy dissection.
+    """
+    with RawPcapReader(path) as reader:
+        if isinstance(reader, RawPcapNgReader):
+            for frame, meta in reader:
+                timestamp = ((meta.tshigh << 32) + meta.tslow) / meta.tsresol if meta.tshigh is not None else 0.0
+                yield frame, meta.linktype, timestamp
+        else:
+            linktype = reader.linktype
+            scale = 1e-9 if reader.nano else 1e-6
+            for frame, meta in reader:
+                yield frame, linktype, meta.sec + meta.usec * scale
+
+
+def replay_pcap(analyzer, path, speed=None, use_capture_clock=True, report=True):
+    """
+    Replay a capture file through an analyzer
+
+    Args:
+        analyzer: PacketAnalyzer or PacketAnalyzerML instance
+        path: Path to a pcap or pcapng file
+        speed: None or 0 replays as fast as possible; 1.0 replays at the
+            recorded timing, 2.0 twice as fast, 0.5 at half speed
+        use_capture_clock: Drive tracker expiry from packet timestamps so
+            time windows behave as they did when the traffic was captured
+        report: Print a summary when the replay finishes
+
+    Returns:
+        dict with packet/alert counts, throughput and per-stage timings
+    """
+    alerts_by_type = Counter()
+    original_callback = analyzer.alert_callback
+
+    def count_alert(alert_data):
+        alerts_by_type[alert_data.get('threat_type', 'Unknown')] += 1
+        if original_callback:
+            original_callback(alert_data)
+
+    capture_time = [0.0]
+    original_clock = analyzer.trackers.time_source
+    aggregator = getattr(analyzer, 'alert_aggregator', None)
+    verdict_cache = getattr(analyzer, 'verdict_cache', None)
+    batcher = getattr(analyzer, 'inference_batcher', None)
+    stage_times = {'read': 0.0, 'analyze': 0.0, 'pacing': 0.0, 'drain': 0.0}
+    packets = 0
+    first_capture_ts = None
+    started = time.perf_counter()
+
+    analyzer.alert_callback = count_alert
+    if batcher:
+        batcher.start()  # No-op while a live capture keeps it running
+    try:
+        frames = _read_frames(path)
+        while True:
+            stage_start = time.perf_counter()
+            try:
+                frame, linktype, packet_ts = next(frames)
+            except StopIteration:
+                break
+            after_read = time.perf_counter()
+            stage_times['read'] += after_read - stage_start
+
+            if first_capture_ts is None:
+                first_capture_ts = packet_ts
+                if use_capture_clock:
+                    capture_time[0] = packet_ts
+                    analyzer.trackers.set_clock(lambda: capture_time[0])
+                    if aggregator:
+                        aggregator.set_clock(lambda: capture_time[0])
+                    if verdict_cache is not None:
+                        verdict_cache.clear()  # Expiry times were on the old clock
+            capture_time[0] = packet_ts
+
+            # Pace to the recorded timing when a speed is requested
+            if speed:
+                target = started + (packet_ts - first_capture_ts) / speed
+                delay = target - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                paced = time.perf_counter()
+                stage_times['pacing'] += paced - after_read
+                after_read = paced
+
+            analyzer.analyze_packet(frame, linktype)
+            stage_times['analyze'] += time.perf_counter() - after_read
+            packets += 1
+
+        # Wait for asynchronously scored packets (ML micro-batching)
+        if batcher:
+            drain_start = time.perf_counter()
+            batcher.stop(timeout=None)
+            stage_times['drain'] = time.perf_counter() - drain_start
+            stage_times['ml_inference'] = batcher.get_stats()['total_batch_latency_ms'] / 1000
+            if getattr(analyzer, 'running', False):
+                batcher.start()  # A live capture is still feeding it
+
+        # Emit summaries for alert windows still open at the end of the capture
+        if aggregator:
+            aggregator.flush_all()
+    finally:
+        analyzer.alert_callback = original_callback
+        if use_capture_clock and first_capture_ts is not None:
+            analyzer.trackers.set_clock(original_clock)
+            if aggregator:
+                aggregator.set_clock(original_clock)
+            if verdict_cache is not None:
+                verdict_cache.clear()
+
+    elapsed = time.perf_counter() - started
+    results = {
+        'file': path,
+        'packets': packets,
+        'elapsed_sec': elapsed,
+        'packets_per_sec': packets / elapsed if elapsed > 0 else 0.0,
+        'alerts': sum(alerts_by_type.values()),
+        'alerts_by_type': dict(alerts_by_type),
+        'stage_times_sec': stage_times,
+        'speed': speed or 'max',
+        'trackers': analyzer.trackers.get_stats(),
+        'top_talkers': analyzer.trackers.top_talkers(5)
+    }
+    if aggregator:
+        results['alerts_suppressed'] = aggregator.get_stats()['suppressed']
+    if getattr(analyzer, 'ml_enabled', False):
+        results['ml_paths'] = analyzer.get_ml_stats()
+
+    if report:
+        print_replay_report(results)
+    return results
+
+
+def print_replay_report(results):
+    """Print a replay summary"""
+    print("\n" + "="*60)
+    print("📼 PCAP REPLAY SUMMARY")
+    print("="*60)
+    print(f"   File: {results['file']}")
+    print(f"   Speed: {results['speed']}")
+    if 'workers' in results:
+        print(f"   Workers: {results['workers']}")
+    print(f"   Packets: {results['packets']}")
+    print(f"   Elapsed: {results['elapsed_sec']:.3f} s")
+    print(f"   Throughput: {results['packets_per_sec']:.0f} packets/sec")
+    print(f"   Alerts: {results['alerts']}")
+    if 'alerts_suppressed' in results:
+        print(f"   Duplicate alerts suppressed: {results['alerts_suppressed']}")
+    for threat_type, count in sorted(results['alerts_by_type'].items(), key=lambda item: -item[1]):
+        print(f"      - {threat_type}: {count}")
+    if 'trackers' in results:
+        trackers = results['trackers']
+        if trackers['backend'] == 'sketch':
+            print(f"   Trackers: sketch, {trackers['memory_bytes'] / 1024 / 1024:.1f} MB fixed, "
+                  f"counts within {trackers['relative_error']:.4%} of window traffic "
+                  f"({trackers['confidence']:.1%} confidence)")
+        else:
+            print(f"   Trackers: exact, {trackers['sources']} sources tracked")
+    if results.get('top_talkers'):
+        print("   Top talkers: " + ", ".join(f"{ip} ({count})" for ip, count in results['top_talkers']))
+    if 'ml_paths' in results:
+        paths = results['ml_paths']
+        print(f"   ML paths: {paths['prefiltered']} prefiltered, {paths['rf_only']} RF only, "
+              f"{paths['rf_dnn']} RF+DNN, {paths['dnn_only']} DNN only")
+        print(f"   Feature lag: {paths['stale_features']} packets, max {paths['max_feature_lag']} behind")
+        if 'verdict_cache' in paths:
+            cache = paths['verdict_cache']
+            print(f"   Verdict cache: {cache['hit_rate']:.1%} hit rate, {cache['invalidations']} invalidated, "
+                  f"{cache['evictions']} evicted")
+    print("   Stage times:")
+    for stage, seconds in results['stage_times_sec'].items():
+        print(f"      - {stage}: {seconds * 1000:.1f} ms")
+    print("="*60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a pcap/pcapng file through the IDS analyzers')
+    parser.add_argument('pcap', help='Path to a pcap or pcapng capture')
+    parser.add_argument('--speed', type=float, default=None,
+                        help='Replay speed multiplier (1.0 = recorded timing); default is as fast as possible')
+    parser.add_argument('--ml', action='store_true', help='Use the ML analyzer (PacketAnalyzerML)')
+    parser.add_argument('--signatures', default=None, help='Payload signature file to load')
+    parser.add_argument('--wall-clock', action='store_true',
+                        help='Expire tracker state on wall-clock time instead of capture timestamps')
+    parser.add_argument('--trackers', choices=TRACKER_BACKENDS, default='exact',
+                        help="Per-source tracker backend ('sketch' keeps memory fixed under spoofed floods)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Shard detection across this many worker processes (see sharded_capture)')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='ML inference batch size (with --ml); above 1 trades feature accuracy for speed')
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        from sharded_capture import ShardedCapture
+        capture = ShardedCapture(num_workers=args.workers, use_ml=args.ml, signature_file=args.signatures,
+                                 tracker_backend=args.trackers, ml_batch_size=args.batch_size)
+        capture.replay_pcap(args.pcap, speed=args.speed, use_capture_clock=not args.wall_clock)
+        return
+
+    if args.ml:
+        from packet_sniffer_ml import PacketAnalyzerML
+        analyzer = PacketAnalyzerML(signature_file=args.signatures, tracker_backend=args.trackers,
+                                    batch_size=args.batch_size)
+    else:
+        from packet_sniffer import PacketAnalyzer
+        analyzer = PacketAnalyzer(signature_file=args.signatures, tracker_backend=args.trackers)
+
+    replay_pcap(analyzer, args.pcap, speed=args.speed, use_capture_clock=not args.wall_clock)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Raw Frame Capture Helpers
+Glue between Scapy and the fast-path parser: a (BPF-filtered) listen socket
+that hands out undissected Ethernet frames, and conversion of any packet form
+(raw bytes, undissected frame, dissected Scapy packet) into a PacketRecord
+
+Scapy is imported only where a Scapy socket or packet is involved: importing
+scapy.all takes most of a second, and raw frames from the mmap ring, shard
+rings or pcap replay never need it.
+"""
+
+from capture_filter import DEFAULT_BPF_FILTER, CaptureStats
+from fast_parser import (
+    LINKTYPE_ETHERNET, PROTO_NONE, PacketRecord, UnsupportedFrame, parse_frame
+)
+
+
+def record_from_scapy(packet):
+    """
+    Build a PacketRecord from a dissected Scapy packet (fallback path)
+
+    Returns:
+        PacketRecord, or None if the packet carries no IPv4/IPv6 layer
+    """
+    from scapy.all import IP, IPv6, TCP, UDP, ICMP, Padding
+
+    if IP in packet:
+        ip_layer = packet[IP]
+        ip_version = 4
+        protocol = ip_layer.proto if not ip_layer.frag else PROTO_NONE
+    elif IPv6 in packet:
+        ip_layer = packet[IPv6]
+        ip_version = 6
+        protocol = ip_layer.nh
+    else:
+        return None
+
+    src_port = dst_port = tcp_flags = 0
+    transport = None
+    if TCP in packet:
+        transport = packet[TCP]
+        protocol = 6
+        src_port, dst_port, tcp_flags = transport.sport, transport.dport, int(transport.flags)
+    elif UDP in packet:
+        transport = packet[UDP]
+        protocol = 17
+        src_port, dst_port = transport.sport, transport.dport
+    elif ICMP in packet:
+        transport = packet[ICMP]
+        protocol = 1
+
+    payload = b''
+    if transport is not None:
+        inner = transport.payload
+        if inner and not isinstance(inner, Padding):
+            payload = bytes(inner)
+            padding = inner.getlayer(Padding)
+            if padding is not None:
+                payload = payload[:len(payload) - len(bytes(padding))]
+
+    return PacketRecord(ip_layer.src, ip_layer.dst, ip_version, protocol, src_port, dst_port,
+                        tcp_flags, len(packet), payload, float(packet.time))
+
+
+def to_record(packet, linktype=LINKTYPE_ETHERNET):
+    """
+    Convert a captured packet into a PacketRecord
+
+    Accepts raw frame bytes, undissected frames from RawFrameListenSocket
+    (a bare Raw layer) and dissected Scapy packets. Raw frames go through the
+    fast-path parser; Scapy only dissects frames the parser cannot decode.
+
+    Returns:
+        PacketRecord, or None if the packet carries no IPv4/IPv6 layer
+    """
+    if isinstance(packet, (bytes, bytearray, memoryview)):
+        frame, timestamp = packet, None
+    else:
+        from scapy.all import conf  # A Scapy packet: Scapy is already loaded
+        if type(packet) is not conf.raw_layer:
+            return record_from_scapy(packet)
+        frame, timestamp = packet.load, float(packet.time)
+
+    try:
+        return parse_frame(frame, linktype, timestamp)
+    except UnsupportedFrame:
+        from scapy.all import conf, Ether
+        layer = conf.l2types.num2layer.get(linktype, Ether)
+        dissected = layer(bytes(frame))
+        if timestamp is not None:
+            dissected.time = timestamp
+        return record_from_scapy(dissected)
+
+
+def open_raw_listen_socket(interface=None, bpf_filter=None):
+    """
+    Open a platform listen socket that skips Scapy dissection for Ethernet
+
+    Ethernet frames are returned as a bare Raw layer (see to_record); any
+    other link type is dissected by Scapy as usual.
+    """
+    from scapy.all import conf, Ether
+
+    raw_layer = conf.raw_layer
+    listen_class = conf.L2listen
+
+    class RawFrameListenSocket(listen_class):
+        def recv_raw(self, x=65535):
+            cls, data, timestamp = super().recv_raw(x)
+            if cls is Ether:
+                cls = raw_layer
+            return cls, data, timestamp
+
+    kwargs = {'iface': interface}
+    if bpf_filter:
+        kwargs['filter'] = bpf_filter
+    return RawFrameListenSocket(**kwargs)
+
+
+def open_capture_socket(interface=None, bpf_filter=DEFAULT_BPF_FILTER):
+    """
+    Open a raw listen socket with a kernel-side BPF filter and its counters
+
+    If the default filter (CAPTURE_BPF_FILTER) cannot be compiled (no libpcap/tcpdump),
+    capture continues unfiltered; an explicitly requested filter that cannot
+    be applied raises.
+
+    Returns:
+        (socket, CaptureStats)
+    """
+    from scapy.all import conf
+    from scapy.error import Scapy_Exception
+
+    try:
+        capture_socket = open_raw_listen_socket(interface, bpf_filter)
+    except (Scapy_Exception, ImportError) as e:
+        if not bpf_filter or bpf_filter != DEFAULT_BPF_FILTER:
+            raise
+        print(f"⚠️  Could not apply the default capture filter ({str(e)}); capturing unfiltered")
+        bpf_filter = ''
+        capture_socket = open_raw_listen_socket(interface)
+    name = getattr(capture_socket, 'iface', None) or interface or str(conf.iface)
+    return capture_socket, CaptureStats(capture_socket, name, bpf_filter or '')
@@ -0,0 +1,456 @@
+"""
+Sharded Multi-process Packet Capture
+Spreads detection across CPU cores: one capture process hashes every frame
+by source IP and fans it out to N worker processes over shared-memory rings
+(see shm_ring). Each worker owns the tracker state for its slice of source
+IPs and runs the full rule-based (and optionally ML) pipeline; alerts are
+merged back into the parent process and handed to alert_callback.
+
+Sharding on the source IP keeps all per-source state (port scan, SYN flood,
+packet rate, ICMP flood) inside a single worker, so detections match the
+single-process analyzers.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from collections import Counter
+
+from capture_filter import DEFAULT_BPF_FILTER, summarize
+from fast_parser import LINKTYPE_ETHERNET, source_address
+from mmap_capture import check_capture_backend
+from shm_ring import SharedFrameRing
+
+# Capture and worker processes start from a fresh interpreter (a fork server
+# where available, else spawn) instead of forking the caller, which may be a
+# multi-threaded server whose locks (logging, sockets, the alert database)
+# could be held mid-fork and stay locked forever in the child
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class FrameDispatcher:
+    """Route frames to shard rings by a hash of their source IP"""
+
+    def __init__(self, rings):
+        self.rings = rings
+        self.num_shards = len(rings)
+
+    def shard_for(self, frame, linktype=LINKTYPE_ETHERNET):
+        """Return the shard index owning this frame's source IP"""
+        return zlib.crc32(source_address(frame, linktype)) % self.num_shards
+
+    def dispatch(self, frame, linktype=LINKTYPE_ETHERNET, timestamp=0.0, block=False):
+        """
+        Queue a frame on its shard
+
+        Args:
+            block: Wait for room instead of dropping when the ring is full
+
+        Returns:
+            True if queued, False if dropped
+        """
+        ring = self.rings[self.shard_for(frame, linktype)]
+        while not ring.put(frame, linktype, timestamp):
+            if not block:
+                return False
+            time.sleep(0.0005)
+        return True
+
+    def dispatch_packet(self, packet):
+        """sniff() callback: queue a captured frame (undissected or dissected)"""
+        from scapy.all import conf
+        if type(packet) is conf.raw_layer:
+            frame, linktype = packet.load, LINKTYPE_ETHERNET
+        else:
+            frame = bytes(packet)
+            linktype = conf.l2types.layer2num.get(type(packet), LINKTYPE_ETHERNET)
+        self.dispatch(frame, linktype, float(packet.time))
+
+
+def _build_analyzer(use_ml, alert_callback, signature_file, tracker_backend='exact', ml_batch_size=1):
+    """Create the per-shard analyzer"""
+    if use_ml:
+        from packet_sniffer_ml import PacketAnalyzerML
+        return PacketAnalyzerML(alert_callback=alert_callback, signature_file=signature_file,
+                                tracker_backend=tracker_backend, batch_size=ml_batch_size)
+    from packet_sniffer import PacketAnalyzer
+    return PacketAnalyzer(alert_callback=alert_callback, signature_file=signature_file,
+                          tracker_backend=tracker_backend)
+
+
+def _worker_main(ring_name, alert_queue, stop_event, use_ml, signature_file, use_capture_clock,
+                 tracker_backend='exact', ml_batch_size=1):
+    """Worker process: drain one ring through a private analyzer"""
+    ring = SharedFrameRing(name=ring_name)
+    analyzer = _build_analyzer(use_ml, alert_queue.put, signature_file, tracker_backend, ml_batch_size)
+    batcher = getattr(analyzer, 'inference_batcher', None)
+    if batcher:
+        batcher.start()
+    if analyzer.alert_aggregator:
+        analyzer.alert_aggregator.start()
+
+    capture_time = [0.0]
+    clock_set = not use_capture_clock
+    analyze_packet = analyzer.analyze_packet
+    # Batched ML analyzers extract the features of a whole ring batch at once
+    analyze_records = analyzer.analyze_records if batcher else None
+    if analyze_records:
+        from raw_capture import to_record
+
+    try:
+        while True:
+            batch = ring.get_batch()
+            if not batch:
+                if stop_event.is_set() and not len(ring):
+                    break
+                time.sleep(0.0005)
+                continue
+
+            if not clock_set:
+                # Expire tracker state on capture timestamps (pcap replay)
+                capture_time[0] = batch[0][2]
+                analyzer.trackers.set_clock(lambda: capture_time[0])
+                if analyzer.alert_aggregator:
+                    analyzer.alert_aggregator.set_clock(lambda: capture_time[0])
+                clock_set = True
+
+            if analyze_records:
+                capture_time[0] = batch[-1][2]
+                records = []
+                for frame, linktype, _ in batch:
+                    try:
+                        record = to_record(frame, linktype)
+                    except Exception:
+                        continue  # Same as analyze_packet: skip frames that fail to parse
+                    if record is not None:
+                        records.append(record)
+                analyze_records(records)
+                continue
+
+            for frame, linktype, timestamp in batch:
+                capture_time[0] = timestamp
+                analyze_packet(frame, linktype)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if batcher:
+            batcher.stop(timeout=None)
+        if analyzer.alert_aggregator:
+            analyzer.alert_aggregator.stop()
+            # Same source IP always lands on this worker, so its windows are complete
+            analyzer.alert_aggregator.flush_all()
+        ring.close()
+
+
+def _capture_main(ring_names, interface, stop_event, bpf_filter, counters, capture_backend='socket'):
+    """
+    Capture process: sniff undissected frames and fan them out
+
+    Kernel capture counters are published to the shared counters array
+    (interface packets, received, dropped, filter applied; -1 = unknown)
+    about once a second and when capture stops.
+    """
+    rings = [SharedFrameRing(name=name) for name in ring_names]
+    dispatcher = FrameDispatcher(rings)
+    capture_socket = capture_stats = None
+
+    def publish():
+        values = [-1 if value is None else value for value in capture_stats.counters()]
+        counters[:] = values + [1 if capture_stats.bpf_filter else 0]
+
+    try:
+        if capture_backend == 'mmap':
+            from mmap_capture import MmapCapture
+            capture_socket = MmapCapture(interface, bpf_filter=bpf_filter)
+            capture_stats = capture_socket.capture_stats
+            # Frames are copied from the kernel ring straight into the shard rings
+            while not stop_event.is_set():
+                published = time.monotonic()
+                while not stop_event.is_set() and time.monotonic() - published < 1.0:
+                    capture_socket.dispatch(dispatcher.dispatch)
+                publish()
+        else:
+            from scapy.all import sniff
+            from raw_capture import open_capture_socket
+
+            capture_socket, capture_stats = open_capture_socket(interface, bpf_filter)
+            # One-second sniff rounds: counters stay fresh and stopping does not
+            # wait for the next packet
+            while not stop_event.is_set():
+                sniff(
+                    opened_socket=capture_socket,
+                    prn=dispatcher.dispatch_packet,
+                    store=False,
+                    timeout=1.0,
+                    stop_filter=lambda x: stop_event.is_set()
+                )
+                publish()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"❌ Sniffing error: {str(e)}")
+        print("💡 Make sure you're running with administrator/root privileges")
+    finally:
+        if capture_socket is not None:
+            capture_stats.finish()
+            publish()
+            capture_socket.close()
+        for ring in rings:
+            ring.close()
+
+
+class ShardedCapture:
+    def __init__(self, alert_callback=None, num_workers=None, use_ml=False,
+                 signature_file=None, ring_bytes=8 * 1024 * 1024, tracker_backend='exact',
+                 bpf_filter=DEFAULT_BPF_FILTER, capture_backend='socket', ml_batch_size=1):
+        """
+        Initialize the sharded capture
+
+        Args:
+            alert_callback: Function called (in this process) for every alert
+            num_workers: Number of detection worker processes (default: CPUs - 1)
+            use_ml: Run PacketAnalyzerML in the workers instead of PacketAnalyzer
+            signature_file: Optional payload signature file (see payload_scanner)
+            ring_bytes: Shared-memory ring size per worker
+            tracker_backend: Per-source tracker backend of each worker
+                ('exact' or 'sketch', see source_trackers)
+            bpf_filter: Kernel-side capture filter ('' disables, see capture_filter)
+            capture_backend: 'socket' or 'mmap' (memory-mapped ring, see mmap_capture)
+            ml_batch_size: ML inference batch size of each worker; above 1 the
+                features of a whole ring batch are extracted at once (see
+                PacketAnalyzerML batch_size for the feature lag this costs)
+        """
+        self.alert_callback = alert_callback
+        self.num_workers = num_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.use_ml = use_ml
+        self.signature_file = signature_file
+        self.ring_bytes = ring_bytes
+        self.tracker_backend = tracker_backend
+        self.ml_batch_size = ml_batch_size
+        self.bpf_filter = bpf_filter
+        self.capture_backend = check_capture_backend(capture_backend)
+        self.running = False
+        self.WORKER_STOP_TIMEOUT = 10.0  # Seconds a stopping worker may go without draining its ring
+
+        self._context = multiprocessing.get_context(START_METHOD)
+        if START_METHOD == 'forkserver':
+            # Import the worker code once in the fork server, not in every worker
+            self._context.set_forkserver_preload(['__main__', 'sharded_capture'])
+        self.rings = []
+        self.workers = []
+        self.capture_process = None
+        self._capture_counters = None
+        self.dispatcher = None
+        self.alert_queue = None
+        self.alert_thread = None
+        self._stop_event = None
+        self._alerts_done = threading.Event()
+
+    def _start_workers(self, use_capture_clock=False):
+        """Create the rings, worker processes and alert merge thread"""
+        context = self._context
+        self._stop_event = context.Event()
+        self.alert_queue = context.Queue()
+        self.rings = [SharedFrameRing(self.ring_bytes) for _ in range(self.num_workers)]
+        self.dispatcher = FrameDispatcher(self.rings)
+        self.workers = [
+            context.Process(
+                target=_worker_main,
+                args=(ring.name, self.alert_queue, self._stop_event, self.use_ml,
+                      self.signature_file, use_capture_clock, self.tracker_backend, self.ml_batch_size),
+                name=f'ids-shard-{index}',
+                daemon=True
+            )
+            for index, ring in enumerate(self.rings)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+        self._alerts_done.clear()
+        self.alert_thread = threading.Thread(target=self._merge_alerts, daemon=True)
+        self.alert_thread.start()
+        self.running = True
+
+    def _merge_alerts(self):
+        """Forward worker alerts to alert_callback until every worker exits"""
+        while True:
+            try:
+                alert_data = self.alert_queue.get(timeout=0.2)
+            except queue.Empty:
+                if self._alerts_done.is_set():
+                    return
+                continue
+            if self.alert_callback:
+                try:
+                    self.alert_callback(alert_data)
+                except Exception as e:
+                    print(f"❌ Alert callback error: {str(e)}")
+
+    def _stop_workers(self):
+        """
+        Let workers drain their rings, then release all shared resources
+
+        A worker that reads nothing from its ring for WORKER_STOP_TIMEOUT
+        seconds (hung, or stuck after its ring is empty) is terminated.
+        """
+        self._stop_event.set()
+        for worker, ring in zip(self.workers, self.rings):
+            read = ring.get_stats()['read']
+            progress = time.monotonic()
+            while True:
+                worker.join(timeout=0.2)
+                if not worker.is_alive():
+                    break
+                now_read = ring.get_stats()['read']
+                if now_read != read:
+                    read, progress = now_read, time.monotonic()
+                elif time.monotonic() - progress > self.WORKER_STOP_TIMEOUT:
+                    print(f"⚠️  {worker.name} did not exit within {self.WORKER_STOP_TIMEOUT:.0f}s; terminating it")
+                    worker.terminate()
+                    worker.join(timeout=1)
+                    break
+        self._alerts_done.set()
+        self.alert_thread.join()
+
+        stats = self.get_stats()
+        for ring in self.rings:
+            ring.close()
+        self.rings = []
+        self.workers = []
+        self.running = False
+        return stats
+
+    def start_sniffing(self, interface=None):
+        """Start the capture process and the detection workers"""
+        if self.running:
+            print("⚠️  Sniffer is already running")
+            return
+
+        self._start_workers()
+        self._capture_counters = self._context.Array('d', [-1, -1, -1, 0], lock=False)
+        self.capture_process = self._context.Process(
+            target=_capture_main,
+            args=([ring.name for ring in self.rings], interface, self._stop_event,
+                  self.bpf_filter, self._capture_counters, self.capture_backend),
+            name='ids-capture',
+            daemon=True
+        )
+        self.capture_process.start()
+        print(f"✅ Sharded packet capture started on interface: {interface or 'default'} "
+              f"({self.num_workers} workers)")
+
+    def stop_sniffing(self):
+        """Stop capturing and wait for the workers to drain"""
+        if not self.running:
+            return
+        self._stop_event.set()
+        if self.capture_process:
+            self.capture_process.join(timeout=2)
+            if self.capture_process.is_alive():
+                self.capture_process.terminate()
+            self.capture_process = None
+        stats = self._stop_workers()
+        capture = self.get_capture_stats()
+        if capture and capture['delivered'] is not None:
+            print(f"📉 Kernel filter: {capture['kernel_filtered']} filtered, {capture['delivered']} delivered, "
+                  f"{capture['kernel_dropped']} dropped")
+        print(f"🛑 Sharded packet capture stopped ({stats['processed']} packets, "
+              f"{stats['dropped']} dropped)")
+
+    def get_capture_stats(self):
+        """Packets filtered, delivered and dropped by the kernel in the capture process"""
+        if self._capture_counters is None:
+            return None
+        seen, received, dropped, applied = (None if value < 0 else int(value) for value in self._capture_counters)
+        return summarize(self.bpf_filter if applied else '', seen, received, dropped)
+
+    def get_stats(self):
+        """Aggregate ring counters across shards"""
+        shards = [ring.get_stats() for ring in self.rings]
+        return {
+            'workers': self.num_workers,
+            'processed': sum(shard['read'] for shard in shards),
+            'dropped': sum(shard['dropped'] for shard in shards),
+            'per_shard': shards
+        }
+
+    def replay_pcap(self, path, speed=None, use_capture_clock=True, report=True):
+        """
+        Replay a capture file through the sharded workers (no root needed)
+
+        Frames are dispatched from this process and never dropped; the
+        replay finishes once every worker has drained its ring.
+
+        Args:
+            path: Path to a pcap or pcapng file
+            speed: None for as fast as possible, 1.0 for recorded timing
+            use_capture_clock: Expire tracker state on capture timestamps
+            report: Print a summary when the replay finishes
+
+        Returns:
+            dict with packet/alert counts, throughput and per-stage timings
+        """
+        from pcap_replay import _read_frames, print_replay_report
+
+        if self.running:
+            raise RuntimeError("Cannot replay while live capture is running")
+
+        alerts_by_type = Counter()
+        original_callback = self.alert_callback
+
+        def count_alert(alert_data):
+            alerts_by_type[alert_data.get('threat_type', 'Unknown')] += 1
+            if original_callback:
+                original_callback(alert_data)
+
+        self.alert_callback = count_alert
+        stage_times = {'startup': 0.0, 'dispatch': 0.0, 'pacing': 0.0, 'drain': 0.0}
+        packets = 0
+        first_capture_ts = None
+        started = time.perf_counter()
+        try:
+            self._start_workers(use_capture_clock=use_capture_clock)
+            dispatch = self.dispatcher.dispatch
+            stage_times['startup'] = time.perf_counter() - started
+            started = time.perf_counter()
+
+            for frame, linktype, packet_ts in _read_frames(path):
+                if speed:
+                    if first_capture_ts is None:
+                        first_capture_ts = packet_ts
+                    pace_start = time.perf_counter()
+                    delay = started + (packet_ts - first_capture_ts) / speed - pace_start
+                    if delay > 0:
+                        time.sleep(delay)
+                    stage_times['pacing'] += time.perf_counter() - pace_start
+                dispatch(frame, linktype, packet_ts, block=True)
+                packets += 1
+            stage_times['dispatch'] = time.perf_counter() - started - stage_times['pacing']
+
+            drain_start = time.perf_counter()
+            self._stop_workers()
+            stage_times['drain'] = time.perf_counter() - drain_start
+        finally:
+            self.alert_callback = original_callback
+            if self.running:
+                self._stop_workers()
+
+        elapsed = time.perf_counter() - started
+        results = {
+            'file': path,
+            'packets': packets,
+            'workers': self.num_workers,
+            'elapsed_sec': elapsed,
+            'packets_per_sec': packets / elapsed if elapsed > 0 else 0.0,
+            'alerts': sum(alerts_by_type.values()),
+            'alerts_by_type': dict(alerts_by_type),
+            'stage_times_sec': stage_times,
+            'speed': speed or 'max'
+        }
+
+        if report:
+            print_replay_report(results)
+        return results
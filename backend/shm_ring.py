@@ -0,0 +1,137 @@
+"""
+Shared-Memory Frame Ring
+Single-producer/single-consumer ring buffer in multiprocessing shared memory,
+used to hand raw frames from the capture process to a detection worker
+without pickling
+
+Layout: a 64-byte header of counters followed by the data area. Each record
+is [length:u32][linktype:u16][pad:u16][timestamp:f64][frame bytes], padded to
+8 bytes. Only the producer writes head/written/dropped and only the consumer
+writes tail/read, so no lock is needed.
+"""
+
+import struct
+from multiprocessing import shared_memory
+
+_HEADER = struct.Struct('=QQQQQ')        # head, tail, written, read, dropped
+_HEADER_SIZE = 64
+_U64 = struct.Struct('=Q')
+_RECORD = struct.Struct('=IHxxd')        # frame length, linktype, timestamp
+_WRAP_MARKER = 0xFFFFFFFF
+
+_HEAD, _TAIL, _WRITTEN, _READ, _DROPPED = 0, 8, 16, 24, 32
+
+
+class SharedFrameRing:
+    """Lock-free SPSC frame queue backed by multiprocessing.shared_memory"""
+
+    def __init__(self, capacity=4 * 1024 * 1024, name=None):
+        """
+        Create a new ring, or attach to an existing one by name
+
+        Args:
+            capacity: Size of the data area in bytes (rounded up to 8)
+            name: Shared memory block to attach to (None creates a new one)
+        """
+        if name is None:
+            capacity = (capacity + 7) & ~7
+            self.shm = shared_memory.SharedMemory(create=True, size=_HEADER_SIZE + capacity)
+            self.shm.buf[:_HEADER_SIZE] = bytes(_HEADER_SIZE)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            capacity = self.shm.size - _HEADER_SIZE
+            self.owner = False
+        self.capacity = capacity
+        self.buf = self.shm.buf
+        self.name = self.shm.name
+
+    def _get(self, offset):
+        return _U64.unpack_from(self.buf, offset)[0]
+
+    def _set(self, offset, value):
+        _U64.pack_into(self.buf, offset, value)
+
+    def put(self, frame, linktype, timestamp=0.0):
+        """
+        Append a frame (producer side)
+
+        Returns:
+            True if queued, False if the ring is full and the frame was dropped
+        """
+        length = len(frame)
+        size = (_RECORD.size + length + 7) & ~7
+        head = self._get(_HEAD)
+        free = self.capacity - (head - self._get(_TAIL))
+        offset = head % self.capacity
+        skip = self.capacity - offset if offset + size > self.capacity else 0
+
+        if size + skip > free or size > self.capacity:
+            self._set(_DROPPED, self._get(_DROPPED) + 1)
+            return False
+
+        buf = self.buf
+        if skip:
+            # Not enough room before the end: mark the remainder and wrap
+            struct.pack_into('=I', buf, _HEADER_SIZE + offset, _WRAP_MARKER)
+            offset = 0
+        start = _HEADER_SIZE + offset
+        _RECORD.pack_into(buf, start, length, linktype, timestamp)
+        start += _RECORD.size
+        buf[start:start + length] = frame
+
+        # Publish the record only after its bytes are in place
+        self._set(_WRITTEN, self._get(_WRITTEN) + 1)
+        self._set(_HEAD, head + skip + size)
+        return True
+
+    def get_batch(self, max_items=256):
+        """
+        Pop up to max_items frames (consumer side)
+
+        Returns:
+            list of (frame bytes, linktype, timestamp)
+        """
+        buf = self.buf
+        capacity = self.capacity
+        head = self._get(_HEAD)
+        tail = self._get(_TAIL)
+        batch = []
+
+        while tail < head and len(batch) < max_items:
+            offset = tail % capacity
+            start = _HEADER_SIZE + offset
+            if capacity - offset < _RECORD.size or struct.unpack_from('=I', buf, start)[0] == _WRAP_MARKER:
+                tail += capacity - offset
+                continue
+            length, linktype, timestamp = _RECORD.unpack_from(buf, start)
+            start += _RECORD.size
+            batch.append((bytes(buf[start:start + length]), linktype, timestamp))
+            tail += (_RECORD.size + length + 7) & ~7
+
+        if batch:
+            self._set(_READ, self._get(_READ) + len(batch))
+        self._set(_TAIL, tail)
+        return batch
+
+    def __len__(self):
+        """Frames currently queued"""
+        return self._get(_WRITTEN) - self._get(_READ)
+
+    def get_stats(self):
+        """Producer/consumer counters"""
+        head, tail, written, read, dropped = _HEADER.unpack_from(self.buf, 0)
+        return {
+            'capacity_bytes': self.capacity,
+            'used_bytes': head - tail,
+            'written': written,
+            'read': read,
+            'dropped': dropped
+        }
+
+    def close(self):
+        """Detach from the ring; the creating process also frees it"""
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
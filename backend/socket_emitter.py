@@ -0,0 +1,144 @@
+"""
+Batched WebSocket Emitter
+Coalesces alert and stats broadcasts: alerts collected during a short flush
+window go out as one 'alerts_batch' event, and stats as at most one
+'stats_update' per interval
+
+Each client acknowledges every batch. A client with too many unacknowledged
+batches is considered behind: it receives nothing until it catches up, and
+its next batch reports how many alerts it skipped.
+"""
+
+import threading
+import time
+from collections import deque
+from functools import partial
+
+
+class _ClientState:
+    __slots__ = ('inflight', 'skipped', 'last_ack')
+
+    def __init__(self):
+        self.inflight = 0
+        self.skipped = 0
+        self.last_ack = time.monotonic()
+
+
+class SocketEmitter:
+    def __init__(self, socketio, flush_interval=0.25, stats_interval=1.0, max_batch=200,
+                 max_inflight=3, ack_timeout=10.0):
+        """
+        Initialize the emitter
+
+        Args:
+            socketio: Flask-SocketIO server
+            flush_interval: Seconds alerts are collected before a batch is sent
+            stats_interval: Minimum seconds between stats_update broadcasts
+            max_batch: Alerts per batch; older alerts in a busier window are
+                only counted
+            max_inflight: Unacknowledged batches before a client is skipped
+            ack_timeout: Seconds after which a silent client is sent to again
+        """
+        self.socketio = socketio
+        self.flush_interval = flush_interval
+        self.stats_interval = stats_interval
+        self.max_batch = max_batch
+        self.max_inflight = max_inflight
+        self.ack_timeout = ack_timeout
+
+        self._pending = deque(maxlen=max_batch)
+        self._pending_count = 0
+        self._stats = None
+        self._last_stats = 0.0
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'batches': 0, 'alerts': 0, 'skipped': 0}
+
+    def start(self):
+        """Start the flush thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add_client(self, sid):
+        with self._lock:
+            self._clients[sid] = _ClientState()
+
+    def remove_client(self, sid):
+        with self._lock:
+            self._clients.pop(sid, None)
+
+    def emit_alert(self, alert):
+        """Queue an alert for the next batch"""
+        with self._lock:
+            self._pending.append(alert)
+            self._pending_count += 1
+
+    def emit_stats(self, stats):
+        """Queue a stats snapshot (only the latest per interval is sent)"""
+        with self._lock:
+            self._stats = dict(stats)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Socket emitter error: {str(e)}")
+
+    def flush(self):
+        """Send the pending batch and, if due, the latest stats"""
+        now = time.monotonic()
+        with self._lock:
+            # Newest first, matching /api/alerts
+            alerts = list(reversed(self._pending))
+            count = self._pending_count
+            self._pending.clear()
+            self._pending_count = 0
+
+            stats = None
+            if self._stats is not None and now - self._last_stats >= self.stats_interval:
+                stats, self._stats = self._stats, None
+                self._last_stats = now
+
+            recipients = []
+            if count:
+                for sid, state in self._clients.items():
+                    if state.inflight >= self.max_inflight:
+                        if now - state.last_ack < self.ack_timeout:
+                            state.skipped += count
+                            self.stats['skipped'] += count
+                            continue
+                        state.last_ack = now  # Silent client: probe once per ack_timeout
+                    recipients.append((sid, state.skipped))
+                    state.inflight += 1
+                    state.skipped = 0
+                self.stats['batches'] += 1
+                self.stats['alerts'] += count
+
+        for sid, skipped in recipients:
+            self.socketio.emit('alerts_batch', {
+                'alerts': alerts,
+                'count': count,
+                'skipped': skipped
+            }, to=sid, callback=partial(self._ack, sid))
+
+        if stats is not None:
+            self.socketio.emit('stats_update', stats)
+
+    def _ack(self, sid, *args):
+        with self._lock:
+            state = self._clients.get(sid)
+            if state:
+                state.inflight = max(state.inflight - 1, 0)
+                state.last_ack = time.monotonic()
+
+    def get_stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            lagging = sum(1 for state in self._clients.values() if state.inflight >= self.max_inflight)
+            return dict(self.stats, clients=len(self._clients), lagging_clients=lagging,
+                        pending=self._pending_count)
@@ -0,0 +1,434 @@
+"""
+Per-source Tracker Backends
+State behind the rule-based checks: distinct destination ports, SYN, packet
+and ICMP counts per source IP within TIME_WINDOW
+
+Two interchangeable backends are provided (see create_trackers):
+
+- ExactTrackers: exact counts and port sets in one compact record per IP,
+  expired by a timing wheel TIME_WINDOW seconds after their last update.
+  Memory grows with the number of distinct sources, which a spoofed-source
+  flood makes unbounded.
+
+- SketchTrackers: fixed-memory probabilistic structures that are cleared
+  every TIME_WINDOW (tumbling window). Memory is the same whether 10 or 10
+  million sources appear:
+    * packet/SYN/ICMP counts: Count-Min sketches with conservative update
+    * distinct ports: a hashed table of 64-bit linear-counting bitmaps
+    * top talkers: a heavy-hitter list of the k sources with the largest
+      Count-Min packet estimates
+
+Error bounds of the sketch backend (width w, depth d, N events of one kind
+in the current window):
+    * Counts never under-estimate. With probability >= 1 - e^-d the
+      over-estimate is at most (e / w) * N; for the defaults (w = 65536,
+      d = 4) that is 0.0041% of N with 98.2% confidence, e.g. at most 41
+      extra packets per source while 1 million packets arrive in a window.
+    * Distinct ports are estimated as -64 * ln(1 - b / 64) from the b bits
+      set in the source's bitmap (about +/-1 port at the port-scan threshold
+      of 10). Another active source sharing the bitmap in every one of the
+      d rows can only inflate the estimate; with S port-using sources in a
+      window this happens with probability about (1 - e^(-S/w))^d, i.e.
+      0.24% for S = 16384. Estimates saturate at 64 * ln(64) ~ 266 ports.
+    * Top talkers: listed counts carry the Count-Min bound above. A source
+      is listed once its estimate exceeds the smallest listed one, so many
+      one-packet spoofed sources cannot push out a genuine heavy sender.
+Resetting a source after an alert subtracts its estimate from the sketch
+(and clears its port bitmaps), which may also lower the counts of sources
+colliding with it.
+
+Row indexes come from Python's per-process salted hash of the IP string, so
+senders cannot choose addresses that collide with a victim's cells.
+"""
+
+import math
+import random
+import time
+from array import array
+
+from expiry_wheel import ExpiryWheel
+
+# Tracked counters, by kind
+COUNTER_KINDS = ('syn', 'rate', 'icmp')
+TRACKER_BACKENDS = ('exact', 'sketch')
+
+_MASK64 = (1 << 64) - 1
+_PORT_BITS = 64
+_MAX_DISTINCT = int(_PORT_BITS * math.log(_PORT_BITS))
+
+
+def create_trackers(backend, ttl, **options):
+    """
+    Build a tracker backend
+
+    Args:
+        backend: 'exact' or 'sketch'
+        ttl: Tracking window in seconds (the analyzer's TIME_WINDOW)
+        **options: Backend specific settings (e.g. width/depth for 'sketch')
+
+    Raises:
+        ValueError: unknown backend
+    """
+    if backend == 'exact':
+        return ExactTrackers(ttl, **options)
+    if backend == 'sketch':
+        return SketchTrackers(ttl, **options)
+    raise ValueError(f"Unknown tracker backend '{backend}' (expected one of {', '.join(TRACKER_BACKENDS)})")
+
+
+def _row_offsets(ip, width, depth):
+    """Cell index of ip in each of the depth rows (double hashing)"""
+    h = hash(ip) & _MASK64
+    h1 = h & 0xFFFFFFFF
+    h2 = (h >> 32) | 1
+    return [row * width + (h1 + row * h2) % width for row in range(depth)]
+
+
+class SourceState:
+    """Everything the exact backend tracks for one source IP"""
+    __slots__ = ('syn', 'rate', 'icmp', 'ports', 'syn_until', 'rate_until', 'icmp_until', 'ports_until')
+
+    def __init__(self):
+        self.syn = self.rate = self.icmp = 0
+        self.ports = None   # None, a single port, or a set once a second port is seen
+        # Wheel tick at which each counter expires (it is live while > current tick)
+        self.syn_until = self.rate_until = self.icmp_until = self.ports_until = 0
+
+
+_UNTIL = {kind: kind + '_until' for kind in COUNTER_KINDS + ('ports',)}
+
+
+class ExactTrackers:
+    def __init__(self, ttl, clock=time.monotonic):
+        """
+        Initialize exact per-source tracking
+
+        Each counter of a source expires ttl seconds after it was last
+        updated; the source's record is dropped once all of them have.
+
+        Args:
+            ttl: Seconds of inactivity after which a counter is forgotten
+            clock: Monotonic time source (overridable for replays)
+        """
+        self.backend = 'exact'
+        self._sources = {}      # IP -> SourceState
+        # Expiry schedule keyed by IP; a record's deadline is its latest counter's
+        self.expiry_wheel = ExpiryWheel(ttl=ttl, tick=1.0, clock=clock)
+
+    @property
+    def time_source(self):
+        return self.expiry_wheel.clock
+
+    def clock(self):
+        return self.expiry_wheel.clock()
+
+    def set_clock(self, clock):
+        """Switch time source; live counters get a fresh ttl on the new clock"""
+        tick = self.expiry_wheel.current_tick
+        self.expiry_wheel.set_clock(clock)
+        deadlines = self.expiry_wheel.deadlines
+        for ip, state in self._sources.items():
+            for kind, until in _UNTIL.items():
+                if getattr(state, until) > tick:
+                    setattr(state, until, deadlines[ip])
+                else:
+                    setattr(state, kind, None if kind == 'ports' else 0)
+                    setattr(state, until, 0)
+
+    def _touch(self, ip):
+        """Record activity of ip; returns the tick at which it expires"""
+        wheel = self.expiry_wheel
+        wheel.touch(ip)
+        return wheel.deadlines[ip]
+
+    def increment(self, kind, ip):
+        """Count one event of a kind ('syn', 'rate', 'icmp') and return the total"""
+        state = self._sources.get(ip)
+        if state is None:
+            state = self._sources[ip] = SourceState()
+        until = _UNTIL[kind]
+        count = getattr(state, kind) + 1 if getattr(state, until) > self.expiry_wheel.current_tick else 1
+        setattr(state, kind, count)
+        setattr(state, until, self._touch(ip))
+        return count
+
+    def add_port(self, ip, port):
+        """Record a destination port and return the number of distinct ports"""
+        state = self._sources.get(ip)
+        if state is None:
+            state = self._sources[ip] = SourceState()
+        ports = state.ports
+        if ports is None or state.ports_until <= self.expiry_wheel.current_tick:
+            state.ports = port
+            distinct = 1
+        elif type(ports) is int:
+            if ports == port:
+                distinct = 1
+            else:
+                state.ports = {ports, port}
+                distinct = 2
+        else:
+            ports.add(port)
+            distinct = len(ports)
+        state.ports_until = self._touch(ip)
+        return distinct
+
+    def count(self, kind, ip):
+        """Current count of a kind, without creating an entry"""
+        state = self._sources.get(ip)
+        if state is None or getattr(state, _UNTIL[kind]) <= self.expiry_wheel.current_tick:
+            return 0
+        return getattr(state, kind)
+
+    def distinct_ports(self, ip):
+        state = self._sources.get(ip)
+        if state is None or state.ports is None or state.ports_until <= self.expiry_wheel.current_tick:
+            return 0
+        return 1 if type(state.ports) is int else len(state.ports)
+
+    def reset(self, kind, ip):
+        """Start counting a kind (or 'ports') from zero after an alert"""
+        state = self._sources.get(ip)
+        if state is None:
+            return
+        if kind == 'ports':
+            state.ports = None
+        else:
+            setattr(state, kind, 0)
+
+    def expire(self):
+        """Drop sources idle for ttl seconds (bulk, on wheel ticks)"""
+        sources = self._sources
+        for ip in self.expiry_wheel.advance():
+            sources.pop(ip, None)
+
+    def top_talkers(self, n=10):
+        """[(ip, packets)] for the n busiest sources"""
+        tick = self.expiry_wheel.current_tick
+        rates = ((ip, state.rate) for ip, state in self._sources.items() if state.rate_until > tick)
+        return sorted(rates, key=lambda item: -item[1])[:n]
+
+    def clear(self):
+        self._sources.clear()
+        self.expiry_wheel.clear()
+
+    def get_stats(self):
+        return {'backend': self.backend, 'sources': len(self._sources)}
+
+
+class CountMinSketch:
+    def __init__(self, width=65536, depth=4):
+        """
+        Initialize a Count-Min sketch of depth rows x width uint32 counters
+
+        Args:
+            width: Counters per row; the over-estimate is at most e / width
+                of the total count (with probability 1 - e^-depth)
+            depth: Independent rows
+        """
+        self.width = width
+        self.depth = depth
+        self.cells = array('I', bytes(4 * width * depth))
+
+    def add(self, offsets):
+        """
+        Count one event at the given cells (see _row_offsets)
+
+        Conservative update: only the cells below the new estimate are raised,
+        which keeps over-estimates far below the worst-case bound.
+
+        Returns:
+            the new estimate
+        """
+        cells = self.cells
+        estimate = min(cells[i] for i in offsets) + 1
+        for i in offsets:
+            if cells[i] < estimate:
+                cells[i] = estimate
+        return estimate
+
+    def estimate(self, offsets):
+        cells = self.cells
+        return min(cells[i] for i in offsets)
+
+    def subtract(self, offsets):
+        """Remove a key's estimated count (every row holds at least that much)"""
+        cells = self.cells
+        estimate = min(cells[i] for i in offsets)
+        for i in offsets:
+            cells[i] -= estimate
+
+    def clear(self):
+        self.cells = array('I', bytes(4 * self.width * self.depth))
+
+    @property
+    def nbytes(self):
+        return self.cells.itemsize * len(self.cells)
+
+
+class PortBitmapSketch:
+    def __init__(self, width=65536, depth=4):
+        """
+        Initialize depth rows x width 64-bit bitmaps for distinct-port estimates
+
+        A source's ports set bits in its bitmap of every row; the row with the
+        fewest bits set (least shared with other sources) gives the estimate.
+        """
+        self.width = width
+        self.depth = depth
+        self.words = array('Q', bytes(8 * width * depth))
+        # Random odd multiplier: ports spread over the 64 bits (multiply-shift hash)
+        self._multiplier = random.getrandbits(32) | 1
+
+    def add(self, offsets, port):
+        """Record a port and return the distinct-port estimate"""
+        bit = 1 << (((port * self._multiplier) & 0xFFFFFFFF) >> 26)
+        words = self.words
+        for i in offsets:
+            words[i] |= bit
+        return self.estimate(offsets)
+
+    def estimate(self, offsets):
+        words = self.words
+        bits = min(bin(words[i]).count('1') for i in offsets)
+        if bits >= _PORT_BITS:
+            return _MAX_DISTINCT
+        return int(round(-_PORT_BITS * math.log(1 - bits / _PORT_BITS)))
+
+    def reset(self, offsets):
+        words = self.words
+        for i in offsets:
+            words[i] = 0
+
+    def clear(self):
+        self.words = array('Q', bytes(8 * self.width * self.depth))
+
+    @property
+    def nbytes(self):
+        return self.words.itemsize * len(self.words)
+
+
+class HeavyHitters:
+    def __init__(self, k=32):
+        """
+        Initialize a list of the k keys with the largest sketch estimates
+
+        Args:
+            k: Keys kept; only a key whose estimate exceeds the smallest kept
+                one displaces it
+        """
+        self.k = k
+        self.counts = {}
+        self._floor = 0     # Lower bound on the smallest kept count
+
+    def update(self, key, estimate):
+        """Offer a key with its current (sketch) estimate"""
+        counts = self.counts
+        if key in counts:
+            counts[key] = estimate
+        elif len(counts) < self.k:
+            counts[key] = estimate
+        elif estimate > self._floor:
+            smallest = min(counts, key=counts.get)
+            if estimate > counts[smallest]:
+                del counts[smallest]
+                counts[key] = estimate
+            self._floor = min(counts.values())
+
+    def top(self, n=10):
+        return sorted(self.counts.items(), key=lambda item: -item[1])[:n]
+
+    def clear(self):
+        self.counts = {}
+        self._floor = 0
+
+
+class SketchTrackers:
+    def __init__(self, ttl, width=65536, depth=4, top_k=32, clock=time.monotonic):
+        """
+        Initialize fixed-memory per-source tracking
+
+        Args:
+            ttl: Window length in seconds; all structures are cleared when a
+                window ends
+            width: Cells per sketch row (accuracy, see module docstring)
+            depth: Sketch rows (confidence, see module docstring)
+            top_k: Sources kept in the top-talker list
+            clock: Monotonic time source (overridable for replays)
+        """
+        self.backend = 'sketch'
+        self.ttl = float(ttl)
+        self.width = width
+        self.depth = depth
+        self.time_source = clock
+        self._counters = {kind: CountMinSketch(width, depth) for kind in COUNTER_KINDS}
+        self._ports = PortBitmapSketch(width, depth)
+        self._talkers = HeavyHitters(top_k)
+        self._window_end = clock() + self.ttl
+        self.windows = 0
+
+    def clock(self):
+        return self.time_source()
+
+    def set_clock(self, clock):
+        """Switch time source; the current window restarts on the new clock"""
+        self.time_source = clock
+        self._window_end = clock() + self.ttl
+
+    def increment(self, kind, ip):
+        """Count one event of a kind ('syn', 'rate', 'icmp') and return the estimate"""
+        estimate = self._counters[kind].add(_row_offsets(ip, self.width, self.depth))
+        if kind == 'rate':
+            self._talkers.update(ip, estimate)
+        return estimate
+
+    def add_port(self, ip, port):
+        """Record a destination port and return the distinct-port estimate"""
+        return self._ports.add(_row_offsets(ip, self.width, self.depth), port)
+
+    def count(self, kind, ip):
+        return self._counters[kind].estimate(_row_offsets(ip, self.width, self.depth))
+
+    def distinct_ports(self, ip):
+        return self._ports.estimate(_row_offsets(ip, self.width, self.depth))
+
+    def reset(self, kind, ip):
+        """Subtract a source's estimate (or clear its port bitmaps) after an alert"""
+        offsets = _row_offsets(ip, self.width, self.depth)
+        if kind == 'ports':
+            self._ports.reset(offsets)
+        else:
+            self._counters[kind].subtract(offsets)
+
+    def expire(self):
+        """Start a new window once the current one has ended"""
+        now = self.time_source()
+        if now >= self._window_end:
+            self.clear()
+            self._window_end = now + self.ttl
+            self.windows += 1
+
+    def top_talkers(self, n=10):
+        """[(ip, packets)] for the busiest sources of the current window"""
+        return self._talkers.top(n)
+
+    def clear(self):
+        for sketch in self._counters.values():
+            sketch.clear()
+        self._ports.clear()
+        self._talkers.clear()
+
+    @property
+    def nbytes(self):
+        return sum(sketch.nbytes for sketch in self._counters.values()) + self._ports.nbytes
+
+    def get_stats(self):
+        return {
+            'backend': self.backend,
+            'memory_bytes': self.nbytes,
+            'width': self.width,
+            'depth': self.depth,
+            'relative_error': math.e / self.width,
+            'confidence': 1 - math.exp(-self.depth),
+            'windows': self.windows
+        }
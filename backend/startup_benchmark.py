@@ -0,0 +1,106 @@
+"""
+Cold-start Benchmark for the IDS Backend
+Starts fresh interpreters that import app.py and answer GET /api/health,
+and reports how long that took and how much memory it used
+
+The "eager" mode imports the capture stack (Scapy) and TensorFlow up front,
+as app.py and packet_sniffer_ml.py used to, for comparison with the default
+lazy startup.
+
+Usage:
+    python startup_benchmark.py [--runs 5] [--modes lazy eager]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_CHILD = r'''
+import json, resource, sys, time
+started = time.perf_counter()
+if sys.argv[1] == 'eager':
+    import importlib.util
+    if importlib.util.find_spec('scapy'):
+        import packet_sniffer
+    if importlib.util.find_spec('tensorflow'):
+        from tensorflow import keras
+import app
+response = app.app.test_client().get('/api/health')
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    'health_status': response.status_code,
+    'ready_sec': elapsed,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': len(sys.modules)
+}))
+'''
+
+
+def measure(mode):
+    """Run one cold start in a fresh interpreter"""
+    env = dict(os.environ)
+    env.setdefault('ALERT_DB_PATH', '')  # Leave the alert database out of the measurement
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', _CHILD, mode], cwd=BACKEND_DIR, env=env,
+                               capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else 'child failed')
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['wall_sec'] = wall
+    return result
+
+
+def run_benchmark(runs=5, modes=('lazy', 'eager')):
+    """
+    Measure cold starts
+
+    Returns:
+        {mode: {'ready_sec', 'wall_sec', 'max_rss_mb', 'modules'}} (medians)
+    """
+    results = {}
+    for mode in modes:
+        samples = [measure(mode) for _ in range(runs)]
+        results[mode] = {
+            key: statistics.median(sample[key] for sample in samples)
+            for key in ('ready_sec', 'wall_sec', 'max_rss_mb', 'modules')
+        }
+    return results
+
+
+def print_report(results, runs):
+    print("\n" + "="*60)
+    print(f"⏱️  BACKEND COLD START (median of {runs} runs)")
+    print("="*60)
+    for mode, stats in results.items():
+        print(f"   {mode}:")
+        print(f"      - import + first /api/health: {stats['ready_sec'] * 1000:.0f} ms")
+        print(f"      - process wall time: {stats['wall_sec'] * 1000:.0f} ms")
+        print(f"      - peak RSS: {stats['max_rss_mb']:.0f} MB")
+        print(f"      - modules loaded: {stats['modules']:.0f}")
+    if 'lazy' in results and 'eager' in results:
+        saved = results['eager']['ready_sec'] - results['lazy']['ready_sec']
+        print(f"   Lazy imports save {saved * 1000:.0f} ms and "
+              f"{results['eager']['max_rss_mb'] - results['lazy']['max_rss_mb']:.0f} MB at startup")
+    print("="*60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure IDS backend cold-start time')
+    parser.add_argument('--runs', type=int, default=5, help='Cold starts per mode')
+    parser.add_argument('--modes', nargs='+', default=['lazy', 'eager'], choices=['lazy', 'eager'],
+                        help='Startup modes to measure')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.runs, args.modes)
+    print_report(results, args.runs)
+
+
+if __name__ == '__main__':
+    main()
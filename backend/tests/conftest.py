@@ -0,0 +1,61 @@
+"""
+Shared pytest setup: the backend modules are flat and imported by bare
+name, as app.py does when run from backend/
+"""
+
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+class RecordingBatcher:
+    """Stands in for MicroBatchInference: records submissions, scores nothing"""
+
+    def __init__(self, analyzer, immediate):
+        self.analyzer = analyzer
+        self.immediate = immediate  # Deliver each result at once (sequential order)
+        self.submitted = []
+        self.pending = []
+
+    def submit(self, features, context):
+        self.submitted.append(np.asarray(features, dtype=np.float64).reshape(-1))
+        if self.immediate:
+            self.analyzer._handle_batched_result(context, None)
+        else:
+            self.pending.append(context)
+
+    def flush(self):
+        """The worker catching up: every pending packet gets its (benign) result"""
+        pending, self.pending = self.pending, []
+        for context in pending:
+            self.analyzer._handle_batched_result(context, None)
+
+
+@pytest.fixture
+def make_ml_analyzer():
+    """
+    Factory for a PacketAnalyzerML in micro-batching mode without models
+
+    The batcher is a RecordingBatcher, the tracker clock is frozen and the
+    tracker thresholds are out of reach unless the test lowers them.
+    """
+    from packet_sniffer_ml import PacketAnalyzerML
+
+    def make(tracker_backend='exact', immediate=False, alert_callback=None):
+        random.seed(0)  # Same port-sketch hash in every analyzer
+        analyzer = PacketAnalyzerML(alert_callback=alert_callback, batch_size=1, alert_window=0,
+                                    verdict_cache_size=0, tracker_backend=tracker_backend)
+        analyzer.ml_enabled = True
+        analyzer.inference_batcher = RecordingBatcher(analyzer, immediate)
+        analyzer.trackers.set_clock(lambda: 0.0)
+        analyzer.PORT_SCAN_THRESHOLD = analyzer.SYN_FLOOD_THRESHOLD = analyzer.PACKET_RATE_THRESHOLD = 10 ** 9
+        return analyzer
+
+    return make
@@ -0,0 +1,134 @@
+"""AlertAggregator windows, summaries and hit conservation"""
+
+import random
+import threading
+
+from alert_aggregator import AlertAggregator, new_hits
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_alert(source, threat='Port Scan', timestamp=None, port=22):
+    return {'source_ip': source, 'destination_ip': '192.168.1.10', 'port': port,
+            'threat_type': threat, 'timestamp': timestamp, 'description': 'Port scan detected'}
+
+
+def make_aggregator(window=60.0, **options):
+    clock = Clock()
+    emitted = []
+    return AlertAggregator(emitted.append, window=window, clock=clock, **options), clock, emitted
+
+
+def test_first_emitted_repeats_summarized():
+    aggregator, clock, emitted = make_aggregator()
+    for i in range(5):
+        aggregator.submit(make_alert('10.0.0.1', timestamp=f't{i}'))
+    assert emitted == [make_alert('10.0.0.1', timestamp='t0')]
+
+    clock.now += 62
+    aggregator.flush()
+    summary = emitted[-1]
+    assert summary['aggregated'] is True
+    assert summary['hit_count'] == 5
+    assert (summary['first_seen'], summary['last_seen']) == ('t0', 't4')
+    assert summary['description'] == 'Port scan detected (repeated 4 more times in 60s window)'
+    assert aggregator.get_stats() == {'emitted': 1, 'suppressed': 4, 'summaries': 1, 'untracked': 0,
+                                      'open_windows': 0}
+
+
+def test_single_alert_has_no_summary():
+    aggregator, clock, emitted = make_aggregator()
+    aggregator.submit(make_alert('10.0.0.1'))
+    clock.now += 62
+    aggregator.flush()
+    aggregator.flush_all()
+    assert len(emitted) == 1
+
+
+def test_keys_are_independent_and_window_restarts():
+    aggregator, clock, emitted = make_aggregator(window=10.0)
+    aggregator.submit(make_alert('10.0.0.1'))
+    aggregator.submit(make_alert('10.0.0.1', port=23))
+    aggregator.submit(make_alert('10.0.0.1', threat='DDoS Attack'))
+    assert len(emitted) == 3
+    clock.now += 12
+    # Closing the window happens on the next submit; the new alert is a first occurrence again
+    aggregator.submit(make_alert('10.0.0.1'))
+    assert len(emitted) == 4 and 'aggregated' not in emitted[-1]
+
+
+def test_max_keys_passes_alerts_through():
+    aggregator, clock, emitted = make_aggregator(max_keys=2)
+    for source in ('10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.3'):
+        aggregator.submit(make_alert(source))
+    assert len(emitted) == 4
+    assert aggregator.get_stats()['untracked'] == 2
+
+
+def test_hits_are_conserved():
+    """Emitted alerts account for every submitted occurrence exactly once (see new_hits)"""
+    rng = random.Random(0)
+    aggregator, clock, emitted = make_aggregator(window=5.0)
+    submitted = 0
+    for _ in range(3000):
+        if rng.random() < 0.8:
+            aggregator.submit(make_alert(f'10.0.0.{rng.randint(1, 8)}', threat=rng.choice(['A', 'B'])))
+            submitted += 1
+        else:
+            clock.now += rng.choice([0.5, 2.0, 6.0])
+            if rng.random() < 0.5:
+                aggregator.flush()
+    aggregator.flush_all()
+    assert sum(new_hits(alert) for alert in emitted) == submitted
+    assert aggregator.get_stats()['open_windows'] == 0
+
+
+def test_emit_called_without_lock_held():
+    acquired = []
+
+    def emit(alert):
+        # Fails if emit runs under the aggregator's lock
+        got = aggregator._lock.acquire(blocking=False)
+        if got:
+            aggregator._lock.release()
+        acquired.append(got)
+
+    aggregator = AlertAggregator(emit, window=1.0, clock=Clock())
+    aggregator.submit(make_alert('10.0.0.1'))
+    aggregator.submit(make_alert('10.0.0.1'))
+    aggregator.flush_all()
+    assert acquired == [True, True]
+
+
+def test_background_timer_flushes():
+    clock = Clock()
+    flushed = threading.Event()
+    emitted = []
+
+    def emit(alert):
+        emitted.append(alert)
+        if alert.get('aggregated'):
+            flushed.set()
+
+    aggregator = AlertAggregator(emit, window=1.0, clock=clock)
+    aggregator.submit(make_alert('10.0.0.1'))
+    aggregator.submit(make_alert('10.0.0.1'))
+    clock.now += 3
+    aggregator.start(interval=0.01)
+    try:
+        assert flushed.wait(2)
+    finally:
+        aggregator.stop()
+    assert emitted[-1]['hit_count'] == 2
+
+
+def test_new_hits():
+    assert new_hits({'threat_type': 'Port Scan'}) == 1
+    assert new_hits({'aggregated': True, 'hit_count': 7}) == 6
+    assert new_hits({'aggregated': True, 'hit_count': None}) == 0
@@ -0,0 +1,191 @@
+"""AlertDatabase writes, schema migration and queries against a plain list of the same alerts"""
+
+import sqlite3
+import time
+
+import pytest
+
+from alert_db import AlertDatabase
+
+SEVERITIES = ['Low', 'Medium', 'High']
+
+# Recent enough to survive the writer's retention purge
+BASE = time.time() - 3600
+
+
+def make_alert(alert_id, epoch, **fields):
+    alert = {
+        'id': alert_id,
+        'epoch': epoch,
+        'timestamp': f'2024-01-01T00:00:{alert_id % 60:02d}',
+        'source_ip': f'10.0.0.{alert_id % 3}',
+        'destination_ip': '192.168.1.10',
+        'threat_type': 'Port Scan' if alert_id % 2 else 'DDoS Attack',
+        'severity': SEVERITIES[alert_id % 3],
+        'status': 'Active',
+        'description': f'alert {alert_id}',
+        'port': 22,
+        'protocol': 'TCP'
+    }
+    alert.update(fields)
+    return alert
+
+
+@pytest.fixture
+def database(tmp_path):
+    db = AlertDatabase(str(tmp_path / 'alerts.db'), flush_interval=0.05)
+    db.start()
+    yield db
+    db.stop()
+
+
+@pytest.fixture
+def filled(database):
+    # Ids ascend with time except a few late alerts
+    alerts = [make_alert(i, BASE + i - (30 if i % 10 == 5 else 0)) for i in range(1, 121)]
+    for alert in alerts:
+        assert database.add_alert(alert)
+    assert database.flush()
+    return database, alerts
+
+
+def ids(alerts):
+    return [alert['id'] for alert in alerts]
+
+
+def test_flush_commits_queued_writes(database):
+    assert database.get_alert(1) is None
+    database.add_alert(make_alert(1, BASE))
+    database.update_status(1, 'Resolved')
+    database.add_blocked_ip('10.0.0.9')
+    database.save_stats({'total_packets': 5, 'threats_detected': 1})
+    database.save_stats({'total_packets': 7, 'threats_detected': 2})
+    assert database.flush()
+
+    assert database.get_alert(1)['status'] == 'Resolved'
+    assert database.load_blocked_ips() == ['10.0.0.9']
+    assert database.load_stats() == {'total_packets': 7, 'threats_detected': 2}
+    assert database.written == 1
+
+
+def test_flush_without_writer(tmp_path):
+    assert AlertDatabase(str(tmp_path / 'alerts.db')).flush() is False
+
+
+def test_stop_writes_pending_alerts(tmp_path):
+    path = str(tmp_path / 'alerts.db')
+    database = AlertDatabase(path, flush_interval=5)
+    database.start()
+    for i in range(1, 11):
+        database.add_alert(make_alert(i, BASE + i))
+    database.stop()
+    assert ids(AlertDatabase(path).recent_alerts(100)) == list(range(1, 11))
+
+
+def test_aggregation_fields_only_on_summary_alerts(database):
+    database.add_alert(make_alert(1, BASE))
+    database.add_alert(make_alert(2, BASE + 1, hit_count=40, first_seen='a', last_seen='b', aggregated=True))
+    database.flush()
+
+    plain = database.get_alert(1)
+    assert not {'hit_count', 'first_seen', 'last_seen', 'aggregated'} & set(plain)
+    summary = database.get_alert(2)
+    assert summary['hit_count'] == 40
+    assert summary['aggregated'] is True
+    assert (summary['first_seen'], summary['last_seen']) == ('a', 'b')
+
+
+def test_migrates_databases_without_aggregation_columns(tmp_path):
+    path = str(tmp_path / 'old.db')
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE alerts (id INTEGER PRIMARY KEY, epoch REAL NOT NULL, timestamp TEXT, "
+        "source_ip TEXT, destination_ip TEXT, threat_type TEXT, severity TEXT, status TEXT, "
+        "description TEXT, port INTEGER, protocol TEXT)"
+    )
+    connection.execute("INSERT INTO alerts (id, epoch, severity) VALUES (1, ?, 'High')", (BASE,))
+    connection.commit()
+    connection.close()
+
+    database = AlertDatabase(path, flush_interval=0.05)
+    assert database.get_alert(1)['severity'] == 'High'
+    database.start()
+    database.add_alert(make_alert(2, BASE + 1, hit_count=3, aggregated=True))
+    database.flush()
+    database.stop()
+    assert database.get_alert(2)['hit_count'] == 3
+
+
+def test_query_alerts_pages_match_list(filled):
+    database, alerts = filled
+    newest_first = sorted(alerts, key=lambda alert: alert['id'], reverse=True)
+    for filters in ({}, {'severity': 'High'}, {'source_ip': '10.0.0.1', 'threat_type': 'Port Scan'}):
+        matching = [alert for alert in newest_first
+                    if all(alert[field] == value for field, value in filters.items())]
+        for offset in (0, 7, len(matching) - 3):
+            page, total = database.query_alerts(limit=10, offset=offset, **filters)
+            assert total == len(matching)
+            assert ids(page) == ids(matching[offset:offset + 10])
+
+        page, total = database.query_alerts(limit=10, before_id=60, **filters)
+        assert total == len(matching)
+        assert ids(page) == ids([alert for alert in matching if alert['id'] < 60][:10])
+
+
+def test_query_time_range_orders_by_epoch(filled):
+    database, alerts = filled
+    start, end = BASE + 10, BASE + 80
+    matching = sorted((alert for alert in alerts if start <= alert['epoch'] <= end),
+                      key=lambda alert: (alert['epoch'], alert['id']), reverse=True)
+    page, total = database.query_time_range(start, end, limit=25, offset=5)
+    assert total == len(matching)
+    assert ids(page) == ids(matching[5:30])
+
+    page, total = database.query_time_range(start, end, limit=500, severity='Low')
+    assert ids(page) == ids([alert for alert in matching if alert['severity'] == 'Low'])
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000])
+def test_iter_alerts_chunks_and_before_id(filled, chunk_size):
+    database, alerts = filled
+    newest_first = ids(sorted(alerts, key=lambda alert: alert['id'], reverse=True))
+    assert ids(database.iter_alerts(chunk_size=chunk_size)) == newest_first
+    assert ids(database.iter_alerts(chunk_size=chunk_size, before_id=50)) == [i for i in newest_first if i < 50]
+
+    selected = ids(database.iter_alerts(start_epoch=BASE + 20, end_epoch=BASE + 60, chunk_size=chunk_size,
+                                        severity='Medium'))
+    assert selected == [alert['id'] for alert in sorted(alerts, key=lambda alert: alert['id'], reverse=True)
+                        if BASE + 20 <= alert['epoch'] <= BASE + 60 and alert['severity'] == 'Medium']
+
+
+def test_recent_alerts_oldest_first(filled):
+    database, alerts = filled
+    assert ids(database.recent_alerts(5)) == [116, 117, 118, 119, 120]
+
+
+def test_purge_keeps_newest_rows(filled):
+    database, alerts = filled
+    database.max_rows = 30
+    database.retention_days = 0
+    connection = database._connect()
+    database._purge(connection)
+    connection.close()
+    assert ids(database.recent_alerts(1000)) == list(range(91, 121))
+
+
+def test_purge_applies_retention(database):
+    database.add_alert(make_alert(1, time.time() - 3 * 86400))
+    database.add_alert(make_alert(2, BASE))
+    database.flush()
+    database.retention_days = 2
+    connection = database._connect()
+    database._purge(connection)
+    connection.close()
+    assert ids(database.recent_alerts(10)) == [2]
+
+
+def test_full_queue_drops_writes(tmp_path):
+    database = AlertDatabase(str(tmp_path / 'alerts.db'), max_pending=3)
+    results = [database.add_alert(make_alert(i, BASE + i)) for i in range(1, 6)]
+    assert results == [True, True, True, False, False]
+    assert database.dropped == 2
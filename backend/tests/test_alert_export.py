@@ -0,0 +1,65 @@
+"""Streaming CSV export against csv of the whole list, plain and gzipped"""
+
+import csv
+import gzip
+from io import StringIO
+
+import pytest
+
+from alert_export import CSV_HEADER, csv_chunks, gzip_chunks
+
+
+def make_alerts(count):
+    return [{
+        'id': i,
+        'timestamp': f'2024-01-01T00:00:{i % 60:02d}',
+        'source_ip': f'10.0.0.{i % 250}',
+        'destination_ip': '192.168.1.10',
+        'threat_type': 'SQL Injection',
+        'severity': 'High',
+        'status': 'Active',
+        # Quotes, commas, newlines and non-ASCII must survive the round trip
+        'description': f'payload "\' OR 1=1", line\nbreak é {i}',
+        'port': 80,
+        'protocol': 'TCP'
+    } for i in range(count)]
+
+
+def parse(text):
+    return list(csv.reader(StringIO(text)))
+
+
+@pytest.mark.parametrize('count,chunk_rows', [(0, 500), (1, 500), (1000, 500), (1234, 7)])
+def test_chunks_concatenate_to_full_csv(count, chunk_rows):
+    alerts = make_alerts(count)
+    chunks = list(csv_chunks(iter(alerts), chunk_rows=chunk_rows))
+    rows = parse(''.join(chunks))
+    assert rows[0] == CSV_HEADER
+    assert rows[1:] == [[str(alert['id']), alert['timestamp'], alert['source_ip'], alert['destination_ip'],
+                         alert['threat_type'], alert['severity'], alert['status'], alert['description'],
+                         str(alert['port']), alert['protocol']] for alert in alerts]
+    # One chunk per chunk_rows rows, plus the remainder
+    assert len(chunks) == count // chunk_rows + 1
+
+
+def test_consumes_alerts_lazily():
+    consumed = []
+
+    def alerts():
+        for alert in make_alerts(100):
+            consumed.append(alert['id'])
+            yield alert
+
+    stream = csv_chunks(alerts(), chunk_rows=10)
+    next(stream)
+    assert consumed == list(range(10))
+
+
+def test_gzip_round_trip():
+    text_chunks = list(csv_chunks(make_alerts(3000), chunk_rows=100))
+    compressed = b''.join(gzip_chunks(iter(text_chunks)))
+    assert gzip.decompress(compressed).decode('utf-8') == ''.join(text_chunks)
+
+
+def test_gzip_empty_stream():
+    assert gzip.decompress(b''.join(gzip_chunks(iter([])))) == b''
@@ -0,0 +1,106 @@
+"""AlertStore eviction and index consistency against a plain list of the newest alerts"""
+
+import random
+
+import pytest
+
+from alert_store import INDEXED_FIELDS, AlertStore, parse_timestamp
+
+SEVERITIES = ['Low', 'Medium', 'High', 'Critical']
+THREATS = ['Port Scan', 'DDoS Attack', 'SQL Injection']
+
+
+def make_alert(rng, epoch):
+    return {
+        'timestamp': epoch,
+        'severity': rng.choice(SEVERITIES),
+        'source_ip': f'10.0.0.{rng.randint(1, 6)}',
+        'threat_type': rng.choice(THREATS),
+        'status': 'Active'
+    }
+
+
+def fill(store, rng, count, late_every=7):
+    """Add alerts in time order, with every late_every-th one arriving late"""
+    added = []
+    for i in range(count):
+        epoch = 1_700_000_000 + i * 2.0
+        if late_every and i % late_every == 3:
+            epoch -= rng.uniform(0, 40)
+        added.append(store.add(make_alert(rng, epoch)))
+    return added
+
+
+def check_consistency(store, expected):
+    """expected: alerts the store should hold, oldest first"""
+    newest_first = expected[::-1]
+    assert len(store) == len(expected)
+    assert store.recent(limit=None) == newest_first
+    assert store.oldest_id() == (expected[0]['id'] if expected else None)
+    assert store.oldest_epoch() == (min(alert['epoch'] for alert in expected) if expected else None)
+    for alert in expected:
+        assert store.get(alert['id']) is alert
+    for name, field in INDEXED_FIELDS.items():
+        for value in {alert[field] for alert in expected} | {'missing'}:
+            matching = [alert for alert in newest_first if alert[field] == value]
+            page, total = store.query(limit=3, offset=1, **{name: value})
+            assert total == len(matching)
+            assert page == matching[1:4]
+        # No evicted ids linger in the indexes
+        assert sum(len(ids) for ids in store._indexes[name].values()) == len(expected)
+    assert len(store._time_index) - store._time_start == len(expected)
+
+
+@pytest.mark.parametrize('capacity', [1, 5, 64])
+def test_eviction_keeps_indexes_consistent(capacity):
+    rng = random.Random(capacity)
+    store = AlertStore(capacity=capacity)
+    added = []
+    for batch in (capacity - 1, 1, 3 * capacity + 5, 17):
+        added += fill(store, rng, batch)
+        check_consistency(store, added[-capacity:])
+    assert store.is_full()
+    assert [alert['id'] for alert in added] == list(range(1, len(added) + 1))
+
+
+def test_time_range_pages_match_a_sorted_scan():
+    rng = random.Random(11)
+    store = AlertStore(capacity=50)
+    added = fill(store, rng, 180)
+    held = added[-50:]
+    by_time = sorted(held, key=lambda alert: (alert['epoch'], alert['id']), reverse=True)
+    for _ in range(40):
+        start = rng.uniform(held[0]['epoch'] - 50, held[-1]['epoch'])
+        end = start + rng.uniform(0, 120)
+        matching = [alert for alert in by_time if start <= alert['epoch'] <= end]
+        offset = rng.randint(0, 10)
+        page, total = store.in_time_range(start, end, offset=offset, limit=7)
+        assert total == len(matching)
+        assert page == matching[offset:offset + 7]
+    page, total = store.in_time_range(0, float('inf'), limit=None)
+    assert page == by_time and total == 50
+
+
+def test_update_restore_and_filters():
+    store = AlertStore(capacity=3)
+    alert = store.add({'timestamp': '2024-01-01T00:00:00Z', 'severity': 'High',
+                       'source_ip': '10.0.0.1', 'threat_type': 'Port Scan'})
+    assert store.update(alert['id'], status='Blocked')['status'] == 'Blocked'
+    assert store.update(999, status='Blocked') is None
+    store.restore({'id': 40, 'timestamp': 1_700_000_000, 'severity': 'Low',
+                   'source_ip': '10.0.0.2', 'threat_type': 'DDoS Attack'})
+    assert store.add({'severity': 'Low'})['id'] == 41
+    assert store.query(limit=None, severity='Low')[1] == 2
+    with pytest.raises(ValueError):
+        store.query(severity='Low', source_ip='10.0.0.2')
+    with pytest.raises(ValueError):
+        store.query(status='Blocked')
+
+
+def test_parse_timestamp():
+    assert parse_timestamp('2024-01-01T00:00:00Z') == 1704067200.0
+    assert parse_timestamp('2024-01-01T01:00:00+01:00') == 1704067200.0
+    assert parse_timestamp(1704067200000) == 1704067200.0
+    assert parse_timestamp('1704067200') == 1704067200.0
+    with pytest.raises(ValueError):
+        parse_timestamp('yesterday')
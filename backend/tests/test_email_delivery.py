@@ -0,0 +1,248 @@
+"""EmailDeliveryQueue ordering and retries, SMTPSession reuse and reconnects, EmailService digests"""
+
+import smtplib
+import threading
+import time
+
+import pytest
+
+import email_delivery
+from email_delivery import EmailDeliveryQueue, SMTPSession
+
+
+class FakeSMTP:
+    """Stands in for smtplib.SMTP; fail_next makes the next sends raise"""
+    instances = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.fail_next = []
+        self.closed = False
+        FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def send_message(self, message):
+        if self.fail_next:
+            raise self.fail_next.pop(0)
+        self.sent.append(message)
+
+    def quit(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_smtp(monkeypatch):
+    FakeSMTP.instances = []
+    monkeypatch.setattr(email_delivery.smtplib, 'SMTP', FakeSMTP)
+    return FakeSMTP
+
+
+def make_session(**options):
+    return SMTPSession('smtp.example.com', 587, 'user', 'secret', use_ssl=False, use_tls=True, **options)
+
+
+def test_session_is_reused(fake_smtp):
+    session = make_session()
+    for i in range(5):
+        session.send(f'message {i}')
+    assert session.connects == 1
+    assert fake_smtp.instances[0].sent == [f'message {i}' for i in range(5)]
+
+
+def test_session_reconnects_once_after_disconnect(fake_smtp):
+    session = make_session()
+    session.send('first')
+    fake_smtp.instances[0].fail_next = [smtplib.SMTPServerDisconnected('gone')]
+    session.send('second')
+    assert session.connects == 2
+    assert fake_smtp.instances[0].closed
+    assert fake_smtp.instances[1].sent == ['second']
+
+
+def test_session_closed_after_unknown_error(fake_smtp):
+    session = make_session()
+    session.send('first')
+    fake_smtp.instances[0].fail_next = [smtplib.SMTPResponseException(451, b'try later')]
+    with pytest.raises(smtplib.SMTPResponseException):
+        session.send('second')
+    assert fake_smtp.instances[0].closed
+    session.send('third')
+    assert fake_smtp.instances[1].sent == ['third']
+
+
+def test_session_closes_when_idle(fake_smtp):
+    session = make_session(idle_timeout=0.0)
+    session.send('first')
+    session.close_if_idle()
+    assert fake_smtp.instances[0].closed
+    session.send('second')
+    assert session.connects == 2
+
+
+class Recorder:
+    def __init__(self, failures=None):
+        self.sent = []
+        self.attempts = []
+        self.failures = dict(failures or {})
+
+    def __call__(self, message):
+        self.attempts.append(message)
+        if self.failures.get(message, 0):
+            self.failures[message] -= 1
+            raise OSError('connection refused')
+        self.sent.append(message)
+
+
+def test_queue_delivers_in_order_and_stops_after_draining():
+    recorder = Recorder()
+    delivery = EmailDeliveryQueue(recorder, idle_interval=0.01)
+    delivery.start()
+    for i in range(20):
+        assert delivery.submit(i, f'alert {i}')
+    delivery.stop()
+    assert recorder.sent == list(range(20))
+    stats = delivery.get_stats()
+    assert (stats['queued'], stats['sent'], stats['failed'], stats['queue_depth']) == (20, 20, 0, 0)
+    assert not stats['running']
+
+
+def test_retries_with_backoff_then_gives_up():
+    recorder = Recorder(failures={'flaky': 2, 'broken': 10})
+    delivery = EmailDeliveryQueue(recorder, max_retries=3, retry_backoff=0.01, idle_interval=0.01)
+    delivery.start()
+    delivery.submit('flaky')
+    delivery.submit('broken')
+    delivery.submit('fine')
+    for _ in range(200):
+        stats = delivery.get_stats()
+        if stats['sent'] + stats['failed'] == 3:
+            break
+        time.sleep(0.01)
+    delivery.stop()
+
+    assert sorted(recorder.sent) == ['fine', 'flaky']
+    # A failed message does not hold up the ones behind it
+    assert recorder.sent.index('fine') < recorder.sent.index('flaky')
+    assert recorder.attempts.count('flaky') == 3
+    assert recorder.attempts.count('broken') == 4      # first attempt + max_retries
+    stats = delivery.get_stats()
+    assert (stats['sent'], stats['failed'], stats['retried']) == (2, 1, 5)
+
+
+def test_full_queue_rejects():
+    delivery = EmailDeliveryQueue(Recorder(), max_size=2)
+    assert [delivery.submit(i) for i in range(4)] == [True, True, False, False]
+    assert delivery.get_stats()['rejected'] == 2
+    assert delivery.depth() == 2
+
+
+def test_on_idle_called_while_nothing_to_send():
+    idle = threading.Event()
+    delivery = EmailDeliveryQueue(Recorder(), on_idle=idle.set, idle_interval=0.01)
+    delivery.start()
+    try:
+        assert idle.wait(2)
+    finally:
+        delivery.stop()
+
+
+class FakeDeliveryQueue:
+    """Collects the messages EmailService hands to the delivery worker"""
+
+    def __init__(self):
+        self.messages = []
+
+    def start(self):
+        pass
+
+    def submit(self, message, description=''):
+        self.messages.append(message)
+        return True
+
+    def depth(self):
+        return len(self.messages)
+
+    def get_stats(self):
+        return {'queue_depth': len(self.messages)}
+
+
+@pytest.fixture
+def digest_service(monkeypatch):
+    import email_service
+    monkeypatch.setattr(email_service, 'GMAIL_APP_PASSWORD', 'secret')
+    service = email_service.EmailService()
+    service.enabled = True
+    service.service = 'gmail'
+    service.delivery_queue = FakeDeliveryQueue()
+    service.digest_enabled = True
+    service.digest_interval = 60
+    service.digest_max_alerts = 5
+    service.immediate_severities = {'Critical'}
+    yield service
+    if service._digest_timer:
+        service._digest_timer.cancel()
+
+
+def digest_alert(number, severity='High'):
+    return {'threat_type': 'Port Scan', 'severity': severity, 'source_ip': f'10.0.0.{number}'}
+
+
+def test_digest_accumulates_until_flushed(digest_service):
+    for number in range(3):
+        result = digest_service.send_alert_email(digest_alert(number))
+        assert result['digest_pending'] == number + 1
+    assert digest_service.delivery_queue.messages == []
+    assert digest_service.get_stats()['digest_pending'] == 3
+
+    digest_service.flush_digest()
+    [message] = digest_service.delivery_queue.messages
+    assert message['Subject'] == '[IDS Alert] Digest: 3 Threats Detected'
+    text = message.get_payload()[0].get_payload(decode=True).decode()
+    assert all(f'10.0.0.{number}' in text for number in range(3))
+    stats = digest_service.get_stats()
+    assert (stats['digest_pending'], stats['digests_sent']) == (0, 1)
+    # Nothing pending: no empty digest
+    assert digest_service.flush_digest()['digest_pending'] == 0
+    assert len(digest_service.delivery_queue.messages) == 1
+
+
+def test_digest_timer_flushes_the_window(digest_service):
+    digest_service.digest_interval = 0.05
+    digest_service.send_alert_email(digest_alert(1))
+    digest_service.send_alert_email(digest_alert(2))
+    for _ in range(200):
+        if digest_service.delivery_queue.messages:
+            break
+        time.sleep(0.01)
+    [message] = digest_service.delivery_queue.messages
+    assert message['Subject'].endswith('Digest: 2 Threats Detected')
+    assert digest_service._digest_timer is None
+
+    # The next alert opens a new window
+    digest_service.send_alert_email(digest_alert(3))
+    assert digest_service._digest_timer is not None
+
+
+def test_digest_sent_early_at_max_size(digest_service):
+    for number in range(4):
+        digest_service.send_alert_email(digest_alert(number))
+    assert digest_service.delivery_queue.messages == []
+    result = digest_service.send_alert_email(digest_alert(4))
+    assert result['status'] == 'queued'
+    [message] = digest_service.delivery_queue.messages
+    assert message['Subject'].endswith('Digest: 5 Threats Detected')
+    assert digest_service._digest == [] and digest_service._digest_timer is None
+
+
+def test_immediate_severity_bypasses_the_digest(digest_service):
+    digest_service.send_alert_email(digest_alert(1))
+    result = digest_service.send_alert_email(digest_alert(2, severity='Critical'))
+    assert 'digest_pending' not in result
+    [message] = digest_service.delivery_queue.messages
+    assert message['Subject'] == '[IDS Alert] Critical Threat Detected'
+    assert digest_service.get_stats()['digest_pending'] == 1
@@ -0,0 +1,116 @@
+"""Email template compilation, HTML escaping and alert/digest rendering"""
+
+import pytest
+
+from email_templates import (ALERT_HTML, DEFAULT_COLOR, SEVERITY_COLORS, Template, alert_fields, render_alert,
+                             render_digest, severity_summary)
+
+HOSTILE = '<script>alert("x")</script> & \'quoted\''
+ESCAPED = '&lt;script&gt;alert(&quot;x&quot;)&lt;/script&gt; &amp; &#x27;quoted&#x27;'
+
+
+def make_alert(**fields):
+    alert = {
+        'threat_type': 'SQL Injection',
+        'severity': 'High',
+        'status': 'Active',
+        'source_ip': '10.0.0.5',
+        'destination_ip': '192.168.1.10',
+        'port': 80,
+        'protocol': 'TCP',
+        'description': "Payload matched ' OR 1=1",
+        'timestamp': '2024-01-01T12:00:00'
+    }
+    alert.update(fields)
+    return alert
+
+
+def test_template_escapes_html_values_only():
+    html = Template('<p>{{value}}</p><div>{{value|raw}}</div>', html=True)
+    assert html.render({'value': HOSTILE}) == f'<p>{ESCAPED}</p><div>{HOSTILE}</div>'
+    text = Template('{{value}} / {{ value }}')
+    assert text.render({'value': HOSTILE}) == f'{HOSTILE} / {HOSTILE}'
+
+
+def test_template_leaves_css_braces_and_converts_values():
+    template = Template('.a { color: {{color|raw}}; } {{n}}{{n}}', html=True)
+    assert template.render({'color': '#fff', 'n': 7}) == '.a { color: #fff; } 77'
+    assert template.fields == {'color', 'n'}
+
+
+def test_template_missing_value():
+    with pytest.raises(KeyError):
+        Template('{{missing}}').render({})
+
+
+def test_alert_html_escapes_every_alert_field():
+    hostile = make_alert(**{field: HOSTILE for field in ('threat_type', 'status', 'source_ip', 'destination_ip',
+                                                         'port', 'protocol', 'description', 'timestamp')})
+    text, html = render_alert(hostile)
+    assert HOSTILE not in html
+    assert html.count(ESCAPED) == 8
+    # Plain text is not escaped
+    assert text.count(HOSTILE) == 8
+    assert ESCAPED not in text
+
+
+def test_severity_color_is_not_attacker_controlled():
+    _, html = render_alert(make_alert(severity='red; background: url(x)'))
+    assert 'red; background' not in html.split('<body>')[0]
+    assert DEFAULT_COLOR in html
+    _, html = render_alert(make_alert(severity='Critical'))
+    assert f'background-color: {SEVERITY_COLORS["Critical"]};' in html
+
+
+def test_plain_text_alert():
+    text, _ = render_alert(make_alert())
+    lines = text.strip().splitlines()
+    assert lines[0] == 'INTRUSION DETECTION SYSTEM ALERT'
+    for line in ('Threat Detected: SQL Injection', 'Severity: High', 'Occurrences: 1',
+                 'Source IP: 10.0.0.5', 'Destination IP: 192.168.1.10', 'Port: 80', 'Protocol: TCP',
+                 "Payload matched ' OR 1=1", 'Timestamp: 2024-01-01T12:00:00'):
+        assert line in lines
+
+
+def test_missing_fields_use_defaults():
+    values = alert_fields({})
+    assert values['threat_type'] == 'Unknown'
+    assert values['description'] == 'No description available'
+    assert values['color'] == DEFAULT_COLOR
+    assert values['timestamp']
+    assert ALERT_HTML.render(values)
+
+
+def test_aggregated_alert_occurrences():
+    values = alert_fields(make_alert(hit_count=12, first_seen='t0', last_seen='t1', aggregated=True))
+    assert values['occurrences'] == '12 (first seen t0, last seen t1)'
+
+
+def test_render_digest():
+    alerts = [make_alert(severity='High'), make_alert(severity='Low', description=HOSTILE),
+              make_alert(severity='High', source_ip='10.0.0.6')]
+    text, html = render_digest(alerts)
+
+    assert '3 threats detected (High: 2, Low: 1)' in text
+    assert text.count('  SQL Injection  ') == 3
+    assert '10.0.0.6 -> 192.168.1.10:80' in text
+    assert HOSTILE in text
+
+    # Rows are inserted unescaped ({{rows|raw}}), their fields escaped once
+    assert html.count('<tr>') == 4
+    assert HOSTILE not in html
+    assert ESCAPED in html
+    assert '&amp;lt;' not in html
+    assert '<h2>3 Threats Detected</h2>' in html
+    assert f'color: {SEVERITY_COLORS["Low"]};' in html
+
+
+def test_empty_digest():
+    text, html = render_digest([])
+    assert '0 threats detected ()' in text
+    assert html.count('<tr>') == 1
+
+
+def test_severity_summary_orders_by_count():
+    alerts = [{'severity': 'Low'}, {'severity': 'High'}, {'severity': 'High'}, {}]
+    assert severity_summary(alerts) == 'High: 2, Low: 1, Unknown: 1'
@@ -0,0 +1,88 @@
+"""ExpiryWheel against a dict of last-touch times"""
+
+import math
+import random
+
+import pytest
+
+from expiry_wheel import ExpiryWheel
+
+
+def due(last_touch, now, ttl, tick):
+    """Keys a wheel advanced to now must have expired: the deadline tick has been reached"""
+    return {key for key, touched in last_touch.items()
+            if math.floor((touched + ttl) / tick) + 1 <= math.floor(now / tick)}
+
+
+@pytest.mark.parametrize('ttl,tick', [(10, 1.0), (5, 0.5), (3, 2.0), (60, 1.0)])
+def test_matches_last_touch_model(ttl, tick):
+    rng = random.Random(ttl * 100 + int(tick * 10))
+    now = 1000.0
+    wheel = ExpiryWheel(ttl, tick=tick, clock=lambda: now)
+    last_touch = {}
+
+    for _ in range(3000):
+        action = rng.random()
+        if action < 0.6:
+            key = f'10.0.0.{rng.randint(0, 40)}'
+            wheel.touch(key, now)
+            last_touch[key] = now
+        elif action < 0.65:
+            key = f'10.0.0.{rng.randint(0, 40)}'
+            wheel.discard(key)
+            last_touch.pop(key, None)
+        else:
+            # Mostly small steps, sometimes past a whole rotation or a long idle gap
+            now += rng.choice([0.0, 0.1, 0.3, tick, ttl, ttl + 3 * tick, 5 * ttl])
+            expected = due(last_touch, now, ttl, tick)
+            assert set(wheel.advance(now)) == expected
+            for key in expected:
+                del last_touch[key]
+        assert set(wheel.deadlines) == set(last_touch)
+        assert len(wheel) == len(last_touch)
+
+
+def test_expires_between_ttl_and_ttl_plus_tick():
+    now = 0.0
+    wheel = ExpiryWheel(10, tick=1.0, clock=lambda: now)
+    wheel.touch('a', 0.4)
+    assert wheel.advance(10.0) == []
+    assert 'a' in wheel
+    assert wheel.advance(11.0) == ['a']
+    assert 'a' not in wheel
+    assert wheel.advance(50.0) == []
+
+
+def test_touch_postpones_expiry():
+    wheel = ExpiryWheel(5, tick=1.0, clock=lambda: 0.0)
+    wheel.touch('a', 0.0)
+    wheel.touch('a', 4.0)
+    assert wheel.advance(7.0) == []
+    assert wheel.advance(10.0) == ['a']
+
+
+def test_each_key_expires_once():
+    wheel = ExpiryWheel(2, tick=1.0, clock=lambda: 0.0)
+    for t in (0.0, 0.2, 0.5, 0.9):
+        wheel.touch('a', t)
+    assert wheel.advance(100.0) == ['a']
+    assert wheel.advance(200.0) == []
+
+
+def test_set_clock_reschedules_keys():
+    wheel = ExpiryWheel(10, tick=1.0, clock=lambda: 0.0)
+    wheel.touch('a', 0.0)
+    wheel.touch('b', 0.0)
+    capture_time = 1_700_000_000.0
+    wheel.set_clock(lambda: capture_time)
+    assert set(wheel.deadlines) == {'a', 'b'}
+    assert wheel.advance(capture_time + 5) == []
+    assert set(wheel.advance(capture_time + 12)) == {'a', 'b'}
+
+
+def test_clear():
+    wheel = ExpiryWheel(10, clock=lambda: 0.0)
+    wheel.touch('a', 0.0)
+    wheel.clear()
+    assert len(wheel) == 0
+    assert wheel.advance(100.0) == []
@@ -0,0 +1,88 @@
+"""CompiledForest against scikit-learn's predict_proba/predict"""
+
+import numpy as np
+import pytest
+
+sklearn_ensemble = pytest.importorskip('sklearn.ensemble')
+
+from forest_compiler import CompiledForest, _float32_floor
+
+
+def fit_forest(X, y, **options):
+    options = dict(dict(n_estimators=12, max_depth=12, random_state=0), **options)
+    return sklearn_ensemble.RandomForestClassifier(**options).fit(X, y)
+
+
+def assert_matches(forest, X):
+    compiled = CompiledForest.from_sklearn(forest)
+    classes, proba = compiled.predict_with_proba(X)
+    assert np.array_equal(proba, forest.predict_proba(X))
+    assert np.array_equal(classes, forest.predict(X))
+    assert np.array_equal(compiled.predict(X), classes)
+
+
+@pytest.mark.parametrize('batch', [1, 7, 256, 1000])
+def test_continuous_features(batch):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, 11))
+    y = np.digitize(X[:, 0] + X[:, 1] * X[:, 2], [-1, 0, 1])
+    forest = fit_forest(X, y)
+    assert_matches(forest, rng.normal(size=(batch, 11)))
+    # Training rows sit exactly on either side of learned thresholds
+    assert_matches(forest, X[:batch])
+
+
+def test_integer_packet_features():
+    """Shaped like the analyzer's features: ports, sizes, flags and counts"""
+    rng = np.random.default_rng(1)
+    n = 3000
+    X = np.column_stack([
+        rng.choice([1, 6, 17], n), rng.integers(0, 65536, n), rng.integers(0, 65536, n),
+        rng.integers(42, 1515, n), rng.integers(0, 256, n), rng.integers(0, 3, n),
+        rng.integers(0, 2, n), rng.integers(0, 1460, n), rng.integers(0, 2, n),
+        rng.integers(0, 200, n), rng.integers(0, 40, n)
+    ]).astype(np.float32)
+    labels = np.array(['normal', 'port_scan', 'ddos', 'brute_force'])
+    y = labels[(X[:, 10] > 10).astype(int) + 2 * (X[:, 9] > 100)]
+    forest = fit_forest(X, y, n_estimators=20, max_depth=None)
+    assert_matches(forest, X)
+    assert_matches(forest, X[:1])
+
+
+def test_leaf_only_and_binary_trees():
+    X = np.arange(20, dtype=np.float64).reshape(-1, 1)
+    # One class only: every tree is a single leaf
+    assert_matches(fit_forest(X, np.zeros(20, dtype=int)), X)
+    assert_matches(fit_forest(X, (X[:, 0] > 9.5).astype(int), max_depth=1), X + 0.25)
+
+
+def test_float32_floor_matches_float64_comparison():
+    rng = np.random.default_rng(2)
+    thresholds = np.concatenate([rng.normal(size=1000) * 10.0 ** rng.integers(-3, 6, 1000),
+                                 [0.5, 1e-40, -0.0, 65535.5]])
+    floored = _float32_floor(thresholds)
+    assert floored.dtype == np.float32
+    assert np.all(floored.astype(np.float64) <= thresholds)
+    # Values around each threshold: the float32 and float64 comparisons agree
+    for x in (floored, np.nextafter(floored, np.float32(np.inf)), thresholds.astype(np.float32)):
+        assert np.array_equal(x <= floored, x.astype(np.float64) <= thresholds)
+
+
+def test_rejects_bad_input():
+    rng = np.random.default_rng(3)
+    X = rng.normal(size=(200, 4))
+    compiled = CompiledForest.from_sklearn(fit_forest(X, X[:, 0] > 0))
+    with pytest.raises(ValueError):
+        compiled.predict(X[:, :3])
+    X[0, 1] = np.nan
+    with pytest.raises(ValueError):
+        compiled.predict(X)
+
+
+def test_rejects_unfitted_and_multi_output():
+    with pytest.raises(ValueError):
+        CompiledForest.from_sklearn(sklearn_ensemble.RandomForestClassifier())
+    X = np.random.default_rng(4).normal(size=(100, 3))
+    multi = fit_forest(X, np.column_stack([X[:, 0] > 0, X[:, 1] > 0]))
+    with pytest.raises(ValueError):
+        CompiledForest.from_sklearn(multi)
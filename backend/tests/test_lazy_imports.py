@@ -0,0 +1,23 @@
+"""Importing the backend must not pull in Scapy or TensorFlow (see startup_benchmark)"""
+
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r'''
+import json, sys
+import packet_sniffer_ml, packet_sniffer, app
+print('LOADED', json.dumps(sorted(name for name in sys.modules if name.split('.')[0] in ('scapy', 'tensorflow', 'keras'))))
+'''
+
+
+def test_backend_imports_leave_scapy_and_tensorflow_unloaded():
+    env = dict(os.environ, ALERT_DB_PATH='')  # No database for a throwaway interpreter
+    result = subprocess.run([sys.executable, '-c', _CHILD], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, timeout=120, check=True)
+    [line] = [line for line in result.stdout.splitlines() if line.startswith('LOADED ')]
+    loaded = json.loads(line[len('LOADED '):])
+    assert loaded == []
@@ -0,0 +1,50 @@
+"""MicroBatchInference batching, result fan-out and shutdown"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from ml_inference import MicroBatchInference
+
+
+def test_every_submission_gets_its_result_in_order():
+    results = []
+    batcher = MicroBatchInference(lambda matrix: list(matrix[:, 0] * 2), lambda context, result: results.append((context, result)),
+                                  batch_size=8, max_wait_ms=1)
+    batcher.start()
+    for i in range(50):
+        batcher.submit(np.array([i, 0.0]), i)
+    batcher.stop()
+    assert results == [(i, 2 * i) for i in range(50)]
+    stats = batcher.get_stats()
+    assert stats['batches'] >= 7
+    assert stats['avg_batch_size'] <= 8
+
+
+def test_stop_keeps_a_worker_that_did_not_exit():
+    release = threading.Event()
+    scored = []
+
+    def slow_predict(matrix):
+        release.wait(5)
+        return [None] * len(matrix)
+
+    batcher = MicroBatchInference(slow_predict, lambda context, result: scored.append(context), max_wait_ms=0)
+    batcher.start()
+    batcher.submit(np.zeros(2), 'first')
+    time.sleep(0.05)
+    batcher.stop(timeout=0.05)
+    worker = batcher._worker
+    assert worker is not None and worker.is_alive()
+    with pytest.raises(RuntimeError):
+        batcher.start(timeout=0.05)  # Still scoring 'first'
+
+    release.set()
+    batcher.start()  # Waits for the old worker before starting a new one
+    assert not worker.is_alive()
+    batcher.submit(np.zeros(2), 'second')
+    batcher.stop()
+    assert batcher._worker is None
+    assert scored == ['first', 'second']
@@ -0,0 +1,162 @@
+"""
+PacketAnalyzerML micro-batching: tracker feature lag accounting and alert
+delivery outside the state lock; cascade and pre-filter model routing
+"""
+
+import threading
+
+import numpy as np
+import pytest
+
+from fast_parser import PROTO_TCP, TCP_SYN, PacketRecord
+
+
+def tcp_record(src_ip, dst_port, flags=TCP_SYN, payload=b''):
+    return PacketRecord(src_ip, '192.168.1.10', 4, PROTO_TCP, 40000, dst_port, flags, 60 + len(payload), payload, None)
+
+
+def test_feature_lag_counts_queued_packets_of_the_source(make_ml_analyzer):
+    analyzer = make_ml_analyzer()
+    for port in (80, 81, 82):
+        analyzer.analyze_record(tcp_record('10.0.0.1', port))
+    analyzer.analyze_record(tcp_record('10.0.0.2', 80))
+    stats = analyzer.get_ml_stats()
+    assert stats['stale_features'] == 2
+    assert stats['max_feature_lag'] == 2
+    # Features saw none of the queued packets' tracker updates
+    assert [row[9] for row in analyzer.inference_batcher.submitted] == [0, 0, 0, 0]
+
+    analyzer.inference_batcher.flush()
+    assert analyzer._in_flight == {}
+    analyzer.analyze_record(tcp_record('10.0.0.1', 83))
+    assert analyzer.inference_batcher.submitted[-1][9] == 3
+    assert analyzer.get_ml_stats()['stale_features'] == 2
+
+
+def test_feature_lag_of_a_batch_includes_earlier_packets_in_it(make_ml_analyzer):
+    analyzer = make_ml_analyzer()
+    analyzer.analyze_record(tcp_record('10.0.0.1', 22))
+    analyzer.analyze_records([tcp_record('10.0.0.1', port) for port in (80, 81, 82)])
+    assert analyzer.get_ml_stats()['max_feature_lag'] == 3
+    assert analyzer._in_flight == {'10.0.0.1': 4}
+    analyzer.inference_batcher.flush()
+    assert analyzer._in_flight == {}
+    assert analyzer.trackers.count('rate', '10.0.0.1') == 4
+
+
+def test_alert_callback_runs_without_the_state_lock(make_ml_analyzer):
+    lock_free = []
+
+    def callback(alert):
+        # Another thread (the capture thread) must be able to take the lock
+        def probe():
+            acquired = analyzer._state_lock.acquire(timeout=1)
+            if acquired:
+                analyzer._state_lock.release()
+            lock_free.append(acquired)
+
+        thread = threading.Thread(target=probe)
+        thread.start()
+        thread.join()
+
+    analyzer = make_ml_analyzer(immediate=True, alert_callback=callback)
+    analyzer.PORT_SCAN_THRESHOLD = 3
+    for port in (445, 3389, 8080):  # Suspicious ports, then a port scan
+        analyzer.analyze_record(tcp_record('10.0.0.9', port, flags=0x18, payload=b'UNION SELECT'))
+    assert len(lock_free) >= 4
+    assert all(lock_free)
+
+
+class FakeForest:
+    """predict_proba gives each row the confidence stored in its packet size column / 1000"""
+    classes_ = np.array([0, 3])
+
+    def __init__(self):
+        self.rows = []
+
+    def predict_proba(self, features):
+        self.rows.extend(features.tolist())
+        confidence = features[:, 3] / 1000
+        return np.column_stack([1 - confidence, confidence])
+
+
+class FakeDNN:
+    """Always answers class 6 with 0.70 confidence"""
+
+    def __init__(self):
+        self.rows = []
+
+    def predict(self, features, verbose=0):
+        self.rows.extend(features.tolist())
+        proba = np.zeros((len(features), 11))
+        proba[:, 6] = 0.70
+        proba[:, 0] = 0.30
+        return proba
+
+
+def feature_rows(*rows):
+    """(size, dst_port, payload_size, rate) tuples as 11-feature rows of TCP ACK packets"""
+    return np.array([[PROTO_TCP, 40000, dst_port, size, 0x10, 0 if dst_port < 1024 else 1,
+                      0, payload, 1 if payload else 0, rate, 1]
+                     for size, dst_port, payload, rate in rows], dtype=np.float64)
+
+
+def scoring_analyzer(cascade=False, prefilter=False):
+    from packet_sniffer_ml import PacketAnalyzerML
+    analyzer = PacketAnalyzerML(alert_window=0, verdict_cache_size=0, ml_cascade=cascade, ml_prefilter=prefilter)
+    analyzer.random_forest_model = FakeForest()
+    analyzer.dnn_model = FakeDNN()
+    analyzer.scaler = analyzer.label_encoder = analyzer.compiled_forest = None
+    return analyzer
+
+
+def test_cascade_and_prefilter_off_by_default():
+    from packet_sniffer_ml import PacketAnalyzerML
+    analyzer = PacketAnalyzerML(alert_window=0, verdict_cache_size=0)
+    assert analyzer.ML_CASCADE is False
+    assert analyzer.ML_PREFILTER is False
+
+
+def test_cascade_runs_dnn_only_below_the_forest_threshold():
+    analyzer = scoring_analyzer(cascade=True)
+    assert analyzer.CASCADE_HIGH == 0.90
+    features = feature_rows((950, 80, 10, 50), (900, 80, 10, 50), (899, 80, 10, 50), (500, 80, 10, 50))
+    results = analyzer._predict_threat_ml_batch(features)
+
+    # Forest confidences 0.95 and 0.90 are final; 0.899 and 0.5 go to the DNN
+    assert [row[3] for row in analyzer.dnn_model.rows] == [899, 500]
+    assert [result['model_used'] for result in results] == ['Random Forest', 'Random Forest', 'Random Forest', 'DNN']
+    assert results[3]['threat_type'] == 'Malware' and results[3]['confidence'] == pytest.approx(0.70)
+    stats = analyzer.get_ml_stats()
+    assert (stats['rf_only'], stats['rf_dnn'], stats['dnn_calls']) == (2, 2, 1)
+
+
+def test_without_cascade_dnn_scores_every_row():
+    analyzer = scoring_analyzer()
+    features = feature_rows((950, 80, 10, 50), (500, 80, 10, 50))
+    results = analyzer._predict_threat_ml_batch(features)
+    assert len(analyzer.dnn_model.rows) == 2
+    assert [result['model_used'] for result in results] == ['Random Forest', 'DNN']
+    assert analyzer.get_ml_stats()['rf_dnn'] == 2
+
+
+def test_prefilter_bypasses_the_models_for_benign_rows():
+    benign = (950, 8080, 0, 1)   # No payload, ordinary port, quiet source
+    features = feature_rows(benign, (950, 8080, 10, 1), (950, 8080, 0, 50), benign)
+
+    analyzer = scoring_analyzer(prefilter=True)
+    results = analyzer._predict_threat_ml_batch(features)
+    assert results[0] is None and results[3] is None
+    assert results[1]['threat_type'] == results[2]['threat_type'] == 'SQL Injection'
+    assert len(analyzer.random_forest_model.rows) == len(analyzer.dnn_model.rows) == 2
+    assert analyzer.get_ml_stats()['prefiltered'] == 2
+
+    # All-benign batches never reach the models
+    assert analyzer._predict_threat_ml_batch(feature_rows(benign)) == [None]
+    assert len(analyzer.random_forest_model.rows) == 2
+
+    # Without the prefilter the same benign rows are scored (and flagged)
+    analyzer = scoring_analyzer()
+    results = analyzer._predict_threat_ml_batch(features)
+    assert all(result is not None for result in results)
+    assert len(analyzer.random_forest_model.rows) == 4
@@ -0,0 +1,89 @@
+"""SignatureScanner against naive per-signature substring matching"""
+
+import random
+
+import pytest
+
+import payload_scanner
+from payload_scanner import SignatureScanner, categorize_signature, load_signatures
+
+BUILT_IN = [b'<script', b'javascript:', b'SELECT * FROM', b'UNION SELECT', b'DROP TABLE', b'../../',
+            b'cmd.exe', b'/bin/bash', b'eval(', b'base64_decode', b'exec(', b'system(']
+
+
+def naive_scan(signatures, payload):
+    """Every signature contained in the payload, first occurrence of each pattern wins"""
+    lowered = payload.lower()
+    seen = set()
+    matches = []
+    for pattern, category in signatures:
+        key = pattern.lower()
+        if key and key not in seen:
+            seen.add(key)
+            if key in lowered:
+                matches.append((pattern, category))
+    return matches
+
+
+@pytest.fixture(params=['native', 'trie'])
+def engine(request, monkeypatch):
+    if request.param == 'native':
+        if not payload_scanner.AHOCORASICK_AVAILABLE:
+            pytest.skip('pyahocorasick is not installed')
+    else:
+        monkeypatch.setattr(payload_scanner, 'AHOCORASICK_AVAILABLE', False)
+    return request.param
+
+
+def random_signatures(rng, count):
+    # Small alphabet with regex metacharacters: many overlaps and shared prefixes
+    alphabet = b'ab(.*|\\)[x'
+    signatures = [(bytes(rng.choice(alphabet) for _ in range(rng.randint(1, 5))), f'cat{i}') for i in range(count)]
+    signatures.append((b'AB', 'upper'))  # Same pattern as 'ab' case-insensitively
+    return signatures
+
+
+def test_built_in_patterns(engine):
+    signatures = [(pattern, categorize_signature(pattern)) for pattern in BUILT_IN]
+    scanner = SignatureScanner(signatures)
+    payload = b"GET /?q=1 union select password FROM users; <SCRIPT>eval(atob(x))</script> ../../etc"
+    assert scanner.scan(payload) == naive_scan(signatures, payload)
+    assert [category for _, category in scanner.scan(payload)] == ['XSS Attack', 'SQL Injection',
+                                                                   'Malicious Payload', 'Malicious Payload']
+    assert scanner.scan(b'') == []
+    assert scanner.scan(b'harmless') == []
+
+
+def test_matches_naive_scan_on_random_payloads(engine):
+    rng = random.Random(3)
+    for _ in range(30):
+        signatures = random_signatures(rng, rng.randint(1, 40))
+        scanner = SignatureScanner(signatures)
+        for _ in range(20):
+            payload = bytes(rng.choice(b'aAbB(.*|\\)[xyz') for _ in range(rng.randint(0, 60)))
+            assert scanner.scan(payload) == naive_scan(signatures, payload)
+
+
+def test_memoryview_and_binary_payloads(engine):
+    signatures = [(b'\x00\xff\x10', 'binary'), (b'\xff', 'byte')]
+    scanner = SignatureScanner(signatures)
+    payload = bytearray(b'\x01\x00\xFF\x10\x02')
+    assert scanner.scan(memoryview(payload)) == signatures
+
+
+def test_empty_scanner(engine):
+    scanner = SignatureScanner([])
+    assert len(scanner) == 0
+    assert scanner.scan(b'anything') == []
+
+
+def test_load_signatures(tmp_path):
+    rules = tmp_path / 'rules.txt'
+    rules.write_text('# comment\n\nSQL Injection\tor 1=1\nwget http\n Custom \t\\x00\\x01\\tshell\n', encoding='utf-8')
+    assert load_signatures(rules) == [
+        (b'or 1=1', 'SQL Injection'),
+        (b'wget http', 'Malicious Payload'),
+        (b'\x00\x01\tshell', 'Custom'),
+    ]
+    scanner = SignatureScanner.from_file(rules, [(b'<script', 'XSS Attack')])
+    assert scanner.scan(b'x OR 1=1 <Script>') == [(b'<script', 'XSS Attack'), (b'or 1=1', 'SQL Injection')]
@@ -0,0 +1,149 @@
+"""SharedFrameRing against a deque, with rings small enough to wrap constantly"""
+
+import multiprocessing
+import os
+import random
+import sys
+from collections import deque
+
+import pytest
+
+from shm_ring import SharedFrameRing
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def make_ring():
+    rings = []
+
+    def make(capacity):
+        ring = SharedFrameRing(capacity=capacity)
+        rings.append(ring)
+        return ring
+
+    yield make
+    for ring in rings:
+        ring.close()
+
+
+def record_size(frame):
+    return (16 + len(frame) + 7) & ~7
+
+
+@pytest.mark.parametrize('capacity', [64, 200, 1000, 4096])
+def test_matches_deque_model(make_ring, capacity):
+    rng = random.Random(capacity)
+    ring = make_ring(capacity)
+    assert ring.capacity == (capacity + 7) & ~7
+    model = deque()
+    written = dropped = read = 0
+
+    for i in range(5000):
+        if rng.random() < 0.6:
+            frame = bytes([i & 0xFF]) * rng.choice([0, 1, 7, 8, 9, 40, 60, 150])
+            linktype = rng.choice([1, 113, 276])
+            size = record_size(frame)
+            free = ring.capacity - ring.get_stats()['used_bytes']
+            room_before_end = ring.capacity - ring._get(0) % ring.capacity
+            if ring.put(frame, linktype, float(i)):
+                model.append((frame, linktype, float(i)))
+                written += 1
+            else:
+                dropped += 1
+                # Refused only if the record does not fit where it has to go
+                fits_in_place = size <= min(free, room_before_end)
+                fits_after_wrap = room_before_end + size <= free
+                assert not (fits_in_place or fits_after_wrap)
+        else:
+            limit = rng.choice([1, 3, 256])
+            batch = ring.get_batch(limit)
+            expected = [model.popleft() for _ in range(min(limit, len(model)))]
+            assert batch == expected
+            read += len(batch)
+
+        assert len(ring) == len(model)
+        stats = ring.get_stats()
+        assert (stats['written'], stats['read'], stats['dropped']) == (written, read, dropped)
+        assert 0 <= stats['used_bytes'] <= ring.capacity
+
+    assert ring.get_batch(10 ** 6) == list(model)
+    assert ring.get_stats()['used_bytes'] == 0
+
+
+def test_drops_when_full_and_recovers(make_ring):
+    ring = make_ring(128)
+    frame = b'x' * 16                               # 32-byte records
+    assert [ring.put(frame, 1) for _ in range(5)] == [True, True, True, True, False]
+    assert ring.get_stats()['dropped'] == 1
+    assert len(ring.get_batch(1)) == 1
+    assert ring.put(frame, 1)
+    assert len(ring.get_batch()) == 4
+
+
+def test_wraps_record_that_does_not_fit_before_the_end(make_ring):
+    ring = make_ring(128)
+    assert ring.put(b'a' * 40, 1)                   # 56 bytes
+    assert ring.put(b'b' * 40, 1)                   # 112
+    assert ring.get_batch() == [(b'a' * 40, 1, 0.0), (b'b' * 40, 1, 0.0)]
+    # 16 bytes left before the end: the next record wraps to offset 0
+    assert ring.put(b'c' * 40, 1, 2.5)
+    assert ring.get_stats()['used_bytes'] == 16 + 56
+    assert ring.get_batch() == [(b'c' * 40, 1, 2.5)]
+
+    # 8 bytes left before the end: too few for a marker the consumer could read
+    ring = make_ring(64)
+    assert ring.put(b'd' * 40, 1)
+    assert ring.get_batch() == [(b'd' * 40, 1, 0.0)]
+    assert ring.put(b'e' * 8, 1)
+    assert ring.get_batch() == [(b'e' * 8, 1, 0.0)]
+
+
+def test_rejects_frame_larger_than_ring(make_ring):
+    ring = make_ring(64)
+    assert not ring.put(b'x' * 64, 1)
+    assert ring.get_stats()['dropped'] == 1
+    assert ring.get_batch() == []
+
+
+def test_attach_by_name_shares_state(make_ring):
+    ring = make_ring(1024)
+    consumer = SharedFrameRing(name=ring.name)
+    try:
+        assert consumer.capacity == ring.capacity
+        ring.put(b'frame', 1, 1.5)
+        assert len(consumer) == 1
+        assert consumer.get_batch() == [(b'frame', 1, 1.5)]
+        assert len(ring) == 0
+    finally:
+        consumer.close()
+
+
+def _produce(name, count):
+    sys.path.insert(0, BACKEND_DIR)
+    from shm_ring import SharedFrameRing
+    ring = SharedFrameRing(name=name)
+    sent = 0
+    while sent < count:
+        frame = sent.to_bytes(4, 'little') * (1 + sent % 17)
+        if ring.put(frame, 1, float(sent)):
+            sent += 1
+    ring.close()
+
+
+def test_cross_process_order(make_ring):
+    ring = make_ring(512)
+    count = 3000
+    producer = multiprocessing.get_context('spawn').Process(target=_produce, args=(ring.name, count))
+    producer.start()
+    received = []
+    while len(received) < count:
+        received.extend(ring.get_batch())
+        assert producer.exitcode in (None, 0)
+    producer.join(timeout=10)
+
+    assert producer.exitcode == 0
+    for i, (frame, linktype, timestamp) in enumerate(received):
+        assert frame == i.to_bytes(4, 'little') * (1 + i % 17)
+        assert (linktype, timestamp) == (1, float(i))
+    assert ring.get_stats()['written'] == count
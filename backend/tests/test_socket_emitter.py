@@ -0,0 +1,171 @@
+"""SocketEmitter batching, stats coalescing and ack-based flow control"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import socket_emitter
+from socket_emitter import SocketEmitter
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []       # (event, payload, to, callback)
+
+    def emit(self, event, payload, to=None, callback=None):
+        self.emitted.append((event, payload, to, callback))
+
+    def batches(self, sid=None):
+        return [(payload, callback) for event, payload, to, callback in self.emitted
+                if event == 'alerts_batch' and (sid is None or to == sid)]
+
+    def stats_updates(self):
+        return [payload for event, payload, _, _ in self.emitted if event == 'stats_update']
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(socket_emitter, 'time', SimpleNamespace(monotonic=lambda: clock.now, sleep=time.sleep))
+    return clock
+
+
+@pytest.fixture
+def emitter(clock):
+    return SocketEmitter(FakeSocketIO(), flush_interval=0.25, stats_interval=1.0, max_batch=200,
+                         max_inflight=3, ack_timeout=10.0)
+
+
+def test_window_alerts_sent_as_one_batch_newest_first(emitter):
+    emitter.add_client('a')
+    emitter.add_client('b')
+    for i in range(5):
+        emitter.emit_alert({'id': i})
+    emitter.flush()
+
+    for sid in ('a', 'b'):
+        [(payload, _)] = emitter.socketio.batches(sid)
+        assert payload == {'alerts': [{'id': i} for i in range(4, -1, -1)], 'count': 5, 'skipped': 0}
+    # Nothing pending: no empty batch
+    emitter.flush()
+    assert len(emitter.socketio.batches()) == 2
+    assert emitter.get_stats()['batches'] == 1
+
+
+def test_busy_window_capped_at_max_batch(emitter):
+    emitter.add_client('a')
+    for i in range(450):
+        emitter.emit_alert({'id': i})
+    assert emitter.get_stats()['pending'] == 450
+    emitter.flush()
+
+    [(payload, _)] = emitter.socketio.batches('a')
+    # The newest 200 are sent, every alert is counted
+    assert [alert['id'] for alert in payload['alerts']] == list(range(449, 249, -1))
+    assert payload['count'] == 450
+    assert emitter.get_stats()['alerts'] == 450
+
+
+def test_stats_coalesced_to_latest_per_interval(emitter, clock):
+    for packets in (1, 2, 3):
+        emitter.emit_stats({'total_packets': packets})
+    emitter.flush()
+    assert emitter.socketio.stats_updates() == [{'total_packets': 3}]
+
+    emitter.emit_stats({'total_packets': 4})
+    clock.now += 0.5
+    emitter.flush()
+    assert len(emitter.socketio.stats_updates()) == 1
+    emitter.emit_stats({'total_packets': 5})
+    clock.now += 0.5
+    emitter.flush()
+    assert emitter.socketio.stats_updates() == [{'total_packets': 3}, {'total_packets': 5}]
+    # Sent snapshots are not repeated
+    clock.now += 5
+    emitter.flush()
+    assert len(emitter.socketio.stats_updates()) == 2
+
+
+def test_stats_snapshot_is_copied(emitter):
+    stats = {'total_packets': 1}
+    emitter.emit_stats(stats)
+    stats['total_packets'] = 99
+    emitter.flush()
+    assert emitter.socketio.stats_updates() == [{'total_packets': 1}]
+
+
+def send_batch(emitter, alerts=1):
+    for _ in range(alerts):
+        emitter.emit_alert({'id': 0})
+    emitter.flush()
+
+
+def test_unacknowledged_client_is_skipped_then_told_what_it_missed(emitter, clock):
+    emitter.add_client('slow')
+    emitter.add_client('fast')
+    for _ in range(3):
+        send_batch(emitter)
+        # Only the fast client acknowledges
+        emitter.socketio.batches('fast')[-1][1]()
+    assert len(emitter.socketio.batches('slow')) == 3
+    assert emitter.get_stats()['lagging_clients'] == 1
+
+    send_batch(emitter, alerts=4)
+    send_batch(emitter, alerts=2)
+    assert len(emitter.socketio.batches('slow')) == 3
+    assert len(emitter.socketio.batches('fast')) == 5
+    assert emitter.get_stats()['skipped'] == 6
+
+    # One ack frees a slot; the next batch reports the skipped alerts
+    emitter.socketio.batches('slow')[0][1]()
+    send_batch(emitter)
+    payload, _ = emitter.socketio.batches('slow')[-1]
+    assert payload['skipped'] == 6
+    send_batch(emitter)
+    assert len(emitter.socketio.batches('slow')) == 4
+
+
+def test_silent_client_probed_once_per_ack_timeout(emitter, clock):
+    emitter.add_client('silent')
+    for _ in range(3):
+        send_batch(emitter)
+    send_batch(emitter)
+    assert len(emitter.socketio.batches('silent')) == 3
+
+    clock.now += 10.0
+    send_batch(emitter)
+    assert len(emitter.socketio.batches('silent')) == 4
+    assert emitter.socketio.batches('silent')[-1][0]['skipped'] == 1
+    # The probe restarts the timeout
+    send_batch(emitter)
+    clock.now += 5.0
+    send_batch(emitter)
+    assert len(emitter.socketio.batches('silent')) == 4
+    clock.now += 5.0
+    send_batch(emitter)
+    assert len(emitter.socketio.batches('silent')) == 5
+
+
+def test_removed_client_and_late_ack(emitter):
+    emitter.add_client('a')
+    send_batch(emitter)
+    [(_, ack)] = emitter.socketio.batches('a')
+    emitter.remove_client('a')
+    ack()       # Ack arriving after disconnect is ignored
+    send_batch(emitter)
+    assert len(emitter.socketio.batches()) == 1
+    assert emitter.get_stats()['clients'] == 0
+
+
+def test_flush_thread_sends_batches():
+    socketio = FakeSocketIO()
+    emitter = SocketEmitter(socketio, flush_interval=0.01)
+    emitter.add_client('a')
+    emitter.start()
+    emitter.emit_alert({'id': 1})
+    for _ in range(200):
+        if socketio.batches():
+            break
+        time.sleep(0.01)
+    assert socketio.batches('a')[0][0]['alerts'] == [{'id': 1}]
@@ -0,0 +1,267 @@
+"""Exact and sketch tracker backends against plain per-source bookkeeping"""
+
+import math
+import random
+
+import pytest
+
+from source_trackers import COUNTER_KINDS, CountMinSketch, HeavyHitters, SourceState, _row_offsets, create_trackers
+
+TTL = 10
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_trackers('bloom', ttl=TTL)
+
+
+# ===== Exact backend =====
+
+def live(last, now):
+    """A counter updated at last is live on a 1 s wheel advanced to now"""
+    return math.floor(last + TTL) + 1 > math.floor(now)
+
+
+def test_exact_matches_model():
+    rng = random.Random(1)
+    clock = Clock()
+    trackers = create_trackers('exact', ttl=TTL, clock=clock)
+    # ip -> kind -> [value, last update]; 'ports' holds a set
+    model = {}
+
+    for _ in range(5000):
+        ip = f'10.0.0.{rng.randint(0, 15)}'
+        state = model.setdefault(ip, {})
+        action = rng.random()
+        if action < 0.45:
+            kind = rng.choice(COUNTER_KINDS)
+            value, last = state.get(kind, (0, None))
+            value = value + 1 if last is not None and live(last, clock.now) else 1
+            state[kind] = (value, clock.now)
+            assert trackers.increment(kind, ip) == value
+        elif action < 0.75:
+            port = rng.randint(1, 30)
+            ports, last = state.get('ports', (set(), None))
+            ports = set(ports) if last is not None and live(last, clock.now) else set()
+            ports.add(port)
+            state['ports'] = (ports, clock.now)
+            assert trackers.add_port(ip, port) == len(ports)
+        elif action < 0.8:
+            kind = rng.choice(COUNTER_KINDS + ('ports',))
+            if kind in state:
+                value, last = state[kind]
+                state[kind] = (set() if kind == 'ports' else 0, last)
+            trackers.reset(kind, ip)
+        else:
+            clock.now += rng.choice([0.0, 0.2, 0.7, 3.0, TTL])
+            trackers.expire()
+
+        for ip, state in model.items():
+            for kind in COUNTER_KINDS:
+                value, last = state.get(kind, (0, None))
+                expected = value if last is not None and live(last, clock.now) else 0
+                assert trackers.count(kind, ip) == expected
+            ports, last = state.get('ports', (set(), None))
+            expected = len(ports) if last is not None and live(last, clock.now) else 0
+            assert trackers.distinct_ports(ip) == expected
+
+
+def test_exact_drops_idle_sources():
+    clock = Clock()
+    trackers = create_trackers('exact', ttl=TTL, clock=clock)
+    trackers.increment('rate', '10.0.0.1')
+    trackers.add_port('10.0.0.2', 22)
+    clock.now += TTL - 5
+    trackers.increment('rate', '10.0.0.2')
+    clock.now += 6
+    trackers.expire()
+    assert trackers.get_stats()['sources'] == 1
+    assert trackers.count('rate', '10.0.0.1') == 0
+    # The port counter of 10.0.0.2 expired even though its record is kept
+    assert trackers.distinct_ports('10.0.0.2') == 0
+    assert trackers.count('rate', '10.0.0.2') == 1
+
+
+def test_exact_count_does_not_create_entries():
+    trackers = create_trackers('exact', ttl=TTL, clock=Clock())
+    assert trackers.count('syn', '10.0.0.1') == 0
+    assert trackers.distinct_ports('10.0.0.1') == 0
+    trackers.reset('syn', '10.0.0.1')
+    assert trackers.get_stats()['sources'] == 0
+
+
+def test_exact_top_talkers():
+    trackers = create_trackers('exact', ttl=TTL, clock=Clock())
+    for i, packets in enumerate([5, 50, 1, 20]):
+        for _ in range(packets):
+            trackers.increment('rate', f'10.0.0.{i}')
+    assert trackers.top_talkers(2) == [('10.0.0.1', 50), ('10.0.0.3', 20)]
+
+
+def test_exact_set_clock_keeps_live_counters():
+    clock = Clock()
+    trackers = create_trackers('exact', ttl=TTL, clock=clock)
+    trackers.increment('syn', '10.0.0.1')
+    trackers.add_port('10.0.0.1', 80)
+    capture = Clock(1_700_000_000.0)
+    trackers.set_clock(capture)
+    assert trackers.count('syn', '10.0.0.1') == 1
+    assert trackers.distinct_ports('10.0.0.1') == 1
+    capture.now += TTL + 2
+    trackers.expire()
+    assert trackers.count('syn', '10.0.0.1') == 0
+
+
+def test_source_state_has_slots_only():
+    trackers = create_trackers('exact', ttl=TTL, clock=Clock())
+    trackers.increment('rate', '10.0.0.1')
+    state = trackers._sources['10.0.0.1']
+    assert type(state) is SourceState
+    assert not hasattr(state, '__dict__')
+    with pytest.raises(AttributeError):
+        state.extra = 1
+
+
+def test_expired_fields_restart_while_the_source_is_kept():
+    clock = Clock()
+    trackers = create_trackers('exact', ttl=TTL, clock=clock)
+    ip = '10.0.0.1'
+    for port in (80, 81, 82):
+        trackers.increment('syn', ip)
+        trackers.add_port(ip, port)
+    state = trackers._sources[ip]
+    assert (state.syn, state.ports) == (3, {80, 81, 82})
+
+    # Rate updates keep the record alive after syn and ports expired
+    for _ in range(3):
+        clock.now += TTL / 2 + 1
+        trackers.increment('rate', ip)
+        trackers.expire()
+    assert trackers._sources[ip] is state
+    assert trackers.count('syn', ip) == 0 and trackers.distinct_ports(ip) == 0
+    assert trackers.increment('syn', ip) == 1
+    assert trackers.add_port(ip, 443) == 1
+    assert (state.syn, state.ports, state.rate) == (1, 443, 3)
+
+    # Once everything expired the record is dropped; a new one starts empty
+    clock.now += TTL + 2
+    trackers.expire()
+    assert ip not in trackers._sources
+    trackers.increment('icmp', ip)
+    fresh = trackers._sources[ip]
+    assert fresh is not state
+    assert (fresh.syn, fresh.rate, fresh.icmp, fresh.ports) == (0, 0, 1, None)
+
+
+# ===== Sketch backend =====
+
+def test_sketch_exact_for_few_sources():
+    rng = random.Random(2)
+    trackers = create_trackers('sketch', ttl=TTL, clock=Clock())
+    expected = {}
+    for i in range(200):
+        ip = f'10.{rng.randint(0, 255)}.0.{i}'
+        packets = rng.randint(1, 40)
+        for _ in range(packets):
+            trackers.increment('rate', ip)
+        expected[ip] = packets
+    # 200 sources in 4 x 65536 cells: a collision in every row is practically impossible
+    for ip, packets in expected.items():
+        assert trackers.count('rate', ip) == packets
+        assert trackers.count('syn', ip) == 0
+
+
+def test_count_min_never_underestimates_and_respects_bound():
+    rng = random.Random(3)
+    width, depth = 256, 4
+    sketch = CountMinSketch(width, depth)
+    counts = {}
+    for _ in range(20000):
+        ip = f'10.0.{rng.randint(0, 7)}.{rng.randint(0, 255)}'
+        counts[ip] = counts.get(ip, 0) + 1
+        sketch.add(_row_offsets(ip, width, depth))
+    total = sum(counts.values())
+    errors = [sketch.estimate(_row_offsets(ip, width, depth)) - count for ip, count in counts.items()]
+    assert min(errors) >= 0
+    # Bound holds with probability 1 - e^-4 per key; allow that fraction to exceed it
+    over = sum(error > math.e / width * total for error in errors)
+    assert over <= math.exp(-depth) * len(errors)
+
+
+def test_count_min_subtract():
+    sketch = CountMinSketch()
+    a, b = _row_offsets('10.0.0.1', 65536, 4), _row_offsets('10.0.0.2', 65536, 4)
+    for _ in range(5):
+        sketch.add(a)
+    sketch.add(b)
+    sketch.subtract(a)
+    assert sketch.estimate(a) == 0
+    assert sketch.estimate(b) == 1
+
+
+@pytest.mark.parametrize('ports', [1, 5, 10, 20])
+def test_sketch_distinct_ports_estimate(ports):
+    random.seed(ports)
+    trackers = create_trackers('sketch', ttl=TTL, clock=Clock())
+    estimates = []
+    for source in range(200):
+        ip = f'172.16.{source // 256}.{source % 256}'
+        for port in random.sample(range(1, 65536), ports):
+            estimate = trackers.add_port(ip, port)
+        estimates.append(estimate)
+        # Repeating a port never raises the estimate
+        assert trackers.add_port(ip, port) == estimate
+    mean = sum(estimates) / len(estimates)
+    assert abs(mean - ports) <= max(0.5, 0.1 * ports)
+
+
+def test_sketch_reset_and_window():
+    clock = Clock()
+    trackers = create_trackers('sketch', ttl=TTL, clock=clock)
+    for port in range(20, 30):
+        trackers.add_port('10.0.0.1', port)
+        trackers.increment('syn', '10.0.0.1')
+    trackers.increment('syn', '10.0.0.2')
+    trackers.reset('ports', '10.0.0.1')
+    trackers.reset('syn', '10.0.0.1')
+    assert trackers.distinct_ports('10.0.0.1') == 0
+    assert trackers.count('syn', '10.0.0.1') == 0
+    assert trackers.count('syn', '10.0.0.2') == 1
+
+    clock.now += TTL - 0.5
+    trackers.expire()
+    assert trackers.count('syn', '10.0.0.2') == 1
+    clock.now += 0.5
+    trackers.expire()
+    assert trackers.count('syn', '10.0.0.2') == 0
+    assert trackers.windows == 1
+
+
+def test_heavy_hitter_survives_spoofed_flood():
+    rng = random.Random(4)
+    trackers = create_trackers('sketch', ttl=TTL, clock=Clock(), top_k=8)
+    for i in range(5000):
+        if i % 10 == 0:
+            trackers.increment('rate', '10.0.0.99')
+        trackers.increment('rate', f'{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.1')
+    assert trackers.top_talkers(1) == [('10.0.0.99', 500)]
+
+
+def test_heavy_hitters_keep_largest():
+    hitters = HeavyHitters(k=3)
+    for key, estimate in [('a', 5), ('b', 1), ('c', 3), ('d', 2), ('e', 9)]:
+        hitters.update(key, estimate)
+    assert hitters.top() == [('e', 9), ('a', 5), ('c', 3)]
+    # An evicted key comes back once its estimate beats the smallest kept one
+    hitters.update('b', 3)
+    assert 'b' not in hitters.counts
+    hitters.update('b', 4)
+    assert hitters.top() == [('e', 9), ('a', 5), ('b', 4)]
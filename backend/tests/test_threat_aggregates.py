@@ -0,0 +1,100 @@
+"""ThreatAggregator rollups against a full rescan of the recorded alerts"""
+
+import random
+from collections import Counter
+
+from threat_aggregates import SEVERITY_LEVELS, ThreatAggregator
+
+NOW = 1_700_000_000.0
+TYPES = ['Port Scan', 'DDoS Attack', 'SQL Injection', 'XSS Attack', 'Brute Force', 'Malware', 'ICMP Flood']
+
+
+def rescan_series(alerts, width, count, now):
+    current = int(now // width)
+    points = []
+    for key in range(current - count + 1, current + 1):
+        inside = [(alert, hits) for alert, hits in alerts if int(alert['epoch'] // width) == key]
+        threats = sum(hits for _, hits in inside)
+        blocked = sum(hits for alert, hits in inside if alert['status'] == 'Blocked')
+        points.append((threats, blocked, threats - blocked))
+    return points
+
+
+def as_tuples(points):
+    return [(point['threats'], point['blocked'], point['allowed']) for point in points]
+
+
+def random_alerts(rng, count):
+    alerts = []
+    for _ in range(count):
+        alert = {
+            'epoch': NOW - rng.uniform(0, 30 * 3600),
+            'threat_type': rng.choice(TYPES),
+            'severity': rng.choice(SEVERITY_LEVELS),
+            'status': rng.choice(['Active', 'Active', 'Blocked'])
+        }
+        alerts.append((alert, rng.choice([1, 1, 1, 4])))
+    return alerts
+
+
+def test_series_and_distribution_match_rescan():
+    rng = random.Random(0)
+    aggregates = ThreatAggregator()
+    alerts = random_alerts(rng, 3000)
+    for alert, hits in alerts:
+        aggregates.record(alert, hits)
+
+    hourly, per_minute = aggregates.series(hours=24, minutes=90, now=NOW)
+    assert len(hourly) == 24 and len(per_minute) == 90
+    assert as_tuples(hourly) == rescan_series(alerts, 3600, 24, NOW)
+    assert as_tuples(per_minute) == rescan_series(alerts, 60, 90, NOW)
+
+    first_hour = int(NOW // 3600) - 23
+    recent = [(alert, hits) for alert, hits in alerts if int(alert['epoch'] // 3600) >= first_hour]
+    by_type = Counter()
+    by_severity = Counter()
+    for alert, hits in recent:
+        by_type[alert['threat_type']] += hits
+        by_severity[alert['severity']] += hits
+
+    distribution, breakdown = aggregates.distribution(hours=24, top=5, now=NOW)
+    ranked = by_type.most_common()
+    assert [item['value'] for item in distribution[:5]] == [value for _, value in ranked[:5]]
+    assert distribution[-1] == {'name': 'Other', 'value': sum(value for _, value in ranked[5:])}
+    assert breakdown == {level: by_severity[level] for level in SEVERITY_LEVELS}
+
+
+def test_record_block_moves_allowed_to_blocked():
+    aggregates = ThreatAggregator()
+    alert = {'epoch': NOW, 'threat_type': 'Port Scan', 'severity': 'High', 'status': 'Active'}
+    aggregates.record(alert, 3)
+    aggregates.record_block(alert, 3)
+    # Blocked never exceeds the threats counted in a bucket
+    aggregates.record_block(alert, 3)
+    hourly, per_minute = aggregates.series(hours=1, minutes=1, now=NOW)
+    assert as_tuples(hourly) == as_tuples(per_minute) == [(3, 3, 0)]
+
+
+def test_zero_hits_not_counted():
+    aggregates = ThreatAggregator()
+    aggregates.record({'epoch': NOW, 'threat_type': 'Port Scan', 'status': 'Active'}, 0)
+    hourly, _ = aggregates.series(hours=1, minutes=1, now=NOW)
+    assert as_tuples(hourly) == [(0, 0, 0)]
+
+
+def test_retention_prunes_old_buckets():
+    aggregates = ThreatAggregator(minute_retention=10, hour_retention=2)
+    for minute in range(120):
+        aggregates.record({'epoch': NOW - 7200 + minute * 60, 'status': 'Active'})
+    assert len(aggregates._minutes) <= 11
+    assert len(aggregates._hours) <= 3
+    # The retained window still counts everything
+    _, per_minute = aggregates.series(minutes=10, now=NOW - 60)
+    assert as_tuples(per_minute) == [(1, 0, 1)] * 10
+
+
+def test_unknown_severity_reported():
+    aggregates = ThreatAggregator()
+    aggregates.record({'epoch': NOW, 'threat_type': 'Port Scan', 'severity': 'Info', 'status': 'Active'})
+    _, breakdown = aggregates.distribution(now=NOW)
+    assert breakdown == {'Low': 0, 'Medium': 0, 'High': 0, 'Critical': 0, 'Info': 1}
@@ -0,0 +1,109 @@
+"""VerdictCache hits, invalidation, expiry and LRU eviction"""
+
+import numpy as np
+
+from verdict_cache import MISS, VerdictCache, feature_signature
+
+FLOW = ('10.0.0.1', '192.168.1.10', 6, 40000, 80)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def features(length=60, flags=2, payload=0, rate=3, ports=1):
+    return np.array([6, 40000, 80, length, flags, 0, 0, payload, int(payload > 0), rate, ports],
+                    dtype=np.float32)
+
+
+def test_signature_buckets():
+    base = feature_signature(features())
+    # Within the same buckets: same signature
+    assert feature_signature(features(length=63, rate=4)) == base
+    # Packet size doubling, new flags, rate or port count crossing an edge: new signature
+    for changed in (features(length=64), features(flags=18), features(rate=5), features(ports=2),
+                    features(payload=1)):
+        assert feature_signature(changed) != base
+    # Source ports are not part of the signature
+    other_port = features()
+    other_port[1] = 50000
+    assert feature_signature(other_port) == base
+
+
+def test_hit_after_store():
+    cache = VerdictCache(clock=Clock())
+    signature = feature_signature(features())
+    assert cache.lookup(FLOW, signature) is MISS
+    cache.store(FLOW, signature, None)
+    # None (benign) is a cacheable verdict
+    assert cache.lookup(FLOW, signature) is None
+    cache.store(FLOW, signature, ('port_scan', 0.9))
+    assert cache.lookup(FLOW, signature) == ('port_scan', 0.9)
+    assert cache.get_stats()['hits'] == 2
+    assert cache.get_stats()['hit_rate'] == 2 / 3
+
+
+def test_signature_change_invalidates():
+    cache = VerdictCache(clock=Clock())
+    cache.store(FLOW, feature_signature(features()), None)
+    assert cache.lookup(FLOW, feature_signature(features(rate=80))) is MISS
+    assert len(cache) == 0
+    # The original signature is gone too: the flow must be scored again
+    assert cache.lookup(FLOW, feature_signature(features())) is MISS
+    assert cache.get_stats()['invalidations'] == 1
+
+
+def test_expiry():
+    clock = Clock()
+    cache = VerdictCache(ttl=30.0, clock=clock)
+    signature = feature_signature(features())
+    cache.store(FLOW, signature, 'verdict')
+    clock.now = 29.9
+    assert cache.lookup(FLOW, signature) == 'verdict'
+    clock.now = 30.0
+    assert cache.lookup(FLOW, signature) is MISS
+    assert cache.get_stats()['expirations'] == 1
+    # Storing again restarts the ttl
+    cache.store(FLOW, signature, 'verdict')
+    clock.now = 59.0
+    assert cache.lookup(FLOW, signature) == 'verdict'
+
+
+def test_lru_eviction_against_model():
+    cache = VerdictCache(max_entries=4, clock=Clock())
+    signature = feature_signature(features())
+    order = []                                  # least recently used first
+    rng = np.random.default_rng(0)
+    evictions = 0
+    for _ in range(500):
+        flow = ('10.0.0.1', '192.168.1.10', 6, int(rng.integers(0, 8)), 80)
+        if rng.random() < 0.5:
+            cache.store(flow, signature, flow[3])
+            if flow in order:
+                order.remove(flow)
+            order.append(flow)
+            if len(order) > 4:
+                order.pop(0)
+                evictions += 1
+        else:
+            verdict = cache.lookup(flow, signature)
+            if flow in order:
+                assert verdict == flow[3]
+                order.remove(flow)
+                order.append(flow)
+            else:
+                assert verdict is MISS
+        assert list(cache._entries) == order
+    assert cache.get_stats()['evictions'] == evictions
+
+
+def test_clear():
+    cache = VerdictCache(clock=Clock())
+    cache.store(FLOW, feature_signature(features()), None)
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.lookup(FLOW, feature_signature(features())) is MISS
@@ -0,0 +1,150 @@
+"""
+Incremental Threat Aggregates
+Per-minute and per-hour rollups of alert counts (by threat type, severity,
+and blocked vs. allowed), updated as alerts are ingested so the dashboard
+charts are served in O(buckets) without rescanning stored alerts
+"""
+
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+SEVERITY_LEVELS = ['Low', 'Medium', 'High', 'Critical']
+
+
+class _Bucket:
+    __slots__ = ('threats', 'blocked', 'by_type', 'by_severity')
+
+    def __init__(self):
+        self.threats = 0
+        self.blocked = 0
+        self.by_type = Counter()
+        self.by_severity = Counter()
+
+
+class ThreatAggregator:
+    def __init__(self, minute_retention=24 * 60, hour_retention=7 * 24):
+        """
+        Initialize the aggregator
+
+        Args:
+            minute_retention: Number of per-minute buckets kept
+            hour_retention: Number of per-hour buckets kept
+        """
+        self.minute_retention = minute_retention
+        self.hour_retention = hour_retention
+        self._minutes = {}   # epoch minute -> _Bucket
+        self._hours = {}     # epoch hour -> _Bucket
+        self._lock = threading.Lock()
+
+    def record(self, alert, count=1):
+        """
+        Count an ingested alert (uses its 'epoch', 'threat_type', 'severity', 'status')
+
+        Args:
+            count: Occurrences the alert stands for (see alert_aggregator.new_hits)
+        """
+        if count <= 0:
+            return
+        epoch = alert.get('epoch', time.time())
+        blocked = count if alert.get('status') == 'Blocked' else 0
+        with self._lock:
+            for buckets, width, retention in self._rollups():
+                key = int(epoch // width)
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = _Bucket()
+                    self._prune(buckets, key - retention)
+                bucket.threats += count
+                bucket.blocked += blocked
+                bucket.by_type[alert.get('threat_type', 'Unknown')] += count
+                bucket.by_severity[alert.get('severity', 'Medium')] += count
+
+    def record_block(self, alert, count=1):
+        """Move an already counted alert from allowed to blocked (call once per alert)"""
+        epoch = alert.get('epoch', time.time())
+        with self._lock:
+            for buckets, width, _ in self._rollups():
+                bucket = buckets.get(int(epoch // width))
+                if bucket is not None:
+                    bucket.blocked = min(bucket.blocked + count, bucket.threats)
+
+    def _rollups(self):
+        return ((self._minutes, 60, self.minute_retention),
+                (self._hours, 3600, self.hour_retention))
+
+    @staticmethod
+    def _prune(buckets, oldest_kept):
+        for key in [key for key in buckets if key <= oldest_kept]:
+            del buckets[key]
+
+    def series(self, hours=24, minutes=60, now=None):
+        """
+        Chart series ending at the current hour/minute
+
+        Returns:
+            (hourly points, per-minute points) with threats/blocked/allowed
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            hourly = self._points(self._hours, 3600, hours, now, '%H:00')
+            per_minute = self._points(self._minutes, 60, minutes, now, '%H:%M')
+        return hourly, per_minute
+
+    @staticmethod
+    def _points(buckets, width, count, now, label):
+        current = int(now // width)
+        points = []
+        for key in range(current - count + 1, current + 1):
+            bucket = buckets.get(key)
+            threats = bucket.threats if bucket else 0
+            blocked = bucket.blocked if bucket else 0
+            points.append({
+                'time': datetime.fromtimestamp(key * width).strftime(label),
+                'threats': threats,
+                'blocked': blocked,
+                'allowed': threats - blocked
+            })
+        return points
+
+    def distribution(self, hours=24, top=5, now=None):
+        """
+        Threat type and severity totals over the last `hours` hourly buckets
+
+        Returns:
+            (threat distribution list, severity breakdown dict)
+        """
+        now = time.time() if now is None else now
+        current = int(now // 3600)
+        by_type = Counter()
+        by_severity = Counter()
+        with self._lock:
+            for key in range(current - hours + 1, current + 1):
+                bucket = self._hours.get(key)
+                if bucket:
+                    by_type.update(bucket.by_type)
+                    by_severity.update(bucket.by_severity)
+
+        ranked = by_type.most_common()
+        distribution = [{'name': name, 'value': value} for name, value in ranked[:top]]
+        other = sum(value for _, value in ranked[top:])
+        if other:
+            distribution.append({'name': 'Other', 'value': other})
+
+        breakdown = {level: by_severity.get(level, 0) for level in SEVERITY_LEVELS}
+        for level, value in by_severity.items():
+            breakdown.setdefault(level, value)
+        return distribution, breakdown
+
+    def summary(self, hours=24, minutes=60):
+        """Payload for /api/threats"""
+        now = time.time()
+        hourly, per_minute = self.series(hours, minutes, now)
+        distribution, breakdown = self.distribution(hours, now=now)
+        return {
+            'hourly_stats': hourly,
+            'minute_stats': per_minute,
+            'threat_distribution': distribution,
+            'severity_breakdown': breakdown
+        }
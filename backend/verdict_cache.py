@@ -0,0 +1,102 @@
+"""
+Per-flow ML Verdict Cache
+Remembers the last ML verdict of each flow (5-tuple) together with a
+quantized signature of the feature vector it was computed from
+
+Packets of an established flow usually produce the same signature, so their
+verdict can be reused instead of re-scoring them. A flow whose signature
+changes (e.g. its source's packet rate or port count moved to another
+bucket) is invalidated and scored again. Entries expire after a TTL and the
+least recently used flows are evicted beyond max_entries.
+"""
+
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+
+# Returned by lookup() when there is no usable verdict (None is a valid verdict)
+MISS = object()
+
+# Bucket edges for the source-level features
+RATE_BUCKETS = (5, 10, 25, 50, 75, 100)
+PORT_BUCKETS = (2, 3, 5, 8, 10)
+
+
+def feature_signature(features):
+    """
+    Quantized signature of one feature vector (see _extract_features)
+
+    Exact: protocol, TCP flags, port category, suspicious-port flag.
+    Bucketed: packet size and payload size (powers of two), packet rate and
+    ports accessed (RATE_BUCKETS / PORT_BUCKETS).
+    """
+    (protocol, _, _, length, flags, port_category, suspicious,
+     payload_size, _, packet_rate, ports_accessed) = features
+    return (protocol, flags, port_category, suspicious,
+            int(length).bit_length(), int(payload_size).bit_length(),
+            bisect_right(RATE_BUCKETS, packet_rate), bisect_right(PORT_BUCKETS, ports_accessed))
+
+
+class VerdictCache:
+    def __init__(self, max_entries=65536, ttl=30.0, clock=time.monotonic):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Flows remembered; the least recently used are evicted
+            ttl: Seconds a verdict stays valid after it was computed
+            clock: Time source (the analyzer passes its capture-aware clock)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()   # flow -> (signature, verdict, expires)
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'expirations': 0, 'evictions': 0}
+
+    def lookup(self, flow, signature):
+        """
+        Cached verdict for the flow if its signature is unchanged
+
+        Returns:
+            The verdict (possibly None), or MISS
+        """
+        entry = self._entries.get(flow)
+        if entry is None:
+            self.stats['misses'] += 1
+            return MISS
+
+        cached_signature, verdict, expires = entry
+        if cached_signature != signature:
+            del self._entries[flow]
+            self.stats['invalidations'] += 1
+            self.stats['misses'] += 1
+            return MISS
+        if self.clock() >= expires:
+            del self._entries[flow]
+            self.stats['expirations'] += 1
+            self.stats['misses'] += 1
+            return MISS
+
+        self._entries.move_to_end(flow)
+        self.stats['hits'] += 1
+        return verdict
+
+    def store(self, flow, signature, verdict):
+        """Remember the verdict computed for this flow and signature"""
+        self._entries[flow] = (signature, verdict, self.clock() + self.ttl)
+        self._entries.move_to_end(flow)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self):
+        """Hit rate and eviction counters"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return dict(self.stats, entries=len(self._entries),
+                    hit_rate=self.stats['hits'] / lookups if lookups else 0.0)
@@ -5,7 +5,7 @@ import Header from './components/Header'
 import LandingPage from './components/LandingPage'
 import AnalyticsPage from './components/AnalyticsPage'
 import SettingsPage from './components/SettingsPage'
-import { Alert, NetworkStats } from './types'
+import { Alert, AlertsBatch, NetworkStats } from './types'
 import AuthWrapper from './components/Auth/AuthWrapper'
 import { notificationService } from './services/notificationService'
 
@@ -52,11 +52,16 @@ function App() {
       setIsConnected(false)
     })
 
-    newSocket.on('new_alert', (alert: Alert) => {
-      setAlerts(prev => [alert, ...prev].slice(0, 50))
-      
-      // Trigger notification
-      notificationService.handleAlert(alert)
+    newSocket.on('alerts_batch', (batch: AlertsBatch, ack?: () => void) => {
+      // Acknowledge first so the server keeps streaming to this client
+      ack?.()
+      if (batch.alerts.length === 0) return
+
+      // Batch alerts arrive newest first
+      setAlerts(prev => [...batch.alerts, ...prev].slice(0, 50))
+
+      // Every alert is notified (and emailed); one sound per batch
+      notificationService.handleAlerts(batch.alerts)
     })
 
     newSocket.on('stats_update', (newStats: NetworkStats) => {
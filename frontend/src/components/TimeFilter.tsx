@@ -1,5 +1,5 @@
 import { useState } from 'react'
-import { Calendar, Download, Search } from 'lucide-react'
+import { Calendar, ChevronLeft, ChevronRight, Download, Search } from 'lucide-react'
 import { Alert } from '../types'
 import axios from 'axios'
 
@@ -8,14 +8,19 @@ interface TimeFilterProps {
   onClearFilter: () => void
 }
 
+const PAGE_SIZE = 100
+
 export default function TimeFilter({ onFilterResults, onClearFilter }: TimeFilterProps) {
   const [startTime, setStartTime] = useState('')
   const [endTime, setEndTime] = useState('')
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState('')
   const [filteredCount, setFilteredCount] = useState<number | null>(null)
+  const [page, setPage] = useState(1)
+  const [pages, setPages] = useState(0)
 
-  const handleFilter = async () => {
+  // The endpoint is paginated (newest first); fetch one page of the range at a time
+  const fetchPage = async (pageNumber: number) => {
     if (!startTime || !endTime) {
       setError('Please select both start and end times')
       return
@@ -29,12 +34,16 @@ export default function TimeFilter({ onFilterResults, onClearFilter }: TimeFilte
       const response = await axios.get(`${backendUrl}/api/alerts/filter-by-time`, {
         params: {
           start_time: new Date(startTime).toISOString(),
-          end_time: new Date(endTime).toISOString()
+          end_time: new Date(endTime).toISOString(),
+          page: pageNumber,
+          page_size: PAGE_SIZE
         }
       })
 
       onFilterResults(response.data.alerts)
       setFilteredCount(response.data.total)
+      setPage(response.data.page)
+      setPages(response.data.pages)
     } catch (err: any) {
       setError(err.response?.data?.error || 'Failed to filter alerts')
       console.error('Error filtering alerts:', err)
@@ -43,11 +52,15 @@ export default function TimeFilter({ onFilterResults, onClearFilter }: TimeFilte
     }
   }
 
+  const handleFilter = () => fetchPage(1)
+
   const handleClearFilter = () => {
     setStartTime('')
     setEndTime('')
     setError('')
     setFilteredCount(null)
+    setPage(1)
+    setPages(0)
     onClearFilter()
   }
 
@@ -144,6 +157,28 @@ export default function TimeFilter({ onFilterResults, onClearFilter }: TimeFilte
           Found {filteredCount} alert{filteredCount !== 1 ? 's' : ''} in the selected time period
         </div>
       )}
+
+      {pages > 1 && (
+        <div className="flex items-center justify-between text-sm text-muted-foreground">
+          <button
+            onClick={() => fetchPage(page - 1)}
+            disabled={loading || page <= 1}
+            className="px-3 py-1 bg-muted hover:bg-muted/80 text-foreground rounded-lg font-medium transition-colors flex items-center gap-1 disabled:opacity-50 disabled:cursor-not-allowed"
+          >
+            <ChevronLeft className="w-4 h-4" />
+            Newer
+          </button>
+          <span>Page {page} of {pages}</span>
+          <button
+            onClick={() => fetchPage(page + 1)}
+            disabled={loading || page >= pages}
+            className="px-3 py-1 bg-muted hover:bg-muted/80 text-foreground rounded-lg font-medium transition-colors flex items-center gap-1 disabled:opacity-50 disabled:cursor-not-allowed"
+          >
+            Older
+            <ChevronRight className="w-4 h-4" />
+          </button>
+        </div>
+      )}
     </div>
   )
 }
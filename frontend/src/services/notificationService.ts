@@ -8,6 +8,8 @@ export interface NotificationSettings {
   alertSound: boolean
 }
 
+const SEVERITY_RANK: Record<string, number> = { Low: 0, Medium: 1, High: 2, Critical: 3 }
+
 class NotificationService {
   private settings: NotificationSettings = {
     enableNotifications: true,
@@ -163,6 +165,34 @@ class NotificationService {
     }
   }
 
+  // Handle a batch of alerts (as delivered by alerts_batch, newest first)
+  handleAlerts(alerts: any[]) {
+    if (alerts.length === 0) return
+
+    // One sound per batch, at the pitch of its most severe alert
+    if (this.settings.alertSound) {
+      const mostSevere = alerts.reduce((top, alert) =>
+        (SEVERITY_RANK[alert.severity] ?? 1) > (SEVERITY_RANK[top.severity] ?? 1) ? alert : top
+      )
+      this.playAlertSound(mostSevere.severity)
+    }
+
+    // Every alert is still notified and emailed, oldest first
+    for (const alert of [...alerts].reverse()) {
+      const { threat_type, severity, source_ip, description } = alert
+
+      if (this.settings.enableNotifications) {
+        const title = `🚨 ${severity} Threat Detected`
+        const body = `${threat_type} from ${source_ip}\n${description}`
+        this.showNotification(title, body, severity)
+      }
+
+      if (this.settings.emailAlerts) {
+        this.sendEmailAlert(alert)
+      }
+    }
+  }
+
   // Get severity icon
   private getSeverityIcon(severity: string): string {
     const icons: Record<string, string> = {
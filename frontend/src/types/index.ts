@@ -9,6 +9,17 @@ export interface Alert {
   description: string
   port: number
   protocol: string
+  // Set on aggregated summaries of repeated alerts
+  hit_count?: number
+  first_seen?: string
+  last_seen?: string
+  aggregated?: boolean
+}
+
+export interface AlertsBatch {
+  alerts: Alert[]
+  count: number
+  skipped: number
 }
 
 export interface NetworkStats {
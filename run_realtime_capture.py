@@ -4,10 +4,14 @@ Runs packet capture and sends alerts directly to the backend via SocketIO
 No HTTP requests needed - uses WebSocket connection
 """
 
+import os
 import sys
 import time
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from capture_filter import NOISE_FILTER, CaptureStats
+
 # Check admin privileges first
 try:
     import ctypes
@@ -26,7 +30,7 @@ print("✅ Running with administrator privileges\n")
 
 # Import required libraries
 try:
-    from scapy.all import sniff, IP, TCP, UDP, ICMP, Raw
+    from scapy.all import conf, sniff, IP, TCP, UDP, ICMP, Raw
     print("✅ Scapy is installed")
 except ImportError:
     print("❌ Scapy not found!")
@@ -110,6 +114,9 @@ def analyze_packet(packet):
         src_ip = packet[IP].src
         dst_ip = packet[IP].dst
         
+        # Noise is normally dropped by the kernel filter (NOISE_FILTER);
+        # these checks cover captures where it could not be applied
+        
         # Skip localhost traffic
         if src_ip.startswith('127.') or dst_ip.startswith('127.'):
             return
@@ -219,8 +226,25 @@ print("📊 Open dashboard at: http://localhost:5173")
 print("   Watch real threats appear in real-time!")
 print("\n🎯 MONITORING ACTIVE - Press Ctrl+C to stop\n")
 
+# Kernel-side filter so noise never reaches Python (set CAPTURE_BPF_FILTER to override)
+capture_filter = os.environ.get('CAPTURE_BPF_FILTER', NOISE_FILTER)
+try:
+    capture_socket = conf.L2listen(filter=capture_filter or None)
+except Exception as e:
+    print(f"⚠️  Could not apply capture filter ({e}); capturing unfiltered")
+    capture_filter = ''
+    capture_socket = conf.L2listen()
+capture_stats = CaptureStats(capture_socket, getattr(capture_socket, 'iface', None) or str(conf.iface),
+                             capture_filter)
+
+def print_capture_stats():
+    stats = capture_stats.get_stats()
+    if stats['delivered'] is not None:
+        print(f"📉 Kernel filter: {stats['kernel_filtered']} filtered, {stats['delivered']} delivered, "
+              f"{stats['kernel_dropped']} dropped")
+
 try:
-    sniff(prn=analyze_packet, store=False)
+    sniff(opened_socket=capture_socket, prn=analyze_packet, store=False)
 except KeyboardInterrupt:
     print("\n\n🛑 Stopping packet capture...")
     # Disable real-time mode on backend
@@ -230,6 +254,7 @@ except KeyboardInterrupt:
     except:
         pass
     sio.disconnect()
+    print_capture_stats()
     print(f"✅ Captured {alert_count} threats")
     print("\n👋 Real-time monitoring stopped. Goodbye!\n")
 except Exception as e: